@@ -563,6 +563,9 @@ class CuraApplication(QtApplication):
 
         preferences.addPreference("general/accepted_user_agreement", False)
 
+        # From 1 (fastest) to 9 (smallest). The g-code that is sent to printers is compressed with this level.
+        preferences.addPreference("network/gcode_compression_level", 9)
+
         for key in [
             "dialog_load_path",  # dialog_save_path is in LocalFileOutputDevicePlugin
             "dialog_profile_path",
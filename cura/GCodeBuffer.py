@@ -0,0 +1,195 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import re
+from collections.abc import MutableSequence
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union, overload
+
+# Where the layers and the line types start in a chunk: the ;LAYER: and ;TYPE: comments at the start of a line.
+_marker_pattern = re.compile(r"^;(LAYER|TYPE):(.*)$", re.MULTILINE)
+
+_ChunkIndex = NamedTuple("_ChunkIndex", [("layers", List[Tuple[int, int]]), ("types", List[Tuple[str, int]])])
+
+# A place in the buffer: the index of a chunk, and the offset in that chunk.
+Location = Tuple[int, int]
+
+
+class GCodeBuffer(MutableSequence):
+    """The g-code of a build plate, as a list of chunks of text with an index of where the layers are.
+
+    The chunks are the messages that the engine sends (or, for a g-code file, its header, layers and settings). The
+    buffer behaves like the list of strings that the g-code used to be stored in, so post-processing scripts and other
+    plug-ins can keep using it as such. On top of that, it knows where each ;LAYER: starts, where each ;TYPE: starts
+    and which parts are the header and footer, so that those can be found without going through all of the g-code.
+
+    The index is made per chunk, when it's first needed. Changing a chunk only drops the index of that chunk.
+
+    The header is everything before the first layer. The last layer ends at the end of its chunk, and the chunks after
+    that are the footer (e.g. the end g-code and the settings).
+    """
+
+    def __init__(self, chunks: Iterable[str] = ()) -> None:
+        self._chunks = list(chunks)  # type: List[str]
+        self._chunk_indices = [None] * len(self._chunks)  # type: List[Optional[_ChunkIndex]]
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[str]: ...
+
+    def __getitem__(self, index):
+        return self._chunks[index]
+
+    def __setitem__(self, index: Union[int, slice], value: Any) -> None:
+        if isinstance(index, slice):
+            value = list(value)
+            self._chunks[index] = value
+            self._chunk_indices[index] = [None] * len(value)
+        else:
+            self._chunks[index] = value
+            self._chunk_indices[index] = None
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        del self._chunks[index]
+        del self._chunk_indices[index]
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def insert(self, index: int, value: str) -> None:
+        self._chunks.insert(index, value)
+        self._chunk_indices.insert(index, None)
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, GCodeBuffer):
+            return self._chunks == other._chunks
+        if isinstance(other, list):
+            return self._chunks == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "GCodeBuffer({chunks})".format(chunks = repr(self._chunks))
+
+    def copy(self) -> "GCodeBuffer":
+        copied = GCodeBuffer()
+        copied._chunks = list(self._chunks)
+        copied._chunk_indices = list(self._chunk_indices)
+        return copied
+
+    def getLayerNumbers(self) -> List[int]:
+        """Get the numbers of the layers in the g-code, in the order that they appear in."""
+
+        return [layer_number for layer_number, _ in self._getLayerLocations()]
+
+    def getLayer(self, layer_number: int) -> Optional[str]:
+        """Get the g-code of a layer, from its ;LAYER: line up to the next layer (or the footer).
+
+        :return: The g-code of the layer, or None if there is no such layer.
+        """
+
+        locations = self._getLayerLocations()
+        for position, (number, start) in enumerate(locations):
+            if number == layer_number:
+                end = locations[position + 1][1] if position + 1 < len(locations) else (start[0], len(self._chunks[start[0]]))
+                return self._getText(start, end)
+        return None
+
+    def getTypeSpans(self, layer_number: int) -> List[Tuple[str, int, int]]:
+        """Get the parts of a layer with the same line type, from each ;TYPE: line to the next one.
+
+        :return: The line type, and the start and end of its part in the g-code of the layer (see getLayer).
+        """
+
+        layer = self.getLayer(layer_number)
+        if layer is None:
+            return []
+        index = self._indexChunk(layer)
+        spans = []  # type: List[Tuple[str, int, int]]
+        for position, (line_type, start) in enumerate(index.types):
+            end = index.types[position + 1][1] if position + 1 < len(index.types) else len(layer)
+            spans.append((line_type, start, end))
+        return spans
+
+    def getHeader(self) -> str:
+        """Get the g-code before the first layer. Without any layers, that is all of the g-code."""
+
+        locations = self._getLayerLocations()
+        if not locations:
+            return "".join(self._chunks)
+        return self._getText((0, 0), locations[0][1])
+
+    def getFooter(self) -> str:
+        """Get the chunks after the chunk of the last layer. Without any layers, there is no footer."""
+
+        locations = self._getLayerLocations()
+        if not locations:
+            return ""
+        return "".join(self._chunks[locations[-1][1][0] + 1:])
+
+    def replacePlaceholders(self, replacements: Dict[str, str]) -> None:
+        """Replace placeholders like {print_time} in the header and footer.
+
+        This is where the start and end g-code go, and so the placeholders. The chunk of the last layer is searched
+        as a whole, since the end g-code may be in the same chunk as the last layer. The other layers are not searched.
+        """
+
+        locations = self._getLayerLocations()
+        if locations:
+            first_layer_chunk, first_layer_offset = locations[0][1]
+            last_layer_chunk = locations[-1][1][0]
+        else:
+            first_layer_chunk, first_layer_offset = len(self._chunks), 0
+            last_layer_chunk = len(self._chunks)
+        parts = {chunk_index: len(self._chunks[chunk_index]) for chunk_index in range(first_layer_chunk)}  # type: Dict[int, int] # How much of each chunk to search.
+        if first_layer_chunk < last_layer_chunk:
+            parts[first_layer_chunk] = first_layer_offset  # Only the part of the chunk before the first layer is header.
+        for chunk_index in range(last_layer_chunk, len(self._chunks)):
+            parts[chunk_index] = len(self._chunks[chunk_index])
+
+        for chunk_index, length in parts.items():
+            chunk = self._chunks[chunk_index]
+            head, tail = chunk[:length], chunk[length:]
+            replaced = head
+            for placeholder, value in replacements.items():
+                replaced = replaced.replace(placeholder, value)
+            if replaced != head:
+                self[chunk_index] = replaced + tail
+
+    def _getLayerLocations(self) -> List[Tuple[int, Location]]:
+        """Get the number of each layer with where its ;LAYER: line is."""
+
+        locations = []  # type: List[Tuple[int, Location]]
+        for chunk_index, chunk in enumerate(self._chunks):
+            index = self._chunk_indices[chunk_index]
+            if index is None:
+                index = self._chunk_indices[chunk_index] = self._indexChunk(chunk)
+            for layer_number, offset in index.layers:
+                locations.append((layer_number, (chunk_index, offset)))
+        return locations
+
+    def _getText(self, start: Location, end: Location) -> str:
+        """Get the g-code between two places in the buffer."""
+
+        if start[0] == end[0]:
+            return self._chunks[start[0]][start[1]:end[1]]
+        parts = [self._chunks[start[0]][start[1]:]]
+        parts.extend(self._chunks[start[0] + 1:end[0]])
+        parts.append(self._chunks[end[0]][:end[1]])
+        return "".join(parts)
+
+    @staticmethod
+    def _indexChunk(chunk: str) -> _ChunkIndex:
+        index = _ChunkIndex([], [])
+        for match in _marker_pattern.finditer(chunk):
+            if match.group(1) == "LAYER":
+                try:
+                    index.layers.append((int(match.group(2)), match.start()))
+                except ValueError:  # Not a layer number, so not a layer.
+                    continue
+            else:
+                index.types.append((match.group(2).strip(), match.start()))
+        return index
@@ -1,20 +1,28 @@
 # Copyright (c) 2019 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
-from typing import List
+from typing import List, Optional
 import numpy
 
 from UM.Mesh.MeshBuilder import MeshBuilder
 from UM.Mesh.MeshData import MeshData
 from cura.LayerPolygon import LayerPolygon
+from cura.LayerSegments import LayerSegments
 
 
 class Layer:
+    """A layer of the layer data.
+
+    The paths of the layer are stored either as a list of LayerPolygons, or compactly as LayerSegments, with one array
+    per attribute for all paths in the layer. The latter uses a lot less memory and fewer objects for large prints.
+    """
+
     def __init__(self, layer_id: int) -> None:
         self._id = layer_id
         self._height = 0.0
         self._thickness = 0.0
         self._polygons = []  # type: List[LayerPolygon]
+        self._segments = None  # type: Optional[LayerSegments]
         self._element_count = 0
 
     @property
@@ -27,12 +35,83 @@ class Layer:
 
     @property
     def polygons(self) -> List[LayerPolygon]:
+        """The paths of the layer as LayerPolygons.
+
+        If the layer stores its paths as segments, the polygons are created on every call as views on the segments,
+        so changes to the list itself are not stored. Prefer the methods of the layer itself where possible.
+        """
+
+        if self._segments is not None:
+            return self._createPolygons()
         return self._polygons
 
+    @property
+    def segments(self) -> Optional[LayerSegments]:
+        return self._segments
+
+    def setSegments(self, segments: LayerSegments) -> None:
+        """Store the paths of the layer as segments, replacing any polygons.
+
+        :param segments: The paths of the layer. The line types need to be validated already.
+        """
+
+        self._segments = segments
+        self._polygons = []
+
+    def getSegments(self) -> LayerSegments:
+        """Get the paths of the layer as segments.
+
+        If the layer stores its paths as polygons, the arrays of the polygons are joined into new segments.
+        """
+
+        if self._segments is not None:
+            return self._segments
+        polygons = self._polygons
+        return LayerSegments.fromArrays([polygon.extruder for polygon in polygons], [polygon.data for polygon in polygons],
+                                        [polygon.types for polygon in polygons], [polygon.lineWidths for polygon in polygons],
+                                        [polygon.lineThicknesses for polygon in polygons], [polygon.lineFeedrates for polygon in polygons])
+
+    def polygonCount(self) -> int:
+        if self._segments is not None:
+            return len(self._segments)
+        return len(self._polygons)
+
+    def getPolygonPoints(self) -> List[numpy.ndarray]:
+        """Get the points of each polygon, without creating LayerPolygons for them."""
+
+        if self._segments is not None:
+            return [self._segments.points[self._segments.getPoints(p)] for p in range(len(self._segments))]
+        return [polygon.data for polygon in self._polygons]
+
+    @property
+    def lineFeedrates(self) -> numpy.ndarray:
+        """The feedrates of all lines in the layer."""
+
+        if self._segments is not None:
+            return self._segments.line_feedrates
+        if not self._polygons:
+            return numpy.empty((0, 1), dtype = numpy.float32)
+        return numpy.concatenate([polygon.lineFeedrates for polygon in self._polygons])
+
+    @property
+    def lineThicknesses(self) -> numpy.ndarray:
+        """The thicknesses of all lines in the layer."""
+
+        if self._segments is not None:
+            return self._segments.line_thicknesses
+        if not self._polygons:
+            return numpy.empty((0, 1), dtype = numpy.float32)
+        return numpy.concatenate([polygon.lineThicknesses for polygon in self._polygons])
+
     @property
     def elementCount(self):
         return self._element_count
 
+    def setElementCount(self, element_count: int) -> None:
+        """Set the number of elements of the layer in the line mesh, for when it is built by the LayerDataBuilder."""
+
+        self._element_count = element_count
+
     def setHeight(self, height: float) -> None:
         self._height = height
 
@@ -40,6 +119,9 @@ class Layer:
         self._thickness = thickness
 
     def lineMeshVertexCount(self) -> int:
+        if self._segments is not None:
+            return len(self._segments.line_types) + int(numpy.count_nonzero(self._segments.getNeededStartPoints()))
+
         result = 0
         for polygon in self._polygons:
             result += polygon.lineMeshVertexCount()
@@ -47,6 +129,9 @@ class Layer:
         return result
 
     def lineMeshElementCount(self) -> int:
+        if self._segments is not None:
+            return len(self._segments.line_types)
+
         result = 0
         for polygon in self._polygons:
             result += polygon.lineMeshElementCount()
@@ -54,6 +139,9 @@ class Layer:
         return result
 
     def build(self, vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices):
+        if self._segments is not None:
+            return self._buildSegments(vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
+
         result_vertex_offset = vertex_offset
         result_index_offset = index_offset
         self._element_count = 0
@@ -75,6 +163,9 @@ class Layer:
     __index_pattern = numpy.array([[0, 3, 2, 0, 1, 3]], dtype = numpy.int32 )
 
     def createMeshOrJumps(self, make_mesh: bool) -> MeshData:
+        if self._segments is not None:
+            return self._createSegmentsMeshOrJumps(make_mesh)
+
         builder = MeshBuilder()
 
         line_count = 0
@@ -119,4 +210,71 @@ class Layer:
 
             builder.addFacesWithColor(f_points, f_indices, f_colors)
 
-        return builder.build()
\ No newline at end of file
+        return builder.build()
+
+    def _createPolygons(self) -> List[LayerPolygon]:
+        segments = self._segments
+        polygons = []
+        for p in range(len(segments)):
+            lines = segments.getLines(p)
+            polygon = LayerPolygon(int(segments.extruders[p]), segments.line_types[lines], segments.points[segments.getPoints(p)],
+                                   segments.line_widths[lines], segments.line_thicknesses[lines], segments.line_feedrates[lines],
+                                   validated_types = True)
+            polygon.buildCache()
+            polygons.append(polygon)
+        return polygons
+
+    def _buildSegments(self, vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices):
+        """Fill the arrays for the line mesh of the whole layer at once, in the same way LayerPolygon.build does."""
+
+        segments = self._segments
+        gather = segments.getLineMeshGather()
+        segments.fillLineMesh(gather, vertex_offset, index_offset, LayerPolygon.getColorMap(), vertices, colors,
+                              line_dimensions, feedrates, extruders, line_types, indices)
+
+        line_count = len(segments.line_types)
+        self._element_count = line_count * 2  # Each line uses two vertices.
+        return vertex_offset + len(gather[0]), index_offset + line_count
+
+    def _createSegmentsMeshOrJumps(self, make_mesh: bool) -> MeshData:
+        """Create the mesh or jumps of the whole layer at once, in the same way createMeshOrJumps does per polygon."""
+
+        segments = self._segments
+        types = segments.line_types.ravel()
+        index_mask = LayerPolygon.getJumpMap()[types]
+        if make_mesh:
+            index_mask = numpy.logical_not(index_mask)
+
+        start_points = segments.getStartPoints(segments.getPolygonOfLines())[index_mask]
+        line_types = types[index_mask]
+        line_count = len(line_types)
+
+        builder = MeshBuilder()
+        builder.reserveFaceAndVertexCount(2 * line_count, 4 * line_count)
+        if line_count == 0:
+            return builder.build()
+
+        # Create an array with rows [p p+1] for the lines we want to draw.
+        points = numpy.concatenate((segments.points[start_points], segments.points[start_points + 1]), 1)
+
+        # Calculate the 2D normals of the lines, scaled by half of the line width so we can easily offset.
+        edges = segments.points[start_points + 1] - segments.points[start_points]
+        lengths = numpy.sqrt(edges[:, 0] ** 2 + edges[:, 2] ** 2)
+        normals = numpy.zeros((line_count, 3), dtype = numpy.float32)
+        normals[:, 0] = -edges[:, 2] / lengths
+        normals[:, 2] = edges[:, 0] / lengths
+        normals = numpy.tile(normals, (1, 2)) * (segments.line_widths[index_mask] / 2)
+
+        # Shift the z-axis according to previous implementation.
+        if make_mesh:
+            points[LayerPolygon.getInfillOrSkinTypeMap()[line_types], 1::3] -= 0.01
+        else:
+            points[:, 1::3] += 0.01
+
+        # Create 4 points to draw each line segment, points +- normals results in 2 points each.
+        f_points = numpy.concatenate((points - normals, points + normals), 1).reshape((-1, 3))
+        f_indices = (self.__index_pattern + numpy.arange(0, 4 * line_count, 4, dtype = numpy.int32).reshape((-1, 1))).reshape((-1, 3))
+        f_colors = numpy.repeat(LayerPolygon.getColorMap()[line_types], 4, 0)
+
+        builder.addFacesWithColor(f_points, f_indices, f_colors)
+        return builder.build()
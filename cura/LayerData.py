@@ -1,5 +1,7 @@
 # Copyright (c) 2015 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
+import numpy
+
 from UM.Mesh.MeshData import MeshData
 
 
@@ -7,6 +9,9 @@ class LayerData(MeshData):
     """Class to holds the layer mesh and information about the layers.
 
     Immutable, use :py:class:`cura.LayerDataBuilder.LayerDataBuilder` to create one of these.
+
+    The colors and attributes may be stored in a compact layout (see LayerDataBuilder). The renderer uploads them as
+    float32, so they are widened to float32 whenever their values are requested, without keeping the wide copy.
     """
 
     def __init__(self, vertices = None, normals = None, indices = None, colors = None, uvs = None, file_name = None,
@@ -26,3 +31,62 @@ class LayerData(MeshData):
 
     def getElementCounts(self):
         return self._element_counts
+
+    def getColors(self):
+        colors = super().getColors()
+        if colors is None or colors.dtype == numpy.float32:
+            return colors
+        return _widenValue(colors, normalized = True)
+
+    def getCompactColors(self):
+        """Get the colors as they are stored, which may be in a compact layout."""
+
+        return super().getColors()
+
+    def getColorsAsByteArray(self):
+        colors = self.getColors()
+        if colors is None:
+            return None
+        return colors.tobytes()
+
+    def getAttribute(self, key):
+        attribute = super().getAttribute(key)
+        if attribute["value"].dtype == numpy.float32:
+            return attribute
+        return _WideningAttribute(attribute)
+
+    def getCompactAttribute(self, key):
+        """Get an attribute with its value as it is stored, which may be in a compact layout."""
+
+        return super().getAttribute(key)
+
+
+def _widenValue(value: numpy.ndarray, normalized: bool = False) -> numpy.ndarray:
+    """Convert the value of a compact attribute to float32.
+
+    :param normalized: Whether the value is an unsigned integer that represents the range 0 to 1, like colors.
+    """
+
+    wide_value = value.astype(numpy.float32)
+    if normalized:
+        wide_value /= numpy.iinfo(value.dtype).max
+    return wide_value
+
+
+class _WideningAttribute(dict):
+    """An attribute of which the value is widened to float32 every time it is requested.
+
+    The renderer asks for the attributes on every frame, but only needs their values when uploading them. So the wide
+    value is not computed until it is requested, and not kept.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if key == "value":
+            return _widenValue(value, self.get("normalized", False))
+        return value
+
+    def get(self, key, default = None):
+        if key not in self:
+            return default
+        return self[key]
@@ -3,21 +3,57 @@
 
 from .Layer import Layer
 from .LayerPolygon import LayerPolygon
+from .LayerSegments import LayerSegments
 from UM.Mesh.MeshBuilder import MeshBuilder
 from .LayerData import LayerData
 
 import numpy
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 
 class LayerDataBuilder(MeshBuilder):
-    """Builder class for constructing a :py:class:`cura.LayerData.LayerData` object"""
+    """Builder class for constructing a :py:class:`cura.LayerData.LayerData` object
+
+    The builder can be built more than once. Layers that were already built are kept in growable buffers, so that
+    layers which are added later (e.g. while the engine is still slicing) are appended to the existing mesh instead of
+    rebuilding it.
+
+    With compact attributes, the per-vertex attributes are stored in the smallest type that holds them: line types
+    and extruders as uint8, colors as normalized uint8 RGBA and line dimensions and feedrates as float16. The
+    LayerData widens them to the float32 layout that the renderer expects only when they are uploaded. So this only
+    saves memory on the CPU side; the vertex buffers on the GPU and the shaders' attributes are the same as without it.
+    """
+
+    # For each line type, whether it is a travel move that is drawn in the color of its line type instead of the material.
+    __travel_type_map = numpy.isin(numpy.arange(len(LayerPolygon.getJumpMap())), [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType])
+
+    # The type and number of components of each buffer, for the float32 and for the compact layout.
+    __buffer_layouts = {
+        "vertices": (numpy.float32, numpy.float32, (3, )),
+        "line_dimensions": (numpy.float32, numpy.float16, (2, )),
+        "colors": (numpy.float32, numpy.uint8, (4, )),
+        "material_colors": (numpy.float32, numpy.uint8, (4, )),
+        "feedrates": (numpy.float32, numpy.float16, ()),
+        "extruders": (numpy.float32, numpy.uint8, ()),
+        "line_types": (numpy.float32, numpy.uint8, ()),
+        "indices": (numpy.int32, numpy.int32, (2, ))
+    }
+
+    def __init__(self, compact_attributes: bool = False) -> None:
+        """
+        :param compact_attributes: Store the vertex attributes in a compact layout, to save memory on large prints.
+        """
 
-    def __init__(self) -> None:
         super().__init__()
+        self._compact_attributes = compact_attributes
         self._layers = {}  # type: Dict[int, Layer]
         self._element_counts = {}  # type: Dict[int, int]
 
+        self._built_layers = []  # type: List[int] # Layer numbers that are already in the buffers, in order.
+        self._built_vertex_count = 0
+        self._built_index_count = 0
+        self._buffers = {}  # type: Dict[str, numpy.ndarray]
+
     def addLayer(self, layer: int) -> None:
         if layer not in self._layers:
             self._layers[layer] = Layer(layer)
@@ -46,73 +82,172 @@ class LayerDataBuilder(MeshBuilder):
     def build(self, material_color_map, line_type_brightness = 1.0):
         """Return the layer data as :py:class:`cura.LayerData.LayerData`.
 
+        Only the layers that were added since the previous call are built. They are appended to the buffers of the
+        layers that were built before, unless a layer was added below an already built layer. The layer view needs
+        the layers to be stored in order, so in that case everything is rebuilt in new buffers.
+
         :param material_color_map: [r, g, b, a] for each extruder row.
         :param line_type_brightness: compatibility layer view uses line type brightness of 0.5
         """
 
-        vertex_count = 0
-        index_count = 0
-        for layer, data in self._layers.items():
-            vertex_count += data.lineMeshVertexCount()
-            index_count += data.lineMeshElementCount()
-
-        vertices = numpy.empty((vertex_count, 3), numpy.float32)
-        line_dimensions = numpy.empty((vertex_count, 2), numpy.float32)
-        colors = numpy.empty((vertex_count, 4), numpy.float32)
-        indices = numpy.empty((index_count, 2), numpy.int32)
-        feedrates = numpy.empty((vertex_count), numpy.float32)
-        extruders = numpy.empty((vertex_count), numpy.float32)
-        line_types = numpy.empty((vertex_count), numpy.float32)
-
-        vertex_offset = 0
-        index_offset = 0
-        for layer, data in sorted(self._layers.items()):
-            vertex_offset, index_offset = data.build(vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
-            self._element_counts[layer] = data.elementCount
-
-        self.addVertices(vertices)
-        colors[:, 0:3] *= line_type_brightness
-        self.addColors(colors)
-        self.addIndices(indices.flatten())
-
-        # Note: we're using numpy indexing here.
-        # See also: https://docs.scipy.org/doc/numpy/reference/arrays.indexing.html
-        material_colors = numpy.zeros((line_dimensions.shape[0], 4), dtype=numpy.float32)
-        for extruder_nr in range(material_color_map.shape[0]):
-            material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
-        # Set material_colors with indices where line_types (also numpy array) == MoveCombingType
-        material_colors[line_types == LayerPolygon.MoveCombingType] = colors[line_types == LayerPolygon.MoveCombingType]
-        material_colors[line_types == LayerPolygon.MoveRetractionType] = colors[line_types == LayerPolygon.MoveRetractionType]
+        new_layers = sorted(layer for layer in self._layers if layer not in self._element_counts)
+        if new_layers and self._built_layers and new_layers[0] < self._built_layers[-1]:
+            # The layer data that was built before uses the buffers, so they must not be overwritten.
+            self.resetBuild()
+            new_layers = sorted(self._layers)
+
+        # The paths of all new layers are joined, so that each attribute of the mesh can be filled with a single
+        # gather over all of them, instead of building the layers (and their polygons) one by one.
+        layer_segments = [self._layers[layer].getSegments() for layer in new_layers]
+        segments = LayerSegments.concatenate(layer_segments)
+        gather = segments.getLineMeshGather()
+        vertex_offset = self._built_vertex_count + len(gather[0])
+        index_offset = self._built_index_count + len(segments.line_types)
+        self._reserve(vertex_offset, index_offset)
+
+        vertex_types, vertex_extruders = segments.fillLineMesh(gather, self._built_vertex_count, self._built_index_count,
+                                                               self._toColorType(self._getLineTypeColorMap(line_type_brightness)),
+                                                               self._buffers["vertices"], self._buffers["colors"], self._buffers["line_dimensions"],
+                                                               self._buffers["feedrates"], self._buffers["extruders"],
+                                                               self._buffers["line_types"], self._buffers["indices"])
+
+        # Travel moves have the color of their line type, all other lines the color of their material.
+        new_vertices = slice(self._built_vertex_count, vertex_offset)
+        colors = self._buffers["colors"][new_vertices]
+        material_colors = self._buffers["material_colors"][new_vertices]
+        numpy.take(self._toColorType(self._getMaterialColorLookup(material_color_map, vertex_extruders)), vertex_extruders, axis = 0, out = material_colors, mode = "clip")
+        is_travel = self.__travel_type_map[vertex_types]
+        material_colors[is_travel] = colors[is_travel]
+
+        for layer, segments_of_layer in zip(new_layers, layer_segments):
+            self._element_counts[layer] = len(segments_of_layer.line_types) * 2  # Each line uses two vertices.
+            self._layers[layer].setElementCount(self._element_counts[layer])
+
+        self._built_layers.extend(new_layers)
+        self._built_vertex_count = vertex_offset
+        self._built_index_count = index_offset
 
         attributes = {
             "line_dimensions": {
-                "value": line_dimensions,
+                "value": self._builtView("line_dimensions", vertex_offset),
                 "opengl_name": "a_line_dim",
                 "opengl_type": "vector2f"
                 },
             "extruders": {
-                "value": extruders,
+                "value": self._builtView("extruders", vertex_offset),
                 "opengl_name": "a_extruder",
                 "opengl_type": "float"  # Strangely enough, the type has to be float while it is actually an int.
                 },
             "colors": {
-                "value": material_colors,
+                "value": self._builtView("material_colors", vertex_offset),
                 "opengl_name": "a_material_color",
-                "opengl_type": "vector4f"
+                "opengl_type": "vector4f",
+                "normalized": self._compact_attributes  # Stored as uint8, meaning 0 to 1.
                 },
             "line_types": {
-                "value": line_types,
+                "value": self._builtView("line_types", vertex_offset),
                 "opengl_name": "a_line_type",
                 "opengl_type": "float"
                 },
             "feedrates": {
-                "value": feedrates,
+                "value": self._builtView("feedrates", vertex_offset),
                 "opengl_name": "a_feedrate",
                 "opengl_type": "float"
                 }
             }
 
-        return LayerData(vertices=self.getVertices(), normals=self.getNormals(), indices=self.getIndices(),
-                        colors=self.getColors(), uvs=self.getUVCoordinates(), file_name=self.getFileName(),
-                        center_position=self.getCenterPosition(), layers=self._layers,
-                        element_counts=self._element_counts, attributes=attributes)
+        # The layers and element counts are copied, so that layers which are added later on don't show up in a
+        # LayerData that is already being rendered.
+        layers = {layer: self._layers[layer] for layer in self._built_layers}
+        return LayerData(vertices=self._builtView("vertices", vertex_offset), normals=self.getNormals(),
+                        indices=self._builtView("indices", index_offset).reshape(-1),
+                        colors=self._builtView("colors", vertex_offset), uvs=self.getUVCoordinates(),
+                        file_name=self.getFileName(), center_position=self.getCenterPosition(), layers=layers,
+                        element_counts=dict(self._element_counts), attributes=attributes)
+
+    def resetBuild(self) -> None:
+        """Forget the layers that were built, so that the next build builds all layers again.
+
+        This is needed when paths were added to a layer after it was built. The buffers are not reused, so the layer
+        data that was built before stays intact.
+        """
+
+        self._built_layers = []
+        self._built_vertex_count = 0
+        self._built_index_count = 0
+        self._element_counts = {}
+        self._buffers = {}
+
+    def isCompact(self) -> bool:
+        return self._compact_attributes
+
+    def getBytesSaved(self) -> int:
+        """Get the number of bytes that the compact layout saves on the layers that are built, compared to float32."""
+
+        saved = 0
+        for name, (wide_type, compact_type, components) in self.__buffer_layouts.items():
+            count = self._built_index_count if name == "indices" else self._built_vertex_count
+            used_type = compact_type if self._compact_attributes else wide_type
+            saved += count * int(numpy.prod(components)) * (numpy.dtype(wide_type).itemsize - numpy.dtype(used_type).itemsize)
+        return saved
+
+    def _toColorType(self, color_map: numpy.ndarray) -> numpy.ndarray:
+        """Convert a color map to the type that the colors are stored in."""
+
+        if not self._compact_attributes:
+            return color_map
+        return numpy.round(numpy.clip(color_map, 0, 1) * 255).astype(numpy.uint8)
+
+    @staticmethod
+    def _getLineTypeColorMap(line_type_brightness: float) -> numpy.ndarray:
+        """Get the color of each line type, with the brightness applied to the RGB components."""
+
+        color_map = numpy.array(LayerPolygon.getColorMap(), dtype = numpy.float32)
+        color_map[:, 0:3] *= line_type_brightness
+        return color_map
+
+    @staticmethod
+    def _getMaterialColorLookup(material_color_map: numpy.ndarray, extruders: numpy.ndarray) -> numpy.ndarray:
+        """Get the material color map, padded with transparent black for extruders that are not in the map."""
+
+        material_color_map = numpy.asarray(material_color_map, dtype = numpy.float32)
+        extruder_count = int(extruders.max()) + 1 if len(extruders) > 0 else 0
+        if extruder_count <= material_color_map.shape[0]:
+            return material_color_map
+        lookup = numpy.zeros((extruder_count, 4), dtype = numpy.float32)
+        lookup[:material_color_map.shape[0]] = material_color_map
+        return lookup
+
+    def _reserve(self, vertex_count: int, index_count: int) -> None:
+        """Make sure the buffers can hold the given number of vertices and indices.
+
+        The buffers grow by at least a factor 2, so appending layers one by one doesn't copy the data every time.
+        """
+
+        if not self._buffers:
+            for name, (wide_type, compact_type, components) in self.__buffer_layouts.items():
+                self._buffers[name] = numpy.empty((0, ) + components, compact_type if self._compact_attributes else wide_type)
+
+        for name, buffer in self._buffers.items():
+            if name == "indices":
+                needed, used = index_count, self._built_index_count
+            else:
+                needed, used = vertex_count, self._built_vertex_count
+            if needed <= buffer.shape[0]:
+                continue
+            # Only the first time around the buffers are allocated with their exact size, since most layer data is
+            # built in one go.
+            capacity = needed if buffer.shape[0] == 0 else max(needed, 2 * buffer.shape[0])
+            new_buffer = numpy.empty((capacity, ) + buffer.shape[1:], buffer.dtype)
+            new_buffer[:used] = buffer[:used]
+            self._buffers[name] = new_buffer
+
+    def _builtView(self, name: str, count: int) -> numpy.ndarray:
+        """Get a read-only view on the part of a buffer that is built.
+
+        Since the view is read-only, the LayerData can use it without making a copy.
+        """
+
+        view = self._buffers[name][:count]
+        view.flags.writeable = False
+        return view
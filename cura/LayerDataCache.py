@@ -0,0 +1,339 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import json
+import os
+import struct
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy
+
+from UM.Logger import Logger
+
+from cura.Layer import Layer
+from cura.LayerData import LayerData
+from cura.LayerSegments import LayerSegments
+
+
+class LayerDataCache:
+    """Keeps processed layer data on disk, so that it doesn't need to be kept in memory or processed again.
+
+    Each entry is a single file with all arrays of the layer data: the mesh and its attributes, and the segments of
+    all layers. When an entry is loaded, the file is mapped into memory with numpy.memmap, so loading is near-instant
+    and the data is only paged in (and out again) by the operating system as it is used.
+
+    The total size of the files is bounded. When it is exceeded, the least recently used entries are removed.
+
+    Every time an entry is stored, it gets a new file, named after the key and a generation number. The layer data that
+    is shown may still have the previous file of the entry mapped, and on Windows a mapped file can't be replaced or
+    removed. Files that are no longer used are removed as soon as that is possible: right away, or once the layer data
+    that maps them is released.
+
+    By default, the cache is not meant to outlive the session: keys like build plate numbers only mean something for
+    the scene they were made for. So the files of previous sessions are removed when the cache is created. A persistent
+    cache keeps them instead, for keys that identify their content (e.g. a hash of the file that the layer data was
+    parsed from). Its keys need to be valid file names. The modification times of the files record when they were
+    last used, so the least recently used entries are removed first in later sessions too.
+    """
+
+    # The version of the file format. Files with another version are not read.
+    Version = 1
+
+    _magic = b"CURALAYR"
+    _header_format = "<8sII"  # Magic, version and the length of the JSON header that follows.
+    _alignment = 64
+
+    def __init__(self, directory: str, max_size: int, persistent: bool = False) -> None:
+        """
+        :param directory: The directory to store the files in. It is created if it doesn't exist.
+        :param max_size: The maximum total size of the files in bytes.
+        :param persistent: Keep the entries of previous sessions, instead of removing them.
+        """
+
+        self._directory = directory
+        self._max_size = max_size
+        self._persistent = persistent
+        self._entries = OrderedDict()  # type: OrderedDict[Hashable, int] # The size of each entry, least recently used first.
+        self._file_names = {}  # type: Dict[Hashable, str] # The file of each entry.
+        self._stale_paths = []  # type: List[str] # Files of entries that were replaced or removed, which couldn't be removed yet.
+        self._generation = 0  # The generation number of the last file that was written.
+        self._lock = threading.Lock()  # Entries are stored from jobs, and loaded and removed from the main thread.
+
+        try:
+            os.makedirs(self._directory, exist_ok = True)
+            kept_files = []  # type: List[Tuple[float, str, str, int]]
+            for file_name in os.listdir(self._directory):
+                path = os.path.join(self._directory, file_name)
+                key, _, generation = file_name[:-len(".layers")].rpartition("-")
+                if file_name.endswith(".layers") and self._persistent and key and generation.isdigit():
+                    stat = os.stat(path)
+                    kept_files.append((stat.st_mtime, key, file_name, stat.st_size))
+                    self._generation = max(self._generation, int(generation))
+                elif file_name.endswith(".layers") or file_name.endswith(".tmp"):
+                    self._removeFile(path)
+            for _, key, file_name, size in sorted(kept_files):
+                self._forget(key)  # An older file of the same entry.
+                self._entries[key] = size
+                self._file_names[key] = file_name
+            self._evict()
+            self._removeStalePaths()
+        except OSError as e:
+            Logger.log("w", "Unable to prepare the layer data cache in %s: %s", self._directory, str(e))
+
+    def setMaxSize(self, max_size: int) -> None:
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def getSize(self) -> int:
+        """Get the total size of the entries in bytes."""
+
+        with self._lock:
+            return sum(self._entries.values())
+
+    def has(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def store(self, key: Hashable, layer_data: LayerData, extra: Optional[Dict[str, Any]] = None) -> bool:
+        """Write layer data to the cache, replacing the entry with the same key.
+
+        :param extra: Other data to keep with the layer data, which needs to fit in JSON.
+        :return: Whether the layer data was stored. It isn't if it doesn't fit in the cache, or can't be written.
+        """
+
+        arrays, metadata = self._serialize(layer_data)
+        metadata["extra"] = extra if extra is not None else {}
+        header, offsets, size = self._layout(arrays, metadata)
+        if size > self._max_size:
+            self.remove(key)
+            return False
+
+        with self._lock:
+            self._generation += 1
+            file_name = "{key}-{generation}.layers".format(key = key, generation = self._generation)
+        path = os.path.join(self._directory, file_name)
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                for (name, array), offset in zip(arrays.items(), offsets):
+                    f.seek(offset)
+                    f.write(numpy.ascontiguousarray(array).tobytes())
+                f.truncate(size)
+            with self._lock:
+                os.replace(temp_path, path)
+                self._forget(key)
+                self._entries[key] = size
+                self._file_names[key] = file_name
+                self._evict()
+                self._removeStalePaths()
+        except OSError as e:
+            Logger.log("w", "Unable to write layer data to the cache: %s", str(e))
+            self._removeFile(temp_path)
+            self.remove(key)
+            return False
+        return True
+
+    def load(self, key: Hashable) -> Optional[LayerData]:
+        """Get the layer data of an entry, backed by its file.
+
+        :return: The layer data, or None if there is no (readable) entry for the key.
+        """
+
+        entry = self.loadWithExtra(key)
+        return entry[0] if entry is not None else None
+
+    def loadWithExtra(self, key: Hashable) -> Optional[Tuple[LayerData, Dict[str, Any]]]:
+        """Get the layer data of an entry, backed by its file, and the other data that was stored with it.
+
+        :return: The layer data and the other data, or None if there is no (readable) entry for the key.
+        """
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            path = self._getPath(key)
+
+        try:
+            if self._persistent:
+                os.utime(path)  # Remember that it was used, for the next sessions.
+            with open(path, "rb") as f:
+                magic, version, header_length = struct.unpack(self._header_format, f.read(struct.calcsize(self._header_format)))
+                if magic != self._magic or version != self.Version:
+                    raise ValueError("Unexpected file format version {version}".format(version = version))
+                metadata = json.loads(f.read(header_length).decode("utf-8"))
+            data = numpy.memmap(path, dtype = numpy.uint8, mode = "r")
+        except (OSError, ValueError) as e:
+            Logger.log("w", "Unable to read layer data from the cache: %s", str(e))
+            self.remove(key)
+            return None
+
+        arrays = {}  # type: Dict[str, numpy.ndarray]
+        for name, (dtype, shape, offset) in metadata["arrays"].items():
+            dtype = numpy.dtype(dtype)
+            count = int(numpy.prod(shape))
+            arrays[name] = data[offset:offset + count * dtype.itemsize].view(dtype).reshape(shape)
+        layer_data = self._deserialize(arrays, metadata)
+        weakref.finalize(layer_data, self._onMappingReleased)
+        return layer_data, metadata.get("extra", {})
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._forget(key)
+            self._removeStalePaths()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._forget(key)
+            self._removeStalePaths()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits its maximum size. Needs the lock."""
+
+        while self._entries and sum(self._entries.values()) > self._max_size:
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: Hashable) -> None:
+        """Remove an entry, leaving its file to be removed by _removeStalePaths. Needs the lock."""
+
+        self._entries.pop(key, None)
+        file_name = self._file_names.pop(key, None)
+        if file_name is not None:
+            self._stale_paths.append(os.path.join(self._directory, file_name))
+
+    def _removeStalePaths(self) -> None:
+        """Remove the files of the entries that were replaced or removed, if they aren't mapped anymore. Needs the lock."""
+
+        self._stale_paths = [path for path in self._stale_paths if not self._removeFile(path)]
+
+    def _onMappingReleased(self) -> None:
+        """Called when layer data that was loaded from the cache is released, so its file may be removed now."""
+
+        # This is called by the garbage collector, which may run while this thread holds the lock already. In that case
+        # the files are removed the next time that the cache is changed.
+        if self._lock.acquire(blocking = False):
+            try:
+                self._removeStalePaths()
+            finally:
+                self._lock.release()
+
+    def _getPath(self, key: Hashable) -> str:
+        """Get the path of the file of an entry. Needs the lock."""
+
+        return os.path.join(self._directory, self._file_names[key])
+
+    @staticmethod
+    def _removeFile(path: str) -> bool:
+        """Remove a file of the cache.
+
+        :return: Whether the file is gone.
+        """
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # On Windows, files that are mapped (by layer data that is still shown) can't be removed.
+            Logger.log("d", "Unable to remove %s from the layer data cache yet: %s", path, str(e))
+            return False
+        return True
+
+    def _layout(self, arrays: Dict[str, numpy.ndarray], metadata: Dict[str, Any]) -> Tuple[bytes, List[int], int]:
+        """Determine where each array goes in the file, after the header.
+
+        :return: The header, the offset of each array and the size of the file.
+        """
+
+        # The offsets are part of the header, so first find out how long the header is going to be with placeholders.
+        header_size = struct.calcsize(self._header_format) + len(self._encodeMetadata(arrays, metadata, [0] * len(arrays)))
+        header_size += 20 * len(arrays)  # Room for the digits of the real offsets.
+        offsets = []
+        position = header_size
+        for array in arrays.values():
+            position = -(-position // self._alignment) * self._alignment
+            offsets.append(position)
+            position += array.nbytes
+
+        metadata_bytes = self._encodeMetadata(arrays, metadata, offsets)
+        header = struct.pack(self._header_format, self._magic, self.Version, len(metadata_bytes)) + metadata_bytes
+        return header, offsets, position
+
+    @staticmethod
+    def _encodeMetadata(arrays: Dict[str, numpy.ndarray], metadata: Dict[str, Any], offsets: List[int]) -> bytes:
+        array_metadata = {name: (array.dtype.str, list(array.shape), offset) for (name, array), offset in zip(arrays.items(), offsets)}
+        return json.dumps(dict(metadata, arrays = array_metadata)).encode("utf-8")
+
+    @staticmethod
+    def _serialize(layer_data: LayerData) -> Tuple[Dict[str, numpy.ndarray], Dict[str, Any]]:
+        """Get the arrays and the other data to store for layer data."""
+
+        arrays = OrderedDict()  # type: Dict[str, numpy.ndarray]
+        arrays["vertices"] = layer_data.getVertices()
+        arrays["indices"] = layer_data.getIndices()
+        arrays["colors"] = layer_data.getCompactColors()
+        attributes = {}
+        for name in layer_data.attributeNames():
+            attribute = layer_data.getCompactAttribute(name)
+            arrays["attribute_" + name] = attribute["value"]
+            attributes[name] = {key: value for key, value in attribute.items() if key != "value"}
+
+        layer_numbers = sorted(layer_data.getLayers())
+        layers = [layer_data.getLayer(layer_number) for layer_number in layer_numbers]
+        segments = [layer.getSegments() for layer in layers]
+        arrays["segment_counts"] = numpy.array([len(layer_segments) for layer_segments in segments], dtype = numpy.int64)
+        arrays["line_counts"] = numpy.concatenate([numpy.diff(layer_segments.line_offsets) for layer_segments in segments] + [numpy.empty(0, numpy.int64)]).astype(numpy.int64)
+        arrays["point_counts"] = numpy.concatenate([numpy.diff(layer_segments.point_offsets) for layer_segments in segments] + [numpy.empty(0, numpy.int64)]).astype(numpy.int64)
+        all_segments = LayerSegments.concatenate(segments) if segments else LayerSegments.fromArrays([], [], [], [], [], [])
+        for name in ["extruders", "points", "line_types", "line_widths", "line_thicknesses", "line_feedrates"]:
+            arrays["segments_" + name] = getattr(all_segments, name)
+
+        element_counts = layer_data.getElementCounts()
+        metadata = {
+            "attributes": attributes,
+            "layers": [(int(layer_number), float(layer.height), float(layer.thickness), int(element_counts.get(layer_number, 0)))
+                       for layer_number, layer in zip(layer_numbers, layers)]
+        }
+        return arrays, metadata
+
+    @staticmethod
+    def _deserialize(arrays: Dict[str, numpy.ndarray], metadata: Dict[str, Any]) -> LayerData:
+        """Create layer data from the arrays and other data that were stored."""
+
+        segment_offsets = numpy.concatenate(([0], numpy.cumsum(arrays["segment_counts"])))
+        line_offsets = numpy.concatenate(([0], numpy.cumsum(arrays["line_counts"])))
+        point_offsets = numpy.concatenate(([0], numpy.cumsum(arrays["point_counts"])))
+        layers = {}
+        element_counts = {}
+        for index, (layer_number, height, thickness, element_count) in enumerate(metadata["layers"]):
+            segments = slice(segment_offsets[index], segment_offsets[index + 1] + 1)
+            layer_line_offsets = line_offsets[segments]
+            layer_point_offsets = point_offsets[segments]
+            lines = slice(layer_line_offsets[0], layer_line_offsets[-1])
+            points = slice(layer_point_offsets[0], layer_point_offsets[-1])
+            layer = Layer(layer_number)
+            layer.setHeight(height)
+            layer.setThickness(thickness)
+            layer.setElementCount(element_count)
+            layer.setSegments(LayerSegments(
+                extruders = arrays["segments_extruders"][segment_offsets[index]:segment_offsets[index + 1]],
+                points = arrays["segments_points"][points],
+                line_types = arrays["segments_line_types"][lines],
+                line_widths = arrays["segments_line_widths"][lines],
+                line_thicknesses = arrays["segments_line_thicknesses"][lines],
+                line_feedrates = arrays["segments_line_feedrates"][lines],
+                line_offsets = layer_line_offsets - layer_line_offsets[0],
+                point_offsets = layer_point_offsets - layer_point_offsets[0]
+            ))
+            layers[layer_number] = layer
+            element_counts[layer_number] = element_count
+
+        attributes = {name: dict(attribute, value = arrays["attribute_" + name]) for name, attribute in metadata["attributes"].items()}
+        return LayerData(vertices = arrays["vertices"], indices = arrays["indices"], colors = arrays["colors"],
+                         layers = layers, element_counts = element_counts, attributes = attributes)
@@ -26,7 +26,11 @@ class LayerPolygon:
 
     __jump_map = numpy.logical_or(numpy.logical_or(numpy.arange(__number_of_types) == NoneType, numpy.arange(__number_of_types) == MoveCombingType), numpy.arange(__number_of_types) == MoveRetractionType)
 
-    def __init__(self, extruder: int, line_types: numpy.ndarray, data: numpy.ndarray, line_widths: numpy.ndarray, line_thicknesses: numpy.ndarray, line_feedrates: numpy.ndarray) -> None:
+    # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
+    # Should be generated in better way, not hardcoded.
+    __is_infill_or_skin_type_map = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0], dtype = bool)
+
+    def __init__(self, extruder: int, line_types: numpy.ndarray, data: numpy.ndarray, line_widths: numpy.ndarray, line_thicknesses: numpy.ndarray, line_feedrates: numpy.ndarray, validated_types: bool = False) -> None:
         """LayerPolygon, used in ProcessSlicedLayersJob
 
         :param extruder: The position of the extruder
@@ -35,14 +39,14 @@ class LayerPolygon:
         :param line_widths: array with line widths
         :param line_thicknesses: array with type as index and thickness as value
         :param line_feedrates: array with line feedrates
+        :param validated_types: whether the line types were already checked with validateLineTypes, e.g. for all
+        polygons of a layer at once
         """
 
         self._extruder = extruder
         self._types = line_types
-        for i in range(len(self._types)):
-            if self._types[i] >= self.__number_of_types: # Got faulty line data from the engine.
-                Logger.log("w", "Found an unknown line type: %s", i)
-                self._types[i] = self.NoneType
+        if not validated_types:
+            self.validateLineTypes(self._types)
         self._data = data
         self._line_widths = line_widths
         self._line_thicknesses = line_thicknesses
@@ -63,13 +67,38 @@ class LayerPolygon:
         self._color_map = LayerPolygon.getColorMap()
         self._colors = self._color_map[self._types]  # type: numpy.ndarray
 
-        # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
-        # Should be generated in better way, not hardcoded.
-        self._is_infill_or_skin_type_map = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0], dtype = numpy.bool)
+        self._is_infill_or_skin_type_map = self.__is_infill_or_skin_type_map
 
         self._build_cache_line_mesh_mask = None  # type: Optional[numpy.ndarray]
         self._build_cache_needed_points = None  # type: Optional[numpy.ndarray]
 
+    @classmethod
+    def getJumpMap(cls) -> numpy.ndarray:
+        """Gets an array that tells for each line type whether lines of that type are jumps (travel moves)."""
+
+        return cls.__jump_map
+
+    @classmethod
+    def getInfillOrSkinTypeMap(cls) -> numpy.ndarray:
+        """Gets an array that tells for each line type whether it is infill or skin."""
+
+        return cls.__is_infill_or_skin_type_map
+
+    @classmethod
+    def validateLineTypes(cls, line_types: numpy.ndarray) -> int:
+        """Replace the line types that are unknown by NoneType.
+
+        :param line_types: The line types to validate. They are changed in place.
+        :return: The number of line types that were replaced.
+        """
+
+        unknown_types = line_types >= cls.__number_of_types
+        unknown_type_count = int(numpy.count_nonzero(unknown_types))
+        if unknown_type_count > 0:  # Got faulty line data from the engine.
+            Logger.log("w", "Found %s lines with an unknown line type", unknown_type_count)
+            line_types[unknown_types] = cls.NoneType
+        return unknown_type_count
+
     def buildCache(self) -> None:
         # For the line mesh we do not draw Infill or Jumps. Therefore those lines are filtered out.
         self._build_cache_line_mesh_mask = numpy.ones(self._jump_mask.shape, dtype = bool)
@@ -0,0 +1,137 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy
+
+from cura.LayerSegments import Buffer, LayerSegments
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Before Python 3.8.
+    shared_memory = None
+
+# The arrays of LayerSegments that are sent back from the workers.
+_array_names = ["extruders", "points", "line_types", "line_widths", "line_thicknesses", "line_feedrates", "line_offsets", "point_offsets"]
+_alignment = 8
+
+# Where each array is in the shared memory of a result: the name, type, shape and offset of each array.
+Layout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+
+class LayerProcessingPool:
+    """Converts the path segments of layers in worker processes, next to the thread (and the GIL) of the front-end.
+
+    The raw buffers of a layer message are sent to a worker, which converts them to LayerSegments. The arrays of the
+    result are sent back through shared memory, so only the buffers of the message are pickled. The worker processes
+    are started when the first layer is submitted, and kept until the pool is shut down.
+    """
+
+    def __init__(self, worker_count: int) -> None:
+        self._worker_count = worker_count
+        # Workers are always spawned: forking would copy the whole front-end, including the threads of Qt.
+        self._executor = ProcessPoolExecutor(max_workers = worker_count, mp_context = multiprocessing.get_context("spawn"))
+
+    @staticmethod
+    def isSupported() -> bool:
+        """Whether this Python has the shared memory that the results are sent back with."""
+
+        return shared_memory is not None
+
+    def getWorkerCount(self) -> int:
+        return self._worker_count
+
+    def submit(self, layer_height: float, extruders: Sequence[int], point_types: Sequence[int],
+               points: Sequence[Buffer], line_types: Sequence[Buffer], line_widths: Sequence[Buffer],
+               line_thicknesses: Sequence[Buffer], line_feedrates: Sequence[Buffer]) -> "Future":
+        """Start converting the path segments of a layer. The arguments are those of LayerSegments.fromBuffers.
+
+        :return: The future to get the segments from with getSegments, or to drop with discard.
+        """
+
+        return self._executor.submit(_convertLayer, layer_height, list(extruders), list(point_types),
+                                     [bytes(buffer) for buffer in points], [bytes(buffer) for buffer in line_types],
+                                     [bytes(buffer) for buffer in line_widths], [bytes(buffer) for buffer in line_thicknesses],
+                                     [bytes(buffer) for buffer in line_feedrates])
+
+    @staticmethod
+    def getSegments(future: "Future", timeout: Optional[float] = None) -> LayerSegments:
+        """Get the segments that a worker converted, waiting for them if needed.
+
+        The arrays are copied out of the shared memory, which is freed.
+
+        :raise concurrent.futures.TimeoutError: If the segments are not converted within the timeout.
+        """
+
+        name, size, layout = future.result(timeout)
+        memory = shared_memory.SharedMemory(name = name)
+        try:
+            shared = numpy.ndarray((size, ), dtype = numpy.uint8, buffer = memory.buf)
+            data = shared.copy()
+            del shared  # The shared memory can't be closed while an array uses it.
+        finally:
+            memory.close()
+            memory.unlink()
+
+        arrays = {}
+        for array_name, dtype, shape, offset in layout:
+            arrays[array_name] = numpy.ndarray(shape, dtype = numpy.dtype(dtype), buffer = data, offset = offset)
+        return LayerSegments(**arrays)
+
+    @staticmethod
+    def discard(future: "Future") -> None:
+        """Drop a submitted layer. Its shared memory is freed as soon as the worker is done with it."""
+
+        if not future.cancel():
+            future.add_done_callback(_freeResult)
+
+    def shutdown(self) -> None:
+        """Stop the workers. The layers that are still being converted are finished, but no longer waited for."""
+
+        self._executor.shutdown(wait = False)
+
+
+def _convertLayer(layer_height: float, extruders: List[int], point_types: List[int], points: List[bytes],
+                  line_types: List[bytes], line_widths: List[bytes], line_thicknesses: List[bytes],
+                  line_feedrates: List[bytes]) -> Tuple[str, int, Layout]:
+    """Convert the path segments of a layer in a worker, putting the arrays of the result in shared memory.
+
+    :return: The name of the shared memory, its size and where each array is in it.
+    """
+
+    segments = LayerSegments.fromBuffers(layer_height, extruders, point_types, points, line_types, line_widths,
+                                         line_thicknesses, line_feedrates)
+    layout = []  # type: Layout
+    size = 0
+    for array_name in _array_names:
+        array = getattr(segments, array_name)
+        layout.append((array_name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // _alignment) * _alignment
+
+    memory = shared_memory.SharedMemory(create = True, size = max(size, 1))
+    try:
+        for array_name, dtype, shape, offset in layout:
+            numpy.ndarray(shape, dtype = numpy.dtype(dtype), buffer = memory.buf, offset = offset)[...] = getattr(segments, array_name)
+    except Exception:
+        memory.close()
+        memory.unlink()
+        raise
+    memory.close()
+    return memory.name, size, layout
+
+
+def _freeResult(future: "Future") -> None:
+    """Free the shared memory of a result that nobody is going to read."""
+
+    if future.cancelled() or future.exception() is not None:
+        return
+    name, _, _ = future.result()
+    try:
+        memory = shared_memory.SharedMemory(name = name)
+    except FileNotFoundError:
+        return
+    memory.close()
+    memory.unlink()
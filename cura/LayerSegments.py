@@ -0,0 +1,254 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from typing import Sequence, Tuple, Union
+
+import numpy
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class LayerSegments:
+    """All path segments of one layer, with the data of all segments stored in one array per attribute.
+
+    Segment i consists of the lines line_offsets[i]:line_offsets[i + 1] and the points
+    point_offsets[i]:point_offsets[i + 1]. Each segment has one point more than it has lines.
+    """
+
+    def __init__(self, extruders: numpy.ndarray, points: numpy.ndarray, line_types: numpy.ndarray,
+                 line_widths: numpy.ndarray, line_thicknesses: numpy.ndarray, line_feedrates: numpy.ndarray,
+                 line_offsets: numpy.ndarray, point_offsets: numpy.ndarray) -> None:
+        self.extruders = extruders
+        self.points = points
+        self.line_types = line_types
+        self.line_widths = line_widths
+        self.line_thicknesses = line_thicknesses
+        self.line_feedrates = line_feedrates
+        self.line_offsets = line_offsets
+        self.point_offsets = point_offsets
+
+    def __len__(self) -> int:
+        return len(self.extruders)
+
+    def getLines(self, segment: int) -> slice:
+        return slice(int(self.line_offsets[segment]), int(self.line_offsets[segment + 1]))
+
+    def getPoints(self, segment: int) -> slice:
+        return slice(int(self.point_offsets[segment]), int(self.point_offsets[segment + 1]))
+
+    def getPolygonOfLines(self) -> numpy.ndarray:
+        """Get the index of the segment that each line belongs to."""
+
+        return numpy.repeat(numpy.arange(len(self.extruders), dtype = numpy.int32), numpy.diff(self.line_offsets))
+
+    def getStartPoints(self, polygon_of_lines: numpy.ndarray) -> numpy.ndarray:
+        """Get the index of the point that each line starts at. The line ends at the next point."""
+
+        line_offsets = self.line_offsets[:-1]
+        point_offsets = self.point_offsets[:-1]
+        return (point_offsets - line_offsets).astype(numpy.int32)[polygon_of_lines] + numpy.arange(len(polygon_of_lines), dtype = numpy.int32)
+
+    def getNeededStartPoints(self) -> numpy.ndarray:
+        """Get which lines need a vertex of their own for their starting point in the line mesh.
+
+        This is the same as LayerPolygon.buildCache does: the starting point of a line is shared with the end point of
+        the previous line, unless it is the first line of a segment or the type of line changes (to change colors).
+        """
+
+        types = self.line_types.ravel()
+        needed = numpy.ones(len(types), dtype = bool)
+        needed[1:] = types[1:] != types[:-1]
+        line_counts = numpy.diff(self.line_offsets)
+        needed[self.line_offsets[:-1][line_counts > 0]] = True
+        return needed
+
+    def getLineMeshGather(self) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Get the indices to gather the vertex attributes of the line mesh with.
+
+        With these, each attribute of the line mesh can be filled with a single indexing operation, e.g. the vertices
+        are points[point_of_vertices] and the feedrates are line_feedrates[line_of_vertices].
+
+        :return: A tuple of the line of each vertex, the point of each vertex, the segment of each vertex and the
+        (relative) vertex that each line ends at. Each line goes from the vertex before its end vertex to the end vertex.
+        """
+
+        # Each line has a vertex for its end point, and one for its start point if needed.
+        needed_start_points = self.getNeededStartPoints()
+        vertex_counts = needed_start_points.view(numpy.uint8) + numpy.uint8(1)
+        line_of_vertices = numpy.repeat(numpy.arange(len(vertex_counts), dtype = numpy.int32), vertex_counts)
+        end_vertices = numpy.cumsum(vertex_counts, dtype = numpy.int32) - 1
+
+        # The indices are kept 32 bits, since there is one of them for every vertex in the print.
+        polygon_of_lines = self.getPolygonOfLines()
+        polygon_of_vertices = polygon_of_lines[line_of_vertices]
+        point_of_vertices = self.getStartPoints(polygon_of_lines)[line_of_vertices] + 1
+        point_of_vertices[end_vertices[needed_start_points] - 1] -= 1
+        return line_of_vertices, point_of_vertices, polygon_of_vertices, end_vertices
+
+    def fillLineMesh(self, gather: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray], vertex_offset: int,
+                     index_offset: int, color_map: numpy.ndarray, vertices: numpy.ndarray, colors: numpy.ndarray,
+                     line_dimensions: numpy.ndarray, feedrates: numpy.ndarray, extruders: numpy.ndarray,
+                     line_types: numpy.ndarray, indices: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Fill the arrays of the line mesh of all segments at once, in the same way LayerPolygon.build does.
+
+        :param gather: The indices to gather the vertex attributes with, as returned by getLineMeshGather.
+        :param vertex_offset: The vertex in the arrays to start filling at.
+        :param index_offset: The index in the arrays to start filling at.
+        :param color_map: The color of each line type.
+        :return: The line type and the extruder of each vertex that was filled in.
+        """
+
+        line_of_vertices, point_of_vertices, polygon_of_vertices, end_vertices = gather
+        new_vertices = slice(vertex_offset, vertex_offset + len(line_of_vertices))
+        vertex_types = self.line_types.ravel()[line_of_vertices]
+        vertex_extruders = self.extruders[polygon_of_vertices]
+
+        self._gatherInto(self.points, point_of_vertices, vertices[new_vertices])
+        self._gatherInto(color_map, vertex_types, colors[new_vertices])
+        line_dimensions[new_vertices, 0] = self.line_widths.ravel()[line_of_vertices]
+        line_dimensions[new_vertices, 1] = self.line_thicknesses.ravel()[line_of_vertices]
+        feedrates[new_vertices] = self.line_feedrates.ravel()[line_of_vertices]
+        extruders[new_vertices] = vertex_extruders
+        line_types[new_vertices] = vertex_types
+
+        # Each line goes from the vertex before its end point to its end point.
+        end_vertices = end_vertices + vertex_offset
+        new_indices = slice(index_offset, index_offset + len(end_vertices))
+        indices[new_indices, 0] = end_vertices - 1
+        indices[new_indices, 1] = end_vertices
+        return vertex_types, vertex_extruders
+
+    @staticmethod
+    def _gatherInto(source: numpy.ndarray, gather_indices: numpy.ndarray, out: numpy.ndarray) -> None:
+        """Gather rows of an array into another array.
+
+        If possible, the rows are written directly into the other array, to not need a temporary copy of them. The
+        indices are valid by construction, so they don't need to be checked (which would make numpy buffer them).
+        """
+
+        if out.dtype == source.dtype and out.flags.c_contiguous:
+            numpy.take(source, gather_indices, axis = 0, out = out, mode = "clip")
+        else:
+            out[...] = source[gather_indices]
+
+    @classmethod
+    def fromBuffers(cls, layer_height: float, extruders: Sequence[int], point_types: Sequence[int],
+                    points: Sequence[Buffer], line_types: Sequence[Buffer], line_widths: Sequence[Buffer],
+                    line_thicknesses: Sequence[Buffer], line_feedrates: Sequence[Buffer]) -> "LayerSegments":
+        """Convert the raw buffers of the path segments of a layer, as sent by the engine.
+
+        The buffers of all segments are joined into one array per attribute, which is the only copy that is made of
+        them. The points are converted from the coordinate system of the engine to 3D points in the coordinate system
+        of the front-end in one go for the whole layer, filling in the height for 2D points.
+
+        :param layer_height: The height of the layer in the representation of the back-end (microns).
+        :param extruders: The extruder of each segment.
+        :param point_types: The type of points of each segment: 0 for 2D points, 1 for 3D points.
+        :param points: For each segment, a buffer of float32 coordinates.
+        :param line_types: For each segment, a buffer with a uint8 line type per line.
+        :param line_widths: For each segment, a buffer with a float32 width per line.
+        :param line_thicknesses: For each segment, a buffer with a float32 thickness per line.
+        :param line_feedrates: For each segment, a buffer with a float32 feedrate per line.
+        """
+
+        point_types_array = numpy.array(point_types, dtype = numpy.uint8)
+        is_2d = point_types_array == 0
+        point_counts = numpy.array([len(buffer) for buffer in points], dtype = numpy.int64) // numpy.where(is_2d, 8, 12)
+        line_counts = numpy.array([len(buffer) for buffer in line_types], dtype = numpy.int64)
+
+        # Row i of the result belongs to a segment with 2D points if is_2d_point[i].
+        is_2d_point = numpy.repeat(is_2d, point_counts)
+        new_points = numpy.empty((len(is_2d_point), 3), numpy.float32)
+        if is_2d.all():
+            points_2d = cls._joinBuffers(points, numpy.float32).reshape((-1, 2))
+            new_points[:, 0] = points_2d[:, 0]
+            new_points[:, 1] = layer_height / 1000  # layer height value is in backend representation
+            new_points[:, 2] = -points_2d[:, 1]
+        else:
+            # Segments with 2D points and segments with 3D points are mixed, so convert each type separately.
+            points_2d = cls._joinBuffers([buffer for buffer, flat in zip(points, is_2d) if flat], numpy.float32).reshape((-1, 2))
+            points_3d = cls._joinBuffers([buffer for buffer, flat in zip(points, is_2d) if not flat], numpy.float32).reshape((-1, 3))
+            new_points[is_2d_point, 0] = points_2d[:, 0]
+            new_points[is_2d_point, 1] = layer_height / 1000
+            new_points[is_2d_point, 2] = -points_2d[:, 1]
+            is_3d_point = numpy.logical_not(is_2d_point)
+            new_points[is_3d_point, 0] = points_3d[:, 0]
+            new_points[is_3d_point, 1] = points_3d[:, 2]
+            new_points[is_3d_point, 2] = -points_3d[:, 1]
+
+        return cls(
+            extruders = numpy.array(extruders, dtype = numpy.int32),
+            points = new_points,
+            line_types = cls._joinBuffers(line_types, numpy.uint8).reshape((-1, 1)),
+            line_widths = cls._joinBuffers(line_widths, numpy.float32).reshape((-1, 1)),
+            line_thicknesses = cls._joinBuffers(line_thicknesses, numpy.float32).reshape((-1, 1)),
+            line_feedrates = cls._joinBuffers(line_feedrates, numpy.float32).reshape((-1, 1)),
+            line_offsets = numpy.concatenate(([0], numpy.cumsum(line_counts))),
+            point_offsets = numpy.concatenate(([0], numpy.cumsum(point_counts)))
+        )
+
+    @classmethod
+    def fromArrays(cls, extruders: Sequence[int], points: Sequence[numpy.ndarray], line_types: Sequence[numpy.ndarray],
+                   line_widths: Sequence[numpy.ndarray], line_thicknesses: Sequence[numpy.ndarray],
+                   line_feedrates: Sequence[numpy.ndarray]) -> "LayerSegments":
+        """Join the arrays of separate paths, e.g. those of LayerPolygons.
+
+        :param extruders: The extruder of each path.
+        :param points: For each path, an array with its 3D points in the coordinate system of the front-end.
+        :param line_types: For each path, an array with the (validated) type per line.
+        :param line_widths: For each path, an array with the width per line.
+        :param line_thicknesses: For each path, an array with the thickness per line.
+        :param line_feedrates: For each path, an array with the feedrate per line.
+        """
+
+        line_counts = numpy.array([len(types) for types in line_types], dtype = numpy.int64)
+        point_counts = numpy.array([len(path_points) for path_points in points], dtype = numpy.int64)
+        return cls(
+            extruders = numpy.array(extruders, dtype = numpy.int32),
+            points = cls._joinArrays(points, numpy.float32, 3),
+            line_types = cls._joinArrays(line_types, numpy.uint8, 1),
+            line_widths = cls._joinArrays(line_widths, numpy.float32, 1),
+            line_thicknesses = cls._joinArrays(line_thicknesses, numpy.float32, 1),
+            line_feedrates = cls._joinArrays(line_feedrates, numpy.float32, 1),
+            line_offsets = numpy.concatenate(([0], numpy.cumsum(line_counts))),
+            point_offsets = numpy.concatenate(([0], numpy.cumsum(point_counts)))
+        )
+
+    @classmethod
+    def concatenate(cls, segments: Sequence["LayerSegments"]) -> "LayerSegments":
+        """Join the segments of several layers, so that they can be processed in one go."""
+
+        if len(segments) == 1:
+            return segments[0]
+        line_counts = numpy.array([len(layer_segments.line_types) for layer_segments in segments], dtype = numpy.int64)
+        point_counts = numpy.array([len(layer_segments.points) for layer_segments in segments], dtype = numpy.int64)
+        line_shifts = numpy.concatenate(([0], numpy.cumsum(line_counts)[:-1]))
+        point_shifts = numpy.concatenate(([0], numpy.cumsum(point_counts)[:-1]))
+        return cls(
+            extruders = cls._joinArrays([layer_segments.extruders for layer_segments in segments], numpy.int32),
+            points = cls._joinArrays([layer_segments.points for layer_segments in segments], numpy.float32, 3),
+            line_types = cls._joinArrays([layer_segments.line_types for layer_segments in segments], numpy.uint8, 1),
+            line_widths = cls._joinArrays([layer_segments.line_widths for layer_segments in segments], numpy.float32, 1),
+            line_thicknesses = cls._joinArrays([layer_segments.line_thicknesses for layer_segments in segments], numpy.float32, 1),
+            line_feedrates = cls._joinArrays([layer_segments.line_feedrates for layer_segments in segments], numpy.float32, 1),
+            line_offsets = numpy.concatenate([[0]] + [layer_segments.line_offsets[1:] + shift for layer_segments, shift in zip(segments, line_shifts)]),
+            point_offsets = numpy.concatenate([[0]] + [layer_segments.point_offsets[1:] + shift for layer_segments, shift in zip(segments, point_shifts)])
+        )
+
+    @staticmethod
+    def _joinArrays(arrays: Sequence[numpy.ndarray], dtype: type, columns: int = 0) -> numpy.ndarray:
+        """Join arrays into a single array of the given type, with the given number of columns (0 for a flat array)."""
+
+        shape = (-1, columns) if columns else (-1, )
+        if not arrays:
+            return numpy.empty((0, columns) if columns else (0, ), dtype = dtype)
+        return numpy.concatenate([numpy.asarray(array).reshape(shape) for array in arrays]).astype(dtype, copy = False)
+
+    @staticmethod
+    def _joinBuffers(buffers: Sequence[Buffer], dtype: type) -> numpy.ndarray:
+        """Join buffers into a single array, without copying the data more than once.
+
+        The result is writable, since it is backed by a new bytearray rather than by the (immutable) input buffers.
+        """
+
+        return numpy.frombuffer(bytearray().join(buffers), dtype = dtype)
@@ -0,0 +1,133 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy
+
+from UM.Mesh.MeshData import MeshData
+
+
+class MeshPayloadCache:
+    """Keeps the vertices that were sent to the engine for each mesh, in the position that the mesh was in.
+
+    Building the vertices of an object for a slice message means transforming all of its vertices and expanding its
+    indices. When only a few objects on the build plate changed since the previous slice, the vertices of the others
+    can be sent again as they are.
+
+    An entry is found by the mesh data and the world transformation of the object. Mesh data is never changed once it
+    is created (a changed mesh is a new MeshData), so the identity of the mesh data and the transformation together
+    determine the vertices. Each entry refers to its mesh data weakly, so the meshes of deleted objects aren't kept in
+    memory. If the mesh data is gone, its identity may be reused by another mesh, so the entry no longer matches. The
+    entries of meshes that are gone are removed when other vertices are stored.
+
+    The hash of the vertices of an entry is kept with them once it's requested, so the vertices of objects that didn't
+    change don't need to be hashed again for the key of the slice result cache.
+
+    The total size of the vertices is bounded. When it is exceeded, the least recently used entries are removed.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        :param max_size: The maximum total size of the vertices in bytes.
+        """
+
+        self._max_size = max_size
+        self._size = 0
+        self._entries = OrderedDict()  # type: OrderedDict[Tuple[int, bytes], Tuple[weakref.ReferenceType, numpy.ndarray, Optional[bytes]]] # Least recently used first.
+        self._lock = threading.Lock()  # Entries are used from the start slice job, and cleared from the main thread.
+
+    def setMaxSize(self, max_size: int) -> None:
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def getSize(self) -> int:
+        """Get the total size of the vertices in bytes."""
+
+        with self._lock:
+            return self._size
+
+    def get(self, mesh_data: MeshData, transformation: numpy.ndarray) -> Optional[numpy.ndarray]:
+        """Get the vertices of a mesh in a position, as they were stored.
+
+        :param transformation: The world transformation matrix of the object.
+        :return: The vertices, or None if they are not in the cache.
+        """
+
+        key = self._getKey(mesh_data, transformation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0]() is not mesh_data:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def store(self, mesh_data: MeshData, transformation: numpy.ndarray, vertices: numpy.ndarray) -> None:
+        """Store the vertices of a mesh in a position.
+
+        The vertices are made read-only, since they are shared by every slice message that they are sent in.
+        """
+
+        if vertices.nbytes > self._max_size:
+            return
+        vertices.flags.writeable = False
+        key = self._getKey(mesh_data, transformation)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1].nbytes
+            self._entries[key] = (weakref.ref(mesh_data), vertices, None)
+            self._size += vertices.nbytes
+            self._removeUnused()
+            self._evict()
+
+    def getDigest(self, mesh_data: MeshData, transformation: numpy.ndarray, vertices: numpy.ndarray) -> bytes:
+        """Get the hash of the vertices of a mesh in a position.
+
+        If the vertices are the ones in the cache, their hash is only computed the first time.
+
+        :param transformation: The world transformation matrix of the object.
+        :param vertices: The vertices of the mesh in that position.
+        """
+
+        key = self._getKey(mesh_data, transformation)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is mesh_data and entry[1] is vertices and entry[2] is not None:
+                return entry[2]
+
+        digest = self.hashVertices(vertices)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is mesh_data and entry[1] is vertices:
+                self._entries[key] = (entry[0], vertices, digest)
+        return digest
+
+    @staticmethod
+    def hashVertices(vertices: numpy.ndarray) -> bytes:
+        return hashlib.sha256(numpy.ascontiguousarray(vertices)).digest()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _removeUnused(self) -> None:
+        """Remove the entries of which the mesh data is gone."""
+
+        for key in [key for key, (mesh_reference, _, _) in self._entries.items() if mesh_reference() is None]:
+            self._size -= self._entries.pop(key)[1].nbytes
+
+    def _evict(self) -> None:
+        while self._entries and self._size > self._max_size:
+            _, (_, vertices, _) = self._entries.popitem(last = False)
+            self._size -= vertices.nbytes
+
+    @staticmethod
+    def _getKey(mesh_data: MeshData, transformation: numpy.ndarray) -> Tuple[int, bytes]:
+        return id(mesh_data), numpy.ascontiguousarray(transformation, dtype = numpy.float64).tobytes()
@@ -12,8 +12,10 @@ from cura.PrinterOutput.PrinterOutputDevice import PrinterOutputDevice, Connecti
 from PyQt5.QtNetwork import QHttpMultiPart, QHttpPart, QNetworkRequest, QNetworkAccessManager, QNetworkReply, QAuthenticator
 from PyQt5.QtCore import pyqtProperty, pyqtSignal, pyqtSlot, QObject, QUrl, QCoreApplication
 from time import time
-from typing import Callable, Dict, List, Optional, Union
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Union
 from enum import IntEnum
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
 
 import os  # To get the username
 import gzip
@@ -32,6 +34,14 @@ class AuthState(IntEnum):
 class NetworkedPrinterOutputDevice(PrinterOutputDevice):
     authenticationStateChanged = pyqtSignal()
 
+    # The number of characters of g-code that are compressed into each gzip member.
+    _compression_batch_size = int(1024 * 1024 / 4)  # 1/4 MB per member.
+
+    # The threads that compress the g-code, shared by all devices. zlib releases the GIL while it compresses, so the
+    # members are compressed in parallel without the cost of sending the g-code to other processes.
+    _compression_pool = None  # type: Optional[ThreadPoolExecutor]
+    _compression_worker_count = max(1, os.cpu_count() or 1)
+
     def __init__(self, device_id, address: str, properties: Dict[bytes, bytes], connection_type: ConnectionType = ConnectionType.NetworkConnection, parent: QObject = None) -> None:
         super().__init__(device_id = device_id, connection_type = connection_type, parent = parent)
         self._manager = None    # type: Optional[QNetworkAccessManager]
@@ -71,47 +81,110 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
     def authenticationState(self) -> AuthState:
         return self._authentication_state
 
-    def _compressDataAndNotifyQt(self, data_to_append: str) -> bytes:
-        compressed_data = gzip.compress(data_to_append.encode("utf-8"))
+    def _notifyQtWhileCompressing(self) -> None:
         self._progress_message.setProgress(-1)  # Tickle the message so that it's clear that it's still being used.
         QCoreApplication.processEvents()  # Ensure that the GUI does not freeze.
 
         # Pretend that this is a response, as zipping might take a bit of time.
         # If we don't do this, the device might trigger a timeout.
         self._last_response_time = time()
-        return compressed_data
 
     def _compressGCode(self) -> Optional[bytes]:
+        """Compress the g-code to send to the printer.
+
+        :return: The gzipped g-code, or None if the compression was aborted.
+        """
+
+        file_data_bytes_list = list(self._compressGCodeMembers())
+        if not self._compressing_gcode:
+            return None  # Aborted.
+        self._compressing_gcode = False
+        return b"".join(file_data_bytes_list)
+
+    def _compressGCodeMembers(self) -> Iterator[bytes]:
+        """Compress the g-code in parallel, as a series of gzip members.
+
+        Batches of g-code are compressed by the compression threads into independent gzip members. Concatenated
+        members are a valid gzip file, so they can be sent one after the other. The members are yielded in order as
+        soon as each of them is done, so an upload can start sending while the rest is still being compressed. Only a
+        few batches are compressed ahead, to not keep the whole compressed g-code in memory.
+
+        While waiting for the threads, the GUI is kept responsive. The compression stops when _compressing_gcode is
+        set to False (when the upload is aborted). Afterwards, _compressing_gcode is still True if all the g-code was
+        compressed, for the caller to reset.
+        """
+
         self._compressing_gcode = True
+        compression_level = self._getCompressionLevel()
+        pool = self._getCompressionPool()
+        pending = deque()  # type: Deque[Future]
 
-        max_chars_per_line = int(1024 * 1024 / 4)  # 1/4 MB per line.
-        """Mash the data into single string"""
-        file_data_bytes_list = []
-        batched_lines = []
+        # if the gcode was read from a gcode file, self._gcode will be a list of all lines in that file.
+        # Compressing line by line in this case is extremely slow, so we need to batch them.
+        batched_lines = []  # type: List[str]
         batched_lines_count = 0
-
         for line in self._gcode:
             if not self._compressing_gcode:
-                self._progress_message.hide()
-                # Stop trying to zip / send as abort was called.
-                return None
-
-            # if the gcode was read from a gcode file, self._gcode will be a list of all lines in that file.
-            # Compressing line by line in this case is extremely slow, so we need to batch them.
+                break
             batched_lines.append(line)
             batched_lines_count += len(line)
+            if batched_lines_count < self._compression_batch_size:
+                continue
+
+            pending.append(pool.submit(_compressBatch, batched_lines, compression_level))
+            batched_lines = []
+            batched_lines_count = 0
+            # Send on the members that are done. Only wait for them when enough batches are waiting to be compressed.
+            while pending and (pending[0].done() or len(pending) > 2 * self._compression_worker_count):
+                member = self._waitForMember(pending.popleft())
+                if member is None:
+                    break
+                yield member
+        else:
+            # Don't miss the last batch (If any)
+            if batched_lines:
+                pending.append(pool.submit(_compressBatch, batched_lines, compression_level))
+            while pending:
+                member = self._waitForMember(pending.popleft())
+                if member is None:
+                    break
+                yield member
+
+        if not self._compressing_gcode:
+            # Stop trying to zip / send as abort was called.
+            for future in pending:
+                future.cancel()
+            self._progress_message.hide()
+
+    def _waitForMember(self, future: "Future") -> Optional[bytes]:
+        """Wait for a compression thread to finish a gzip member, keeping the GUI responsive in the meantime.
+
+        :return: The member, or None if the compression was aborted while waiting.
+        """
 
-            if batched_lines_count >= max_chars_per_line:
-                file_data_bytes_list.append(self._compressDataAndNotifyQt("".join(batched_lines)))
-                batched_lines = []
-                batched_lines_count = 0
+        while self._compressing_gcode:
+            try:
+                member = future.result(timeout = 0.05)
+            except TimeoutError:
+                self._notifyQtWhileCompressing()
+                continue
+            self._notifyQtWhileCompressing()
+            return member
+        return None
+
+    @staticmethod
+    def _getCompressionLevel() -> int:
+        try:
+            compression_level = int(CuraApplication.getInstance().getPreferences().getValue("network/gcode_compression_level"))
+        except (TypeError, ValueError):
+            return 9
+        return min(max(compression_level, 1), 9)
 
-        # Don't miss the last batch (If any)
-        if len(batched_lines) != 0:
-            file_data_bytes_list.append(self._compressDataAndNotifyQt("".join(batched_lines)))
-
-        self._compressing_gcode = False
-        return b"".join(file_data_bytes_list)
+    @classmethod
+    def _getCompressionPool(cls) -> ThreadPoolExecutor:
+        if cls._compression_pool is None:
+            NetworkedPrinterOutputDevice._compression_pool = ThreadPoolExecutor(max_workers = cls._compression_worker_count, thread_name_prefix = "GCodeCompression")
+        return NetworkedPrinterOutputDevice._compression_pool
 
     def _update(self) -> None:
         if self._last_response_time:
@@ -417,3 +490,9 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
         """IP adress of this printer"""
 
         return self._address
+
+
+def _compressBatch(lines: List[str], compression_level: int) -> bytes:
+    """Compress a batch of g-code lines into a gzip member. This is run by the compression threads."""
+
+    return gzip.compress("".join(lines).encode("utf-8"), compression_level)
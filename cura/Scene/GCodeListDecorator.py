@@ -1,11 +1,11 @@
 from UM.Scene.SceneNodeDecorator import SceneNodeDecorator
-from typing import List, Optional
+from typing import MutableSequence, Optional
 
 
 class GCodeListDecorator(SceneNodeDecorator):
     def __init__(self) -> None:
         super().__init__()
-        self._gcode_list = []  # type: List[str]
+        self._gcode_list = []  # type: MutableSequence[str] # Usually a GCodeBuffer.
         self._filename = None  # type: Optional[str]
 
     def getGcodeFileName(self) -> Optional[str]:
@@ -14,10 +14,10 @@ class GCodeListDecorator(SceneNodeDecorator):
     def setGcodeFileName(self, filename: str) -> None:
         self._filename = filename
 
-    def getGCodeList(self) -> List[str]:
+    def getGCodeList(self) -> MutableSequence[str]:
         return self._gcode_list
 
-    def setGCodeList(self, gcode_list: List[str]) -> None:
+    def setGCodeList(self, gcode_list: MutableSequence[str]) -> None:
         self._gcode_list = gcode_list
 
     def __deepcopy__(self, memo) -> "GCodeListDecorator":
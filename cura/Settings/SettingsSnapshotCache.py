@@ -0,0 +1,96 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import threading
+from typing import Any, List, Optional, Tuple, TYPE_CHECKING
+
+from UM.Settings.ContainerStack import ContainerStack
+
+if TYPE_CHECKING:
+    from cura.Settings.GlobalStack import GlobalStack
+
+
+class SettingsSnapshotCache:
+    """Keeps the setting values that were evaluated for a slice, until a setting of the active machine changes.
+
+    Evaluating all settings of the global stack and the extruder stacks takes a while. When the scene changes but the
+    settings don't, the values of the previous slice are still valid.
+
+    The cache watches the stacks of the active machine. Each value change or change of containers in one of them
+    increments the revision of the cache. A snapshot is stored with the revision from before it was evaluated, so a
+    snapshot that was evaluated while the settings changed is never used. It is also only used for the same stacks
+    that it was made of (e.g. not after an extruder was disabled).
+    """
+
+    def __init__(self) -> None:
+        self._global_stack = None  # type: Optional[GlobalStack]
+        self._revision = 0
+        self._snapshot = None  # type: Optional[Any]
+        self._snapshot_key = None  # type: Optional[Tuple[int, Tuple[int, ...]]]
+        self._lock = threading.Lock()  # Snapshots are made in the start slice job, while settings change on the main thread.
+
+    def setGlobalStack(self, global_stack: Optional["GlobalStack"]) -> None:
+        """Watch the stacks of another machine. This drops the snapshot of the previous machine."""
+
+        if self._global_stack is not None:
+            for stack in [self._global_stack] + self._global_stack.extruderList:
+                stack.propertyChanged.disconnect(self._onPropertyChanged)
+                stack.containersChanged.disconnect(self._onChanged)
+
+        self._global_stack = global_stack
+
+        if self._global_stack is not None:
+            for stack in [self._global_stack] + self._global_stack.extruderList:
+                stack.propertyChanged.connect(self._onPropertyChanged)
+                stack.containersChanged.connect(self._onChanged)
+        self._onChanged()
+
+    def getRevision(self) -> int:
+        """Get the revision to store a snapshot with. Get it before evaluating the settings of the snapshot."""
+
+        with self._lock:
+            return self._revision
+
+    def get(self, stacks: List[ContainerStack]) -> Optional[Any]:
+        """Get the snapshot of the current settings of some stacks.
+
+        :return: The snapshot, or None if there is none or the settings changed since it was made.
+        """
+
+        with self._lock:
+            if self._snapshot_key != self._getKey(self._revision, stacks):
+                return None
+            return self._snapshot
+
+    def store(self, revision: int, stacks: List[ContainerStack], snapshot: Any) -> None:
+        """Store a snapshot of the settings of some stacks.
+
+        :param revision: The revision from before the settings were evaluated. If the settings changed since then, the
+            snapshot is not stored.
+        """
+
+        with self._lock:
+            if revision != self._revision or not self._isWatched(stacks):
+                return  # Changes to the settings of stacks that are not watched would go unnoticed.
+            self._snapshot = snapshot
+            self._snapshot_key = self._getKey(revision, stacks)
+
+    def _isWatched(self, stacks: List[ContainerStack]) -> bool:
+        if self._global_stack is None:
+            return False
+        watched_stacks = [self._global_stack] + self._global_stack.extruderList
+        return all(any(stack is watched_stack for watched_stack in watched_stacks) for stack in stacks)
+
+    @staticmethod
+    def _getKey(revision: int, stacks: List[ContainerStack]) -> Tuple[int, Tuple[int, ...]]:
+        return revision, tuple(id(stack) for stack in stacks)
+
+    def _onPropertyChanged(self, key: str, property_name: str) -> None:
+        if property_name in ("value", "limit_to_extruder"):
+            self._onChanged()
+
+    def _onChanged(self, *args: Any) -> None:
+        with self._lock:
+            self._revision += 1
+            self._snapshot = None
+            self._snapshot_key = None
@@ -0,0 +1,263 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from UM.Logger import Logger
+
+
+class CachedMessage:
+    """A message of the engine that was loaded from the slice result cache.
+
+    It can be handled like the message that the engine sent: the fields are attributes, and the repeated messages are
+    found with repeatedMessageCount and getRepeatedMessage.
+    """
+
+    def __init__(self, type_name: str, fields: Optional[Dict[str, Any]] = None, repeated: Optional[Dict[str, List["CachedMessage"]]] = None) -> None:
+        self._type_name = type_name
+        self._fields = fields if fields is not None else {}
+        self._repeated = repeated if repeated is not None else {}
+
+    def getTypeName(self) -> str:
+        return self._type_name
+
+    def repeatedMessageCount(self, field_name: str) -> int:
+        return len(self._repeated.get(field_name, []))
+
+    def getRepeatedMessage(self, field_name: str, index: int) -> "CachedMessage":
+        return self._repeated[field_name][index]
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class SliceResultCache:
+    """Keeps the messages that the engine sent for a slice on disk, so that an identical slice doesn't need the engine.
+
+    The key of an entry identifies the slice message (e.g. a hash of its contents), so entries can be used across
+    sessions: when a change is undone, or a project is opened again. Only the messages with results are kept: the
+    g-code, the print time and material estimates and the optimized layers.
+
+    Each entry is a single file. The fields with bytes (g-code, the points of the layers) follow each other after the
+    header, and the other fields are in JSON at the end of the file, with where the bytes of each message are.
+
+    The total size of the files is bounded. When it is exceeded, the least recently used entries are removed. The
+    modification times of the files record when they were last used, so the least recently used entries are removed
+    first in later sessions too.
+    """
+
+    # The version of the file format. Files with another version are not read.
+    Version = 1
+
+    _magic = b"CURASLCR"
+    _header_format = "<8sIQQ"  # Magic, version, and the position and length of the JSON at the end.
+
+    # The fields of the message types that are kept, and the fields of the repeated messages in them.
+    _message_fields = {
+        "cura.proto.LayerOptimized": (("id", "height", "thickness"),
+                                      {"path_segment": ("extruder", "point_type", "points", "line_type", "line_width", "line_thickness", "line_feedrate")}),
+        "cura.proto.GCodeLayer": (("data", ), {}),
+        "cura.proto.GCodePrefix": (("data", ), {}),
+        "cura.proto.PrintTimeMaterialEstimates": (("time_none", "time_inset_0", "time_inset_x", "time_skin", "time_support", "time_skirt", "time_infill",
+                                                   "time_support_infill", "time_travel", "time_retract", "time_support_interface", "time_prime_tower"),
+                                                  {"materialEstimates": ("id", "material_amount")})
+    }  # type: Dict[str, Tuple[Tuple[str, ...], Dict[str, Tuple[str, ...]]]]
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        """
+        :param directory: The directory to store the files in. It is created if it doesn't exist.
+        :param max_size: The maximum total size of the files in bytes.
+        """
+
+        self._directory = directory
+        self._max_size = max_size
+        self._entries = OrderedDict()  # type: OrderedDict[str, int] # The size of each entry, least recently used first.
+        self._lock = threading.Lock()  # Entries are stored and loaded from jobs, and removed from the main thread.
+
+        try:
+            os.makedirs(self._directory, exist_ok = True)
+            kept_files = []  # type: List[Tuple[float, str, int]]
+            for file_name in os.listdir(self._directory):
+                path = os.path.join(self._directory, file_name)
+                if file_name.endswith(".slice"):
+                    stat = os.stat(path)
+                    kept_files.append((stat.st_mtime, file_name[:-len(".slice")], stat.st_size))
+                elif file_name.endswith(".tmp"):
+                    self._removeFile(path)
+            for _, key, size in sorted(kept_files):
+                self._entries[key] = size
+            self._evict()
+        except OSError as e:
+            Logger.log("w", "Unable to prepare the slice result cache in %s: %s", self._directory, str(e))
+
+    def setMaxSize(self, max_size: int) -> None:
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def getSize(self) -> int:
+        """Get the total size of the entries in bytes."""
+
+        with self._lock:
+            return sum(self._entries.values())
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def store(self, key: str, messages: Sequence[Any]) -> bool:
+        """Write the messages of a slice to the cache, replacing the entry with the same key.
+
+        Messages of other types than the ones with results are left out.
+
+        :param key: The key of the slice, which needs to be a valid file name.
+        :param messages: The messages that the engine sent, in the order in which they were sent.
+        :return: Whether the messages were stored. They aren't if they don't fit in the cache, or can't be written.
+        """
+
+        path = self._getPath(key)
+        temp_path = path + ".tmp"
+        header_size = struct.calcsize(self._header_format)
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(bytes(header_size))  # Written when the position of the JSON is known.
+                position = 0
+                encoded_messages = []
+                for message in messages:
+                    type_name = message.getTypeName()
+                    if type_name not in self._message_fields:
+                        continue
+                    field_names, repeated_field_names = self._message_fields[type_name]
+                    encoded_message, position = self._encodeMessage(f, message, field_names, position)
+                    encoded_message["type"] = type_name
+                    for repeated_field_name, repeated_message_field_names in repeated_field_names.items():
+                        encoded_repeated = encoded_message.setdefault("repeated", {}).setdefault(repeated_field_name, [])
+                        for index in range(message.repeatedMessageCount(repeated_field_name)):
+                            encoded_repeated_message, position = self._encodeMessage(f, message.getRepeatedMessage(repeated_field_name, index), repeated_message_field_names, position)
+                            encoded_repeated.append(encoded_repeated_message)
+                    encoded_messages.append(encoded_message)
+                    if header_size + position > self._max_size:
+                        break
+
+                metadata = json.dumps({"messages": encoded_messages}).encode("utf-8")
+                size = header_size + position + len(metadata)
+                if size > self._max_size:
+                    f.close()
+                    self._removeFile(temp_path)
+                    self.remove(key)
+                    return False
+                f.write(metadata)
+                f.seek(0)
+                f.write(struct.pack(self._header_format, self._magic, self.Version, header_size + position, len(metadata)))
+            with self._lock:
+                os.replace(temp_path, path)
+                self._entries.pop(key, None)
+                self._entries[key] = size
+                self._evict()
+        except OSError as e:
+            Logger.log("w", "Unable to write a slice result to the cache: %s", str(e))
+            self._removeFile(temp_path)
+            self.remove(key)
+            return False
+        return True
+
+    def load(self, key: str) -> Optional[List[CachedMessage]]:
+        """Get the messages of a slice, in the order in which the engine sent them.
+
+        :return: The messages, or None if there is no (readable) entry for the key.
+        """
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._getPath(key)
+        header_size = struct.calcsize(self._header_format)
+        try:
+            os.utime(path)  # Remember that it was used, for the next sessions.
+            with open(path, "rb") as f:
+                magic, version, metadata_position, metadata_length = struct.unpack(self._header_format, f.read(header_size))
+                if magic != self._magic or version != self.Version:
+                    raise ValueError("Unexpected file format version {version}".format(version = version))
+                data = f.read(metadata_position - header_size)
+                metadata = json.loads(f.read(metadata_length).decode("utf-8"))
+            return [self._decodeMessage(data, encoded_message, encoded_message["type"]) for encoded_message in metadata["messages"]]
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            Logger.log("w", "Unable to read a slice result from the cache: %s", str(e))
+            self.remove(key)
+            return None
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._removeFile(self._getPath(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._removeFile(self._getPath(key))
+            self._entries.clear()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits its maximum size. Needs the lock."""
+
+        while self._entries and sum(self._entries.values()) > self._max_size:
+            key, _ = self._entries.popitem(last = False)
+            self._removeFile(self._getPath(key))
+
+    def _getPath(self, key: str) -> str:
+        return os.path.join(self._directory, "{key}.slice".format(key = key))
+
+    @staticmethod
+    def _removeFile(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            Logger.log("w", "Unable to remove %s from the slice result cache: %s", path, str(e))
+
+    @staticmethod
+    def _encodeMessage(f, message: Any, field_names: Tuple[str, ...], position: int) -> Tuple[Dict[str, Any], int]:
+        """Write the bytes of the fields of a message to a file, and get the other fields for the JSON.
+
+        :param position: Where the bytes go, after the header.
+        :return: The fields for the JSON, with the position and length of the bytes, and the position after them.
+        """
+
+        fields = {}  # type: Dict[str, Any]
+        blobs = {}  # type: Dict[str, Tuple[int, int]]
+        for field_name in field_names:
+            value = getattr(message, field_name)
+            if isinstance(value, (bytes, bytearray)):
+                f.write(value)
+                blobs[field_name] = (position, len(value))
+                position += len(value)
+            elif isinstance(value, (bool, int, float, str)):
+                fields[field_name] = value
+            else:  # Enumerations.
+                fields[field_name] = int(value)
+        encoded = {"fields": fields}  # type: Dict[str, Any]
+        if blobs:
+            encoded["blobs"] = blobs
+        return encoded, position
+
+    @classmethod
+    def _decodeMessage(cls, data: bytes, encoded_message: Dict[str, Any], type_name: str) -> CachedMessage:
+        fields = dict(encoded_message["fields"])
+        for field_name, (position, length) in encoded_message.get("blobs", {}).items():
+            fields[field_name] = data[position:position + length]
+        repeated = {field_name: [cls._decodeMessage(data, encoded_repeated_message, "") for encoded_repeated_message in encoded_repeated]
+                    for field_name, encoded_repeated in encoded_message.get("repeated", {}).items()}
+        return CachedMessage(type_name, fields, repeated)
@@ -14,8 +14,12 @@ if "" in sys.path:
 
 import argparse
 import faulthandler
+import multiprocessing
 import os
 
+# Worker processes (see cura.LayerProcessingPool) of a frozen build are started as Cura itself. This runs them instead.
+multiprocessing.freeze_support()
+
 # Workaround for a race condition on certain systems where there
 # is a race condition between Arcus and PyQt. Importing Arcus
 # first seems to prevent Sip from going into a state where it
@@ -88,7 +92,8 @@ if not known_args["debug"]:
             return os.path.expanduser("~/Library/Logs/" + CuraAppName)
 
     # Do not redirect stdout and stderr to files if we are running CLI.
-    if hasattr(sys, "frozen") and "cli" not in os.path.basename(sys.argv[0]).lower():
+    # Worker processes import this script as __mp_main__. They must not overwrite the logs.
+    if hasattr(sys, "frozen") and "cli" not in os.path.basename(sys.argv[0]).lower() and __name__ == "__main__":
         dirpath = get_cura_dir_path()
         os.makedirs(dirpath, exist_ok = True)
         sys.stdout = open(os.path.join(dirpath, "stdout.log"), "w", encoding = "utf-8")
@@ -230,5 +235,7 @@ if ApplicationMetadata.CuraDebugMode:
     ssl_conf.setPeerVerifyMode(QSslSocket.VerifyNone)
     QSslConfiguration.setDefaultConfiguration(ssl_conf)
 
-app = CuraApplication()
-app.run()
+# Worker processes import this script as __mp_main__, they must not start Cura.
+if __name__ == "__main__":
+    app = CuraApplication()
+    app.run()
@@ -5,11 +5,15 @@ import argparse #To run the engine in debug mode if the front-end is in debug mo
 from collections import defaultdict
 import os
 from PyQt5.QtCore import QObject, QTimer, pyqtSlot
+import subprocess
 import sys
-from time import time
-from typing import Any, cast, Dict, List, Optional, Set, TYPE_CHECKING
+import threading
+from time import sleep, time
+from typing import Any, Callable, cast, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
 
 from UM.Backend.Backend import Backend, BackendState
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshData import MeshData
 from UM.Scene.SceneNode import SceneNode
 from UM.Signal import Signal
 from UM.Logger import Logger
@@ -17,15 +21,28 @@ from UM.Message import Message
 from UM.PluginRegistry import PluginRegistry
 from UM.Platform import Platform
 from UM.Qt.Duration import DurationFormat
+from UM.Resources import Resources
 from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
 from UM.Settings.Interfaces import DefinitionContainerInterface
 from UM.Settings.SettingInstance import SettingInstance #For typing.
 from UM.Tool import Tool #For typing.
 
 from cura.CuraApplication import CuraApplication
+from cura.GCodeBuffer import GCodeBuffer
+from cura.LayerDataCache import LayerDataCache
+from cura.LayerDataDecorator import LayerDataDecorator
+from cura.LayerProcessingPool import LayerProcessingPool
+from cura.MeshPayloadCache import MeshPayloadCache
+from cura.Scene.BuildPlateDecorator import BuildPlateDecorator
+from cura.Scene.CuraSceneNode import CuraSceneNode
 from cura.Settings.ExtruderManager import ExtruderManager
+from cura.Settings.SettingsSnapshotCache import SettingsSnapshotCache
+from cura.SliceResultCache import CachedMessage, SliceResultCache
+from .EnginePool import EnginePool, WarmEngine
+from .PlateSlicer import PlateSlicer
 from .ProcessSlicedLayersJob import ProcessSlicedLayersJob
 from .StartSliceJob import StartSliceJob, StartJobResult
+from .StoreSliceResultJob import StoreSliceResultJob
 
 import Arcus
 
@@ -101,6 +118,57 @@ class CuraEngineBackend(QObject, Backend):
         self._stored_layer_data = []  # type: List[Arcus.PythonMessage]
         self._stored_optimized_layer_data = {}  # type: Dict[int, List[Arcus.PythonMessage]] # key is build plate number, then arrays are stored until they go to the ProcessSlicesLayersJob
 
+        # Processed layer data can be kept on disk per build plate, so it doesn't need to stay in memory. Writing it to
+        # disk after every slice takes time, so this is only done if it's enabled.
+        self._application.getPreferences().addPreference("backend/layer_data_cache_size", 0)  # In MB. 0 disables the cache.
+        self._layer_data_cache = None  # type: Optional[LayerDataCache]
+        layer_data_cache_size = int(self._application.getPreferences().getValue("backend/layer_data_cache_size"))
+        if layer_data_cache_size > 0:
+            self._layer_data_cache = LayerDataCache(os.path.join(Resources.getCacheStoragePath(), "layer_data"), layer_data_cache_size * 1024 * 1024)
+
+        # The vertices of objects that didn't change since the previous slice are sent again as they are.
+        self._application.getPreferences().addPreference("backend/mesh_payload_cache_size", 256)  # In MB. 0 disables the cache.
+        self._mesh_payload_cache = None  # type: Optional[MeshPayloadCache]
+        mesh_payload_cache_size = int(self._application.getPreferences().getValue("backend/mesh_payload_cache_size"))
+        if mesh_payload_cache_size > 0:
+            self._mesh_payload_cache = MeshPayloadCache(mesh_payload_cache_size * 1024 * 1024)
+
+        # The settings of the previous slice are used again until one of them changes.
+        self._settings_snapshot_cache = SettingsSnapshotCache()
+
+        # The results of each slice are kept on disk, so that an identical slice later on doesn't need the engine.
+        self._application.getPreferences().addPreference("backend/slice_result_cache_size", 1024)  # In MB. 0 disables the cache.
+        self._slice_result_cache = None  # type: Optional[SliceResultCache]
+        slice_result_cache_size = int(self._application.getPreferences().getValue("backend/slice_result_cache_size"))
+        if slice_result_cache_size > 0:
+            self._slice_result_cache = SliceResultCache(os.path.join(Resources.getCacheStoragePath(), "slice_results"), slice_result_cache_size * 1024 * 1024)
+        self._slice_result_recordings = {}  # type: Dict[int, Tuple[str, List[Arcus.PythonMessage]]] # The key and the messages so far of each build plate that is sliced.
+
+        # The layer messages can be converted in worker processes, which don't share the GIL with the interface.
+        self._application.getPreferences().addPreference("backend/layer_processing_workers", 0)  # 0 converts them in the job.
+        self._layer_processing_pool = None  # type: Optional[LayerProcessingPool]
+        self._updateLayerProcessingPool()
+
+        # Engines are started before they are needed, so that a slice doesn't need to wait for the engine to connect.
+        # Off by default, since each engine of the pool is a process that keeps running next to Cura.
+        self._application.getPreferences().addPreference("backend/engine_pool_size", 0)  # 0 starts each engine when it's needed.
+        self._engine_pool = None  # type: Optional[EnginePool]
+        self._engine_is_warm = False  # type: bool # Was the current engine taken from the engine pool?
+        self._quit_process = None  # type: Optional[subprocess.Popen] # The engine process that quit last.
+        self._time_to_first_progress = None  # type: Optional[float] # Seconds from the start of the last slice until the engine reported progress.
+
+        # Other build plates can be sliced at the same time, each with an engine of the engine pool.
+        self._application.getPreferences().addPreference("backend/max_concurrent_slices", 1)  # 1 slices one build plate at a time.
+        self._plate_slicers = {}  # type: Dict[int, PlateSlicer] # The build plates that are sliced next to the one of the back-end.
+        self._build_plates_to_slice_alone = set()  # type: Set[int] # Build plates that failed to slice next to the back-end.
+        self._plate_message_handlers = {
+            "cura.proto.LayerOptimized": self._addOptimizedLayer,
+            "cura.proto.GCodeLayer": self._addGCodeLayer,
+            "cura.proto.GCodePrefix": self._addGCodePrefix,
+            "cura.proto.PrintTimeMaterialEstimates": self._setPrintTimeMaterialEstimates,
+            "cura.proto.SlicingFinished": self._onPlateSlicingFinished
+        }  # type: Dict[str, Callable[[int, Arcus.PythonMessage], None]]
+
         self._scene = self._application.getController().getScene() #type: Scene
         self._scene.sceneChanged.connect(self._onSceneChanged)
 
@@ -179,6 +247,8 @@ class CuraEngineBackend(QObject, Backend):
         self._machine_error_checker = self._application.getMachineErrorChecker()
         self._machine_error_checker.errorCheckFinished.connect(self._onStackErrorCheckFinished)
 
+        self._updateEnginePool()
+
     def close(self) -> None:
         """Terminate the engine process.
 
@@ -188,6 +258,15 @@ class CuraEngineBackend(QObject, Backend):
 
         # Terminate CuraEngine if it is still running at this point
         self._terminate()
+        self._stopPlateSlicers()
+
+        if self._layer_processing_pool is not None:
+            self._layer_processing_pool.shutdown()
+            self._layer_processing_pool = None
+
+        if self._engine_pool is not None:
+            self._engine_pool.shutdown()
+            self._engine_pool = None
 
     def getEngineCommand(self) -> List[str]:
         """Get the command that is used to call the engine.
@@ -195,7 +274,12 @@ class CuraEngineBackend(QObject, Backend):
         This is useful for debugging and used to actually start the engine.
         :return: list of commands and args / parameters.
         """
-        command = [self._application.getPreferences().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(self._port), ""]
+        return self._getEngineCommand(self._port)
+
+    def _getEngineCommand(self, port: int) -> List[str]:
+        """Get the command to call an engine that connects to a port with."""
+
+        command = [self._application.getPreferences().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(port), ""]
 
         parser = argparse.ArgumentParser(prog = "cura", add_help = False)
         parser.add_argument("--debug", action = "store_true", default = False, help = "Turn on the debug mode by setting this option.")
@@ -222,8 +306,7 @@ class CuraEngineBackend(QObject, Backend):
     def stopSlicing(self) -> None:
         self.setState(BackendState.NotStarted)
         if self._slicing:  # We were already slicing. Stop the old job.
-            self._terminate()
-            self._createSocket()
+            self._restartEngine()
 
         if self._process_layers_job is not None:  # We were processing layers. Stop that, the layers are going to change soon.
             Logger.log("i", "Aborting process layers job...")
@@ -260,7 +343,12 @@ class CuraEngineBackend(QObject, Backend):
 
         # see if we really have to slice
         active_build_plate = self._application.getMultiBuildPlateModel().activeBuildPlate
-        build_plate_to_be_sliced = self._build_plates_to_be_sliced.pop(0)
+        if active_build_plate in self._build_plates_to_be_sliced:  # The build plate that the user is looking at goes first.
+            self._build_plates_to_be_sliced.remove(active_build_plate)
+            build_plate_to_be_sliced = active_build_plate
+        else:
+            build_plate_to_be_sliced = self._build_plates_to_be_sliced.pop(0)
+        self._build_plates_to_slice_alone.discard(build_plate_to_be_sliced)
         Logger.log("d", "Going to slice build plate [%s]!" % build_plate_to_be_sliced)
         num_objects = self._numObjectsPerBuildPlate()
 
@@ -268,36 +356,182 @@ class CuraEngineBackend(QObject, Backend):
 
 
         if build_plate_to_be_sliced not in num_objects or num_objects[build_plate_to_be_sliced] == 0:
-            self._scene.gcode_dict[build_plate_to_be_sliced] = [] #type: ignore #Because we created this attribute above.
+            self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeBuffer() #type: ignore #Because we created this attribute above.
             Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate_to_be_sliced)
             if self._build_plates_to_be_sliced:
                 self.slice()
             return
-        self._stored_optimized_layer_data[build_plate_to_be_sliced] = []
-        if self._application.getPrintInformation() and build_plate_to_be_sliced == active_build_plate:
-            self._application.getPrintInformation().setToZeroPrintInformation(build_plate_to_be_sliced)
+        self._clearBuildPlateResults(build_plate_to_be_sliced)
 
         if self._process is None: # type: ignore
-            self._createSocket()
+            self._restartEngine()
         self.stopSlicing()
         self._engine_is_fresh = False  # Yes we're going to use the engine
 
         self.processingProgress.emit(0.0)
         self.backendStateChange.emit(BackendState.NotStarted)
 
-        self._scene.gcode_dict[build_plate_to_be_sliced] = [] #type: ignore #[] indexed by build plate number
+        self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeBuffer() #type: ignore #GCodeBuffer indexed by build plate number
         self._slicing = True
+        self._time_to_first_progress = None
         self.slicingStarted.emit()
 
         self.determineAutoSlicing()  # Switch timer on or off if appropriate
 
         slice_message = self._socket.createMessage("cura.proto.Slice")
-        self._start_slice_job = StartSliceJob(slice_message)
+        self._start_slice_job = self._createStartSliceJob(slice_message, build_plate_to_be_sliced)
         self._start_slice_job_build_plate = build_plate_to_be_sliced
-        self._start_slice_job.setBuildPlate(self._start_slice_job_build_plate)
         self._start_slice_job.start()
         self._start_slice_job.finished.connect(self._onStartSliceCompleted)
 
+        self._startPlateSlicers()
+
+    def _createStartSliceJob(self, slice_message: Arcus.PythonMessage, build_plate: int) -> StartSliceJob:
+        job = StartSliceJob(slice_message)
+        job.setBuildPlate(build_plate)
+        job.setMeshPayloadCache(self._mesh_payload_cache)
+        job.setSettingsSnapshotCache(self._settings_snapshot_cache)
+        job.setSliceResultCache(self._slice_result_cache, self._getEngineVersion())
+        return job
+
+    def _getEngineVersion(self) -> str:
+        """Identify the engine for the slice result cache, since another engine can give other results for a slice."""
+
+        location = self._application.getPreferences().getValue("backend/location")
+        try:
+            stat = os.stat(location)
+        except OSError:
+            return "{version}:{location}".format(version = self._application.getVersion(), location = location)
+        return "{version}:{location}:{size}:{mtime}".format(version = self._application.getVersion(), location = location, size = stat.st_size, mtime = stat.st_mtime)
+
+    def _clearBuildPlateResults(self, build_plate: int) -> None:
+        """Remove the results of the previous slice of a build plate, before it is sliced again."""
+
+        self._stored_optimized_layer_data[build_plate] = []
+        self._slice_result_recordings.pop(build_plate, None)
+        if self._layer_data_cache is not None:
+            self._layer_data_cache.remove(build_plate)
+        if self._application.getPrintInformation() and build_plate == self._application.getMultiBuildPlateModel().activeBuildPlate:
+            self._application.getPrintInformation().setToZeroPrintInformation(build_plate)
+
+    def _startPlateSlicers(self) -> None:
+        """Slice more build plates while the back-end is slicing, each with an engine of the engine pool.
+
+        At most as many build plates are sliced at the same time as the preference allows. The build plate that the
+        user is looking at goes first. If no engine of the pool is connected, this is tried again when one connects.
+        """
+
+        if not self._slicing or self._engine_pool is None or self._tool_active:
+            return
+        max_concurrent_slices = max(1, int(self._application.getPreferences().getValue("backend/max_concurrent_slices")))
+        active_build_plate = self._application.getMultiBuildPlateModel().activeBuildPlate
+        num_objects = self._numObjectsPerBuildPlate()
+
+        while 1 + len(self._plate_slicers) < max_concurrent_slices:
+            candidates = [build_plate for build_plate in self._build_plates_to_be_sliced if build_plate not in self._build_plates_to_slice_alone]
+            if not candidates:
+                return
+            build_plate = active_build_plate if active_build_plate in candidates else candidates[0]
+            if num_objects[build_plate] == 0:
+                self._build_plates_to_be_sliced.remove(build_plate)
+                self._scene.gcode_dict[build_plate] = GCodeBuffer() #type: ignore #Because we generate this attribute dynamically.
+                Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate)
+                continue
+            engine = self._engine_pool.take()
+            if engine is None:
+                return
+
+            Logger.log("d", "Going to slice build plate [%s] with the engine on port %s!", build_plate, engine.port)
+            self._build_plates_to_be_sliced.remove(build_plate)
+            self._clearBuildPlateResults(build_plate)
+            self._scene.gcode_dict[build_plate] = GCodeBuffer() #type: ignore #Because we generate this attribute dynamically.
+            plate_slicer = PlateSlicer(build_plate, engine, self._plate_message_handlers, self._onPlateSlicerError)
+            self._plate_slicers[build_plate] = plate_slicer
+            job = self._createStartSliceJob(plate_slicer.createMessage("cura.proto.Slice"), build_plate)
+            plate_slicer.setStartSliceJob(job)
+            job.start()
+            job.finished.connect(self._onPlateStartSliceCompleted)
+
+    def _onPlateStartSliceCompleted(self, job: StartSliceJob) -> None:
+        for plate_slicer in self._plate_slicers.values():
+            if plate_slicer.getStartSliceJob() is job:
+                break
+        else:  # The build plate isn't sliced anymore.
+            return
+        plate_slicer.setStartSliceJob(None)
+        build_plate = plate_slicer.getBuildPlate()
+
+        if job.isCancelled() or job.getError() or job.getResult() != StartJobResult.Finished:
+            # Let the back-end slice this build plate itself, so that it shows what's wrong.
+            Logger.log("d", "Could not start slicing build plate %s next to the back-end: %s", build_plate, job.getResult())
+            self._build_plates_to_slice_alone.add(build_plate)
+            self._stopPlateSlicer(plate_slicer, requeue = True)
+            self._sliceRemainingBuildPlates()
+            return
+
+        cached_slice_result = job.getCachedSliceResult()
+        if cached_slice_result is not None:
+            Logger.log("i", "Build plate %s was sliced like this before. Using the result of that slice.", build_plate)
+            for message in cached_slice_result + [CachedMessage("cura.proto.SlicingFinished")]:
+                self._plate_message_handlers[message.getTypeName()](build_plate, message)
+            return
+
+        self._startRecordingSliceResult(build_plate, job)
+        plate_slicer.sendMessage(job.getSliceMessage())
+
+    def _onPlateSlicerError(self, plate_slicer: PlateSlicer) -> None:
+        if self._application.isShuttingDown() or plate_slicer.getBuildPlate() not in self._plate_slicers:
+            return
+        self._build_plates_to_slice_alone.add(plate_slicer.getBuildPlate())
+        self._stopPlateSlicer(plate_slicer, requeue = True)
+        self._sliceRemainingBuildPlates()
+
+    def _onPlateSlicingFinished(self, build_plate: int, message: Arcus.PythonMessage) -> None:
+        """Called when an engine that slices a build plate next to the back-end is finished."""
+
+        plate_slicer = self._plate_slicers.get(build_plate)
+        if plate_slicer is None:
+            return
+        Logger.log("d", "Slicing build plate %s took %s seconds", build_plate, time() - plate_slicer.getStartTime())
+        self._stopPlateSlicer(plate_slicer)
+        if not self._slicing and not self._plate_slicers:  # The back-end finished its build plate before this one.
+            self.setState(BackendState.Done)
+            self.processingProgress.emit(1.0)
+        self._finishSlicedBuildPlate(build_plate)
+        self._sliceRemainingBuildPlates()
+
+    def _stopPlateSlicer(self, plate_slicer: PlateSlicer, requeue: bool = False) -> None:
+        """Stop the engine of a build plate that is sliced next to the back-end.
+
+        :param requeue: Whether the build plate still needs to be sliced.
+        """
+
+        build_plate = plate_slicer.getBuildPlate()
+        del self._plate_slicers[build_plate]
+        plate_slicer.stop()
+        if self._engine_pool is not None:
+            self._engine_pool.releasePort(plate_slicer.getPort())
+        if requeue:
+            # The slice is incomplete, so it must not be stored. A finished slice is stored by _finishSlicedBuildPlate.
+            self._slice_result_recordings.pop(build_plate, None)
+            if build_plate not in self._build_plates_to_be_sliced:
+                self._build_plates_to_be_sliced.insert(0, build_plate)
+
+    def _stopPlateSlicers(self) -> None:
+        """Stop slicing all build plates that are sliced next to the back-end. They still need to be sliced."""
+
+        for plate_slicer in list(self._plate_slicers.values()):
+            self._stopPlateSlicer(plate_slicer, requeue = True)
+
+    def _sliceRemainingBuildPlates(self) -> None:
+        """Continue with the build plates that still need to be sliced, after a build plate is done."""
+
+        if self._slicing:
+            self._startPlateSlicers()
+        elif self._build_plates_to_be_sliced:
+            self.enableTimer()  # manually enable timer to be able to invoke slice, also when in manual slice mode
+            self._invokeSlice()
+
     def _terminate(self) -> None:
         """Terminate the engine process.
 
@@ -305,8 +539,15 @@ class CuraEngineBackend(QObject, Backend):
         """
         self._slicing = False
         self._stored_layer_data = []
+        if self._start_slice_job_build_plate is not None:
+            self._slice_result_recordings.pop(self._start_slice_job_build_plate, None)
         if self._start_slice_job_build_plate in self._stored_optimized_layer_data:
             del self._stored_optimized_layer_data[self._start_slice_job_build_plate]
+        if self._process_layers_job is not None and self._process_layers_job.isStreaming():
+            # The layers of this slice will never be complete, so there is no point in showing them.
+            Logger.log("i", "Aborting process layers job that was streaming the layers of the slice...")
+            self._process_layers_job.abort()
+            self._process_layers_job = None
         if self._start_slice_job is not None:
             self._start_slice_job.cancel()
 
@@ -327,6 +568,128 @@ class CuraEngineBackend(QObject, Backend):
             except Exception as e:  # terminating a process that is already terminating causes an exception, silently ignore this.
                 Logger.log("d", "Exception occurred while trying to kill the engine %s", str(e))
 
+    def _restartEngine(self) -> None:
+        """Terminate the engine process and replace it by a new one.
+
+        If an engine of the engine pool is connected already, that engine is used, so the next slice doesn't need to
+        wait for an engine to start. Otherwise a new engine is started by calling _createSocket().
+        """
+
+        self._terminate()
+        engine = self._engine_pool.take() if self._engine_pool is not None else None
+        if engine is None:
+            self._createSocket()
+            return
+        self._adoptEngine(engine)
+
+    def _adoptEngine(self, engine: WarmEngine) -> None:
+        """Use the socket and process of an engine of the engine pool instead of the current ones."""
+
+        if self._socket:
+            self._socket.stateChanged.disconnect(self._onSocketStateChanged)
+            self._socket.messageReceived.disconnect(self._onMessageReceived)
+            self._socket.error.disconnect(self._onSocketError)
+            # Hack for (at least) Linux. If the socket is connecting, the close will deadlock.
+            while self._socket.getState() == Arcus.SocketState.Opening:
+                sleep(0.1)
+            self._socket.close()
+
+        if self._engine_pool is not None:
+            self._engine_pool.releasePort(self._port)
+        self._socket = engine.socket
+        self._socket.stateChanged.connect(self._onSocketStateChanged)
+        self._socket.messageReceived.connect(self._onMessageReceived)
+        self._socket.error.connect(self._onSocketError)
+        self._process = engine.process # type: ignore
+        self._port = engine.port
+        self._engine_is_fresh = True
+        self._engine_is_warm = True
+        Logger.log("d", "Backend connected to engine of the pool on port %s", self._port)
+        self.backendConnected.emit()  # The socket was connected before, so it won't signal that anymore.
+
+    def _startPooledEngine(self, port: int) -> Optional[subprocess.Popen]:
+        """Start an engine for the engine pool, which connects to a port."""
+
+        command = self._getEngineCommand(port)
+        process = self._runEngineProcess(command)
+        if process is None:
+            return None
+        Logger.log("i", "Started engine process for the engine pool on port %s", port)
+        self._backendLog(bytes("Calling engine with: %s\n" % command, "utf-8"))
+        thread = threading.Thread(target = self._storePooledEngineOutputThread, args = (process, ), name = "PooledEngineOutputThread")
+        thread.daemon = True
+        thread.start()
+        thread = threading.Thread(target = self._storeStderrToLogThread, args = (process.stderr, ), name = "PooledEngineErrorThread")
+        thread.daemon = True
+        thread.start()
+        return process
+
+    def _storePooledEngineOutputThread(self, process: subprocess.Popen) -> None:
+        """Store the output of an engine of the engine pool in the log.
+
+        The back-end only quits when the engine quits while the back-end is using it.
+        """
+
+        while True:
+            try:
+                line = process.stdout.readline()
+            except OSError:
+                line = b""
+            if line == b"":
+                if process is self._process: # type: ignore
+                    self._quit_process = process
+                    self.backendQuit.emit()
+                break
+            self._backendLog(line)
+
+    def _storeOutputToLogThread(self, handle) -> None:
+        """Store the output of the engine that was started by the back-end in the log.
+
+        Like _storePooledEngineOutputThread, the back-end only quits when the engine quits while the back-end is using
+        it. The engine is replaced by one of the engine pool when the engine is restarted, and that one is still running.
+        """
+
+        while True:
+            try:
+                line = handle.readline()
+            except OSError:
+                line = b""
+            if line == b"":
+                process = self._process # type: ignore
+                if process is not None and process.stdout is handle:
+                    self._quit_process = process
+                    self.backendQuit.emit()
+                break
+            self._backendLog(line)
+
+    def _updateEnginePool(self) -> None:
+        """Start or stop the engines of the engine pool, according to the preference."""
+
+        pool_size = max(0, int(self._application.getPreferences().getValue("backend/engine_pool_size")))
+        pool_size += max(1, int(self._application.getPreferences().getValue("backend/max_concurrent_slices"))) - 1  # An engine for each other build plate.
+        if self._application.getUseExternalBackend():
+            pool_size = 0  # The engine is started by someone else.
+        if self._engine_pool is not None:
+            self._engine_pool.setSize(pool_size)
+            return
+        if pool_size == 0:
+            return
+        plugin_path = PluginRegistry.getInstance().getPluginPath(self.getPluginId())
+        if not plugin_path:
+            Logger.error("Could not get plugin path!", self.getPluginId())
+            return
+        protocol_file = os.path.abspath(os.path.join(plugin_path, "Cura.proto"))
+        self._engine_pool = EnginePool(pool_size, self._port + 1, protocol_file, self._startPooledEngine, self._startPlateSlicers)
+        self._engine_pool.fill()
+
+    def getTimeToFirstProgress(self) -> Optional[float]:
+        """Get the time in seconds from the start of the last slice until the engine reported progress for it.
+
+        :return: The time, or None if the engine hasn't reported progress yet.
+        """
+
+        return self._time_to_first_progress
+
     def _onStartSliceCompleted(self, job: StartSliceJob) -> None:
         """Event handler to call when the job to initiate the slicing process is
 
@@ -447,7 +810,18 @@ class CuraEngineBackend(QObject, Backend):
             self._invokeSlice()
             return
 
+        # An identical slice was done before, so its results can be used without the engine.
+        cached_slice_result = job.getCachedSliceResult()
+        if cached_slice_result is not None:
+            Logger.log("i", "Build plate %s was sliced like this before. Using the result of that slice.", self._start_slice_job_build_plate)
+            self.setState(BackendState.Processing)
+            for message in cached_slice_result + [CachedMessage("cura.proto.SlicingFinished")]:
+                self._message_handlers[message.getTypeName()](message)
+            return
+
         # Preparation completed, send it to the backend.
+        if self._start_slice_job_build_plate is not None:
+            self._startRecordingSliceResult(self._start_slice_job_build_plate, job)
         self._socket.sendMessage(job.getSliceMessage())
 
         # Notify the user that it's now up to the backend to do it's job
@@ -456,6 +830,17 @@ class CuraEngineBackend(QObject, Backend):
         if self._slice_start_time:
             Logger.log("d", "Sending slice message took %s seconds", time() - self._slice_start_time )
 
+    def _startRecordingSliceResult(self, build_plate: int, job: StartSliceJob) -> None:
+        """Keep the messages that the engine sends for a build plate, to store them in the slice result cache."""
+
+        key = job.getSliceResultKey()
+        if key is not None:
+            self._slice_result_recordings[build_plate] = (key, [])
+
+    def _recordSliceResult(self, build_plate: Optional[int], message: Arcus.PythonMessage) -> None:
+        if build_plate in self._slice_result_recordings:
+            self._slice_result_recordings[build_plate][1].append(message)
+
     def determineAutoSlicing(self) -> bool:
         """Determine enable or disable auto slicing. Return True for enable timer and False otherwise.
 
@@ -514,12 +899,17 @@ class CuraEngineBackend(QObject, Backend):
         # current layer data is removed so the previous data is not rendered - CURA-4821
         if source.callDecoration("isBlockSlicing") and source.callDecoration("getLayerData"):
             self._stored_optimized_layer_data = {}
+            if self._layer_data_cache is not None:
+                self._layer_data_cache.clear()
 
         build_plate_changed = set()
         source_build_plate_number = source.callDecoration("getBuildPlateNumber")
         if source == self._scene.getRoot():
             # we got the root node
             num_objects = self._numObjectsPerBuildPlate()
+            if not any(num_objects.values()) and self._mesh_payload_cache is not None:
+                # The scene was cleared, so none of the vertices are going to be sent again.
+                self._mesh_payload_cache.clear()
             for build_plate_number in list(self._last_num_objects.keys()) + list(num_objects.keys()):
                 if build_plate_number not in self._last_num_objects or num_objects[build_plate_number] != self._last_num_objects[build_plate_number]:
                     self._last_num_objects[build_plate_number] = num_objects[build_plate_number]
@@ -545,6 +935,7 @@ class CuraEngineBackend(QObject, Backend):
             return
 
         self.stopSlicing()
+        self._stopPlateSlicers()
         for build_plate_number in build_plate_changed:
             if build_plate_number not in self._build_plates_to_be_sliced:
                 self._build_plates_to_be_sliced.append(build_plate_number)
@@ -593,6 +984,13 @@ class CuraEngineBackend(QObject, Backend):
         # Clear out any old gcode
         self._scene.gcode_dict = {}  # type: ignore
 
+        if self._layer_data_cache is not None:
+            if build_plate_numbers:
+                for build_plate_number in build_plate_numbers:
+                    self._layer_data_cache.remove(build_plate_number)
+            else:
+                self._layer_data_cache.clear()
+
         for node in DepthFirstIterator(self._scene.getRoot()):
             if node.callDecoration("getLayerData"):
                 if not build_plate_numbers or node.callDecoration("getBuildPlateNumber") in build_plate_numbers:
@@ -613,6 +1011,7 @@ class CuraEngineBackend(QObject, Backend):
             return
         self.determineAutoSlicing()
         self.stopSlicing()
+        self._stopPlateSlicers()
         self.markSliceAll()
         self.processingProgress.emit(0.0)
         if not self._use_timer:
@@ -657,9 +1056,20 @@ class CuraEngineBackend(QObject, Backend):
         """
 
         if self._start_slice_job_build_plate is not None:
-            if self._start_slice_job_build_plate not in self._stored_optimized_layer_data:
-                self._stored_optimized_layer_data[self._start_slice_job_build_plate] = []
-            self._stored_optimized_layer_data[self._start_slice_job_build_plate].append(message)
+            self._addOptimizedLayer(self._start_slice_job_build_plate, message)
+
+    def _addOptimizedLayer(self, build_plate: int, message: Arcus.PythonMessage) -> None:
+        self._recordSliceResult(build_plate, message)
+        if build_plate not in self._stored_optimized_layer_data:
+            self._stored_optimized_layer_data[build_plate] = []
+        self._stored_optimized_layer_data[build_plate].append(message)
+
+        # Show the layers while the engine is still slicing, if the layer view is looking at this build plate.
+        if self._process_layers_job is not None:
+            if self._process_layers_job.isStreaming() and self._process_layers_job.getBuildPlate() == build_plate:
+                self._process_layers_job.addLayer(message)
+        elif self._layer_view_active and build_plate == self._application.getMultiBuildPlateModel().activeBuildPlate:
+            self._startProcessSlicedLayersJob(build_plate, all_layers_received = False)
 
     def _onProgressMessage(self, message: Arcus.PythonMessage) -> None:
         """Called when a progress message is received from the engine.
@@ -667,6 +1077,9 @@ class CuraEngineBackend(QObject, Backend):
         :param message: The protobuf message containing the slicing progress.
         """
 
+        if self._time_to_first_progress is None and self._slice_start_time:
+            self._time_to_first_progress = time() - self._slice_start_time
+            Logger.log("d", "First progress of the slice took %s seconds (engine from the pool: %s)", self._time_to_first_progress, self._engine_is_warm)
         self.processingProgress.emit(message.amount)
         self.setState(BackendState.Processing)
 
@@ -689,36 +1102,16 @@ class CuraEngineBackend(QObject, Backend):
         :param message: The protobuf message signalling that slicing is finished.
         """
 
-        self.setState(BackendState.Done)
-        self.processingProgress.emit(1.0)
-
-        try:
-            gcode_list = self._scene.gcode_dict[self._start_slice_job_build_plate] #type: ignore #Because we generate this attribute dynamically.
-        except KeyError:  # Can occur if the g-code has been cleared while a slice message is still arriving from the other end.
-            gcode_list = []
-        for index, line in enumerate(gcode_list):
-            replaced = line.replace("{print_time}", str(self._application.getPrintInformation().currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601)))
-            replaced = replaced.replace("{filament_amount}", str(self._application.getPrintInformation().materialLengths))
-            replaced = replaced.replace("{filament_weight}", str(self._application.getPrintInformation().materialWeights))
-            replaced = replaced.replace("{filament_cost}", str(self._application.getPrintInformation().materialCosts))
-            replaced = replaced.replace("{jobname}", str(self._application.getPrintInformation().jobName))
-
-            gcode_list[index] = replaced
+        if not self._plate_slicers:  # Otherwise the back-end is done when the other build plates are sliced too.
+            self.setState(BackendState.Done)
+            self.processingProgress.emit(1.0)
 
         self._slicing = False
         if self._slice_start_time:
             Logger.log("d", "Slicing took %s seconds", time() - self._slice_start_time )
         Logger.log("d", "Number of models per buildplate: %s", dict(self._numObjectsPerBuildPlate()))
 
-        # See if we need to process the sliced layers job.
-        active_build_plate = self._application.getMultiBuildPlateModel().activeBuildPlate
-        if (
-            self._layer_view_active and
-            (self._process_layers_job is None or not self._process_layers_job.isRunning()) and
-            active_build_plate == self._start_slice_job_build_plate and
-            active_build_plate not in self._build_plates_to_be_sliced):
-
-            self._startProcessSlicedLayersJob(active_build_plate)
+        self._finishSlicedBuildPlate(self._start_slice_job_build_plate)
         # self._onActiveViewChanged()
         self._start_slice_job_build_plate = None
 
@@ -730,14 +1123,59 @@ class CuraEngineBackend(QObject, Backend):
             self.enableTimer()  # manually enable timer to be able to invoke slice, also when in manual slice mode
             self._invokeSlice()
 
+    def _finishSlicedBuildPlate(self, build_plate: Optional[int]) -> None:
+        """Complete the g-code of a build plate that is sliced, and process its layers if the layer view shows them."""
+
+        recording = self._slice_result_recordings.pop(build_plate, None) if build_plate is not None else None
+        if recording is not None and self._slice_result_cache is not None:
+            StoreSliceResultJob(self._slice_result_cache, *recording).start()
+
+        try:
+            gcode_list = self._scene.gcode_dict[build_plate] #type: ignore #Because we generate this attribute dynamically.
+        except KeyError:  # Can occur if the g-code has been cleared while a slice message is still arriving from the other end.
+            gcode_list = GCodeBuffer()
+        if not isinstance(gcode_list, GCodeBuffer):
+            gcode_list = GCodeBuffer(gcode_list)
+            self._scene.gcode_dict[build_plate] = gcode_list #type: ignore #Because we generate this attribute dynamically.
+        # The placeholders are in the start and end g-code, so the layers don't need to be searched for them.
+        print_information = self._application.getPrintInformation()
+        gcode_list.replacePlaceholders({
+            "{print_time}": str(print_information.currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601)),
+            "{filament_amount}": str(print_information.materialLengths),
+            "{filament_weight}": str(print_information.materialWeights),
+            "{filament_cost}": str(print_information.materialCosts),
+            "{jobname}": str(print_information.jobName)
+        })
+
+        # See if we need to process the sliced layers job.
+        active_build_plate = self._application.getMultiBuildPlateModel().activeBuildPlate
+        if (
+            self._process_layers_job is not None and
+            self._process_layers_job.isStreaming() and
+            self._process_layers_job.getBuildPlate() == build_plate):
+
+            # The layers were already being processed while slicing.
+            self._process_layers_job.setAllLayersReceived()
+        elif (
+            self._layer_view_active and
+            (self._process_layers_job is None or not self._process_layers_job.isRunning()) and
+            active_build_plate == build_plate and
+            active_build_plate not in self._build_plates_to_be_sliced):
+
+            self._startProcessSlicedLayersJob(active_build_plate)
+
     def _onGCodeLayerMessage(self, message: Arcus.PythonMessage) -> None:
         """Called when a g-code message is received from the engine.
 
         :param message: The protobuf message containing g-code, encoded as UTF-8.
         """
 
+        self._addGCodeLayer(self._start_slice_job_build_plate, message)
+
+    def _addGCodeLayer(self, build_plate: Optional[int], message: Arcus.PythonMessage) -> None:
+        self._recordSliceResult(build_plate, message)
         try:
-            self._scene.gcode_dict[self._start_slice_job_build_plate].append(message.data.decode("utf-8", "replace")) #type: ignore #Because we generate this attribute dynamically.
+            self._scene.gcode_dict[build_plate].append(message.data.decode("utf-8", "replace")) #type: ignore #Because we generate this attribute dynamically.
         except KeyError:  # Can occur if the g-code has been cleared while a slice message is still arriving from the other end.
             pass  # Throw the message away.
 
@@ -748,8 +1186,12 @@ class CuraEngineBackend(QObject, Backend):
         encoded as UTF-8.
         """
 
+        self._addGCodePrefix(self._start_slice_job_build_plate, message)
+
+    def _addGCodePrefix(self, build_plate: Optional[int], message: Arcus.PythonMessage) -> None:
+        self._recordSliceResult(build_plate, message)
         try:
-            self._scene.gcode_dict[self._start_slice_job_build_plate].insert(0, message.data.decode("utf-8", "replace")) #type: ignore #Because we generate this attribute dynamically.
+            self._scene.gcode_dict[build_plate].insert(0, message.data.decode("utf-8", "replace")) #type: ignore #Because we generate this attribute dynamically.
         except KeyError:  # Can occur if the g-code has been cleared while a slice message is still arriving from the other end.
             pass  # Throw the message away.
 
@@ -767,6 +1209,7 @@ class CuraEngineBackend(QObject, Backend):
             protocol_file = os.path.abspath(os.path.join(plugin_path, "Cura.proto"))
         super()._createSocket(protocol_file)
         self._engine_is_fresh = True
+        self._engine_is_warm = False
 
     def _onChanged(self, *args: Any, **kwargs: Any) -> None:
         """Called when anything has changed to the stuff that needs to be sliced.
@@ -794,12 +1237,16 @@ class CuraEngineBackend(QObject, Backend):
             material amount per extruder
         """
 
+        self._setPrintTimeMaterialEstimates(self._start_slice_job_build_plate, message)
+
+    def _setPrintTimeMaterialEstimates(self, build_plate: Optional[int], message: Arcus.PythonMessage) -> None:
+        self._recordSliceResult(build_plate, message)
         material_amounts = []
         for index in range(message.repeatedMessageCount("materialEstimates")):
             material_amounts.append(message.getRepeatedMessage("materialEstimates", index).material_amount)
 
         times = self._parseMessagePrintTimes(message)
-        self.printDurationMessage.emit(self._start_slice_job_build_plate, times, material_amounts)
+        self.printDurationMessage.emit(build_plate, times, material_amounts)
 
     def _parseMessagePrintTimes(self, message: Arcus.PythonMessage) -> Dict[str, float]:
         """Called for parsing message to retrieve estimated time per feature
@@ -843,8 +1290,7 @@ class CuraEngineBackend(QObject, Backend):
         self.disableTimer()
         # Restart engine as soon as possible, we know we want to slice afterwards
         if not self._engine_is_fresh:
-            self._terminate()
-            self._createSocket()
+            self._restartEngine()
 
     def _onToolOperationStopped(self, tool: Tool) -> None:
         """Called when the user stops using some tool.
@@ -861,9 +1307,18 @@ class CuraEngineBackend(QObject, Backend):
             source = self._postponed_scene_change_sources.pop(0)
             self._onSceneChanged(source)
 
-    def _startProcessSlicedLayersJob(self, build_plate_number: int) -> None:
-        self._process_layers_job = ProcessSlicedLayersJob(self._stored_optimized_layer_data[build_plate_number])
+    def _startProcessSlicedLayersJob(self, build_plate_number: int, all_layers_received: bool = True) -> None:
+        """Start processing the optimized layers of a build plate.
+
+        :param build_plate_number: The build plate to process the layers of.
+        :param all_layers_received: Whether the engine is done slicing this build plate. If not, the layers that are
+        still to come need to be added to the job as they arrive.
+        """
+
+        self._process_layers_job = ProcessSlicedLayersJob(self._stored_optimized_layer_data[build_plate_number], all_layers_received)
         self._process_layers_job.setBuildPlate(build_plate_number)
+        self._process_layers_job.setLayerDataCache(self._layer_data_cache)
+        self._process_layers_job.setLayerProcessingPool(self._layer_processing_pool)
         self._process_layers_job.finished.connect(self._onProcessLayersFinished)
         self._process_layers_job.start()
 
@@ -881,12 +1336,60 @@ class CuraEngineBackend(QObject, Backend):
                 if (active_build_plate in self._stored_optimized_layer_data and
                     not self._slicing and
                     not self._process_layers_job and
-                    active_build_plate not in self._build_plates_to_be_sliced):
+                    active_build_plate not in self._build_plates_to_be_sliced and
+                    active_build_plate not in self._plate_slicers):
 
                     self._startProcessSlicedLayersJob(active_build_plate)
+                # If we are slicing the active build plate, show the layers that are sliced so far and keep adding
+                # the rest as they come in.
+                elif (active_build_plate in self._stored_optimized_layer_data and
+                      not self._process_layers_job and
+                      ((self._slicing and active_build_plate == self._start_slice_job_build_plate) or active_build_plate in self._plate_slicers)):
+
+                    self._startProcessSlicedLayersJob(active_build_plate, all_layers_received = False)
+                # The layers were processed before, but aren't in the scene anymore. Show them from the cache.
+                elif (active_build_plate not in self._stored_optimized_layer_data and
+                      not self._process_layers_job and
+                      active_build_plate not in self._build_plates_to_be_sliced and
+                      active_build_plate != self._start_slice_job_build_plate and
+                      active_build_plate not in self._plate_slicers and
+                      not self._hasLayerData(active_build_plate)):
+
+                    self._showCachedLayerData(active_build_plate)
             else:
                 self._layer_view_active = False
 
+    def _hasLayerData(self, build_plate_number: int) -> bool:
+        """Whether there is a node with layer data for a build plate in the scene."""
+
+        for node in DepthFirstIterator(self._scene.getRoot()):
+            if node.callDecoration("getLayerData") and node.callDecoration("getBuildPlateNumber") == build_plate_number:
+                return True
+        return False
+
+    def _showCachedLayerData(self, build_plate_number: int) -> None:
+        """Add the layer data of a build plate to the scene from the cache, if it is in there."""
+
+        if self._layer_data_cache is None:
+            return
+        layer_data = self._layer_data_cache.load(build_plate_number)
+        if layer_data is None:
+            return
+        Logger.log("d", "Showing the layer data of build plate %s from the cache.", build_plate_number)
+
+        # The same node as ProcessSlicedLayersJob creates. The no_setting_override is here because adding the
+        # SettingOverrideDecorator will trigger a reslice.
+        node = CuraSceneNode(no_setting_override = True)
+        node.addDecorator(BuildPlateDecorator(build_plate_number))
+        decorator = LayerDataDecorator()
+        decorator.setLayerData(layer_data)
+        node.addDecorator(decorator)
+        node.setMeshData(MeshData())
+        node.setParent(self._application.getBuildVolume())
+        settings = self._application.getGlobalContainerStack()
+        if settings and not settings.getProperty("machine_center_is_zero", "value"):
+            node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
+
     def _onBackendQuit(self) -> None:
         """Called when the back-end self-terminates.
 
@@ -894,9 +1397,10 @@ class CuraEngineBackend(QObject, Backend):
         """
 
         if not self._restart:
-            if self._process: # type: ignore
+            if self._process and self._quit_process is self._process: # type: ignore # Not an engine that was replaced already.
                 Logger.log("d", "Backend quit with return code %s. Resetting process and socket.", self._process.wait()) # type: ignore
                 self._process = None # type: ignore
+            self._quit_process = None
 
     def _onGlobalStackChanged(self) -> None:
         """Called when the global container stack changes"""
@@ -910,6 +1414,7 @@ class CuraEngineBackend(QObject, Backend):
                 extruder.containersChanged.disconnect(self._onChanged)
 
         self._global_container_stack = self._application.getMachineManager().activeMachine
+        self._settings_snapshot_cache.setGlobalStack(self._global_container_stack)
 
         if self._global_container_stack:
             self._global_container_stack.propertyChanged.connect(self._onSettingChanged)  # Note: Only starts slicing when the value changed.
@@ -921,6 +1426,10 @@ class CuraEngineBackend(QObject, Backend):
             self._onChanged()
 
     def _onProcessLayersFinished(self, job: ProcessSlicedLayersJob) -> None:
+        if job.isStreaming():
+            # The job was aborted before the engine was done slicing. The stored layers belong to the slice that
+            # replaced it, if any.
+            return
         if job.getBuildPlate() in self._stored_optimized_layer_data:
             del self._stored_optimized_layer_data[job.getBuildPlate()]
         else:
@@ -946,12 +1455,45 @@ class CuraEngineBackend(QObject, Backend):
             self._change_timer.timeout.disconnect(self.slice)
 
     def _onPreferencesChanged(self, preference: str) -> None:
+        if preference == "backend/layer_data_cache_size":
+            layer_data_cache_size = max(0, int(self._application.getPreferences().getValue(preference))) * 1024 * 1024
+            if self._layer_data_cache is not None:
+                self._layer_data_cache.setMaxSize(layer_data_cache_size)
+            elif layer_data_cache_size > 0:
+                self._layer_data_cache = LayerDataCache(os.path.join(Resources.getCacheStoragePath(), "layer_data"), layer_data_cache_size)
+        if preference == "backend/slice_result_cache_size" and self._slice_result_cache is not None:
+            self._slice_result_cache.setMaxSize(max(0, int(self._application.getPreferences().getValue(preference))) * 1024 * 1024)
+        if preference == "backend/mesh_payload_cache_size" and self._mesh_payload_cache is not None:
+            self._mesh_payload_cache.setMaxSize(max(0, int(self._application.getPreferences().getValue(preference))) * 1024 * 1024)
+        if preference == "backend/layer_processing_workers":
+            self._updateLayerProcessingPool()
+        if preference in ("backend/engine_pool_size", "backend/max_concurrent_slices"):
+            self._updateEnginePool()
         if preference != "general/auto_slice":
             return
         auto_slice = self.determineAutoSlicing()
         if auto_slice:
             self._change_timer.start()
 
+    def _updateLayerProcessingPool(self) -> None:
+        """Start or stop the worker processes that convert layer messages, according to the preference.
+
+        A job that is processing layers while its pool is stopped processes the remaining layers itself.
+        """
+
+        worker_count = max(0, int(self._application.getPreferences().getValue("backend/layer_processing_workers")))
+        if self._layer_processing_pool is not None and self._layer_processing_pool.getWorkerCount() == worker_count:
+            return
+        if self._layer_processing_pool is not None:
+            self._layer_processing_pool.shutdown()
+            self._layer_processing_pool = None
+        if worker_count == 0:
+            return
+        if not LayerProcessingPool.isSupported():
+            Logger.log("w", "Layers can't be processed in worker processes with this version of Python.")
+            return
+        self._layer_processing_pool = LayerProcessingPool(worker_count)
+
     def tickle(self) -> None:
         """Tickle the backend so in case of auto slicing, it starts the timer."""
 
@@ -0,0 +1,198 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import subprocess
+import sys
+from time import sleep, time
+from typing import Callable, List, Optional, Set
+
+import Arcus
+
+from UM.Backend.SignalSocket import SignalSocket
+from UM.Logger import Logger
+from UM.Platform import Platform
+
+
+class WarmEngine:
+    """An engine process that is started, with the socket that it connects to."""
+
+    def __init__(self, pool: "EnginePool", port: int) -> None:
+        self.port = port
+        self.socket = SignalSocket()
+        self.process = None  # type: Optional[subprocess.Popen]
+        self.start_time = time()
+        self._pool = pool
+
+    def isConnected(self) -> bool:
+        return self.socket.getState() == Arcus.SocketState.Connected
+
+    def connectSignals(self) -> None:
+        self.socket.stateChanged.connect(self._onSocketStateChanged)
+        self.socket.messageReceived.connect(self._onMessageReceived)
+        self.socket.error.connect(self._onSocketError)
+
+    def disconnectSignals(self) -> None:
+        self.socket.stateChanged.disconnect(self._onSocketStateChanged)
+        self.socket.messageReceived.disconnect(self._onMessageReceived)
+        self.socket.error.disconnect(self._onSocketError)
+
+    def stop(self) -> None:
+        """Terminate the engine process and close its socket."""
+
+        if self.process is not None:
+            try:
+                self.process.terminate()
+                self.process.wait()
+            except Exception as e:  # Terminating a process that is already terminating causes an exception.
+                Logger.log("d", "Exception occurred while stopping an engine of the pool: %s", str(e))
+            self.process = None
+        # Hack for (at least) Linux. If the socket is connecting, the close will deadlock.
+        while self.socket.getState() == Arcus.SocketState.Opening:
+            sleep(0.1)
+        self.socket.close()
+
+    # The signals are connected to methods of the engine itself, since the signals only keep weak references.
+    def _onSocketStateChanged(self, state: Arcus.SocketState) -> None:
+        self._pool._onSocketStateChanged(self, state)
+
+    def _onMessageReceived(self) -> None:
+        self.socket.takeNextMessage()  # An idle engine has nothing to say.
+
+    def _onSocketError(self, error: Arcus.Error) -> None:
+        self._pool._onSocketError(self, error)
+
+
+class EnginePool:
+    """Keeps engine processes started and connected to a socket of their own, so that they're ready to slice.
+
+    Starting an engine and waiting for it to connect takes a while. When the backend needs a new engine (e.g. because
+    a slice is cancelled), it can take one that is already connected from the pool instead. The pool then starts
+    another one to replace it right away, so the next one is warmed up by the time it's needed.
+
+    Each engine listens on a port of its own, from the first port of the pool on. The port of an engine that is taken
+    is not reused until it is released.
+    """
+
+    # How many ports further than the first port to look for a port that's free.
+    _port_range = 100
+
+    def __init__(self, size: int, first_port: int, protocol_file: str, start_engine: Callable[[int], Optional[subprocess.Popen]], on_engine_connected: Optional[Callable[[], None]] = None) -> None:
+        """
+        :param size: The number of engines to keep ready.
+        :param first_port: The first port that the engines can listen on.
+        :param protocol_file: The protocol of the messages between the front-end and the engine.
+        :param start_engine: The function to start an engine that connects to a port with.
+        :param on_engine_connected: Called when an engine of the pool is connected, and can be taken.
+        """
+
+        self._size = size
+        self._first_port = first_port
+        self._protocol_file = self.getProtocolFileArgument(protocol_file)
+        self._start_engine = start_engine
+        self._on_engine_connected = on_engine_connected
+        self._engines = []  # type: List[WarmEngine]
+        self._taken_ports = set()  # type: Set[int] # The ports of the engines that were taken and are still in use.
+
+    def getSize(self) -> int:
+        return self._size
+
+    def setSize(self, size: int) -> None:
+        self._size = size
+        while len(self._engines) > self._size:
+            self._stopEngine(self._engines.pop())
+        self.fill()
+
+    def fill(self) -> None:
+        """Start engines until there are as many as the size of the pool."""
+
+        while len(self._engines) < self._size:
+            port = self._findPort()
+            if port is None:
+                Logger.log("w", "No free port to start an engine for the engine pool on.")
+                return
+            engine = WarmEngine(self, port)
+            engine.connectSignals()
+            if not engine.socket.registerAllMessageTypes(self._protocol_file):
+                Logger.log("e", "Could not register the protocol messages of an engine of the pool: %s", engine.socket.getLastError())
+                engine.disconnectSignals()
+                return
+            self._engines.append(engine)
+            engine.socket.listen("127.0.0.1", engine.port)  # The engine is started when the socket is listening.
+
+    def take(self) -> Optional[WarmEngine]:
+        """Take an engine that is connected out of the pool.
+
+        The socket of the engine is not listened to by the pool anymore, so the signals of the socket need to be
+        connected to the backend. The pool starts another engine to replace it.
+
+        :return: The engine, or None if no engine is connected yet.
+        """
+
+        for engine in self._engines:
+            if engine.isConnected():
+                self._engines.remove(engine)
+                engine.disconnectSignals()
+                self._taken_ports.add(engine.port)
+                Logger.log("d", "Took engine on port %s from the pool, which was started %.1f s ago.", engine.port, time() - engine.start_time)
+                self.fill()
+                return engine
+        return None
+
+    def releasePort(self, port: int) -> None:
+        """Allow an engine of the pool to use the port of an engine that was taken again, when it isn't used anymore."""
+
+        self._taken_ports.discard(port)
+
+    def shutdown(self) -> None:
+        """Stop all engines of the pool."""
+
+        self._size = 0
+        while self._engines:
+            self._stopEngine(self._engines.pop())
+
+    def _findPort(self) -> Optional[int]:
+        used_ports = {engine.port for engine in self._engines}
+        for port in range(self._first_port, self._first_port + self._port_range):
+            if port not in used_ports and port not in self._taken_ports:
+                return port
+        return None
+
+    def _stopEngine(self, engine: WarmEngine) -> None:
+        engine.disconnectSignals()
+        engine.stop()
+
+    def _onSocketStateChanged(self, engine: WarmEngine, state: Arcus.SocketState) -> None:
+        if engine not in self._engines:
+            return
+        if state == Arcus.SocketState.Listening:
+            engine.process = self._start_engine(engine.port)
+            if engine.process is None:  # The engine can't be started. Don't keep trying.
+                self._engines.remove(engine)
+                self._stopEngine(engine)
+        elif state == Arcus.SocketState.Connected:
+            Logger.log("d", "Engine of the pool connected on port %s after %.1f s.", engine.port, time() - engine.start_time)
+            if self._on_engine_connected is not None:
+                self._on_engine_connected()
+
+    def _onSocketError(self, engine: WarmEngine, error: Arcus.Error) -> None:
+        if engine not in self._engines or error.getErrorCode() == Arcus.ErrorCode.Debug:
+            return
+        # Replace the engine by a new one. If the port was in use, the new one gets the next free port.
+        self._engines.remove(engine)
+        self._stopEngine(engine)
+        if error.getErrorCode() == Arcus.ErrorCode.BindFailedError:
+            self._first_port = engine.port + 1
+            self.fill()
+        else:
+            # The engine crashed or closed. It's replaced when the next one is taken, so it can't keep crashing.
+            Logger.log("w", "Engine of the pool on port %s failed: %s", engine.port, str(error))
+
+    @staticmethod
+    def getProtocolFileArgument(protocol_file: str):
+        """Get the protocol file in the form that the sockets need it."""
+
+        if Platform.isWindows():
+            # On Windows, the Protobuf DiskSourceTree does stupid things with paths.
+            # So convert to forward slashes here so it finds the proto file properly.
+            return protocol_file.replace("\\", "/").encode(sys.getfilesystemencoding())
+        return protocol_file
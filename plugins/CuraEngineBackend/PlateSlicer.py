@@ -0,0 +1,84 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from time import time
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+
+import Arcus
+
+from UM.Logger import Logger
+
+if TYPE_CHECKING:
+    from .EnginePool import WarmEngine
+    from .StartSliceJob import StartSliceJob
+
+
+class PlateSlicer:
+    """Slices a build plate with an engine of its own, while the back-end slices another build plate.
+
+    The messages of the engine are passed on to the handlers of the back-end together with the number of the build
+    plate, so that the results end up with the right build plate.
+    """
+
+    def __init__(self, build_plate: int, engine: "WarmEngine", message_handlers: Dict[str, Callable[[int, Arcus.PythonMessage], None]], on_error: Callable[["PlateSlicer"], None]) -> None:
+        """
+        :param build_plate: The build plate to slice.
+        :param engine: The engine to slice with, which is connected already.
+        :param message_handlers: The handlers of the messages of the engine, by the type of the message.
+        :param on_error: Called when the connection with the engine fails.
+        """
+
+        self._build_plate = build_plate
+        self._engine = engine
+        self._message_handlers = message_handlers
+        self._on_error = on_error
+        self._start_slice_job = None  # type: Optional[StartSliceJob]
+        self._start_time = time()
+
+        # The signals only keep weak references, so they're connected to the methods of this object.
+        self._engine.socket.messageReceived.connect(self._onMessageReceived)
+        self._engine.socket.error.connect(self._onSocketError)
+
+    def getBuildPlate(self) -> int:
+        return self._build_plate
+
+    def getStartTime(self) -> float:
+        return self._start_time
+
+    def getPort(self) -> int:
+        return self._engine.port
+
+    def getStartSliceJob(self) -> Optional["StartSliceJob"]:
+        return self._start_slice_job
+
+    def setStartSliceJob(self, job: Optional["StartSliceJob"]) -> None:
+        self._start_slice_job = job
+
+    def createMessage(self, message_type: str) -> Arcus.PythonMessage:
+        return self._engine.socket.createMessage(message_type)
+
+    def sendMessage(self, message: Arcus.PythonMessage) -> None:
+        self._engine.socket.sendMessage(message)
+
+    def stop(self) -> None:
+        """Stop slicing, and terminate the engine."""
+
+        if self._start_slice_job is not None:
+            self._start_slice_job.cancel()
+            self._start_slice_job = None
+        self._engine.socket.messageReceived.disconnect(self._onMessageReceived)
+        self._engine.socket.error.disconnect(self._onSocketError)
+        self._engine.stop()
+
+    def _onMessageReceived(self) -> None:
+        message = self._engine.socket.takeNextMessage()
+        handler = self._message_handlers.get(message.getTypeName())
+        if handler is None:  # E.g. progress, which is only shown for the build plate that the back-end slices.
+            return
+        handler(self._build_plate, message)
+
+    def _onSocketError(self, error: Arcus.Error) -> None:
+        if error.getErrorCode() == Arcus.ErrorCode.Debug:
+            return
+        Logger.log("w", "Engine slicing build plate %s failed: %s", self._build_plate, str(error))
+        self._on_error(self)
@@ -1,6 +1,7 @@
 #Copyright (c) 2019 Ultimaker B.V.
 #Cura is released under the terms of the LGPLv3 or higher.
 
+import concurrent.futures
 import gc
 import sys
 
@@ -21,9 +22,10 @@ from cura.Settings.ExtruderManager import ExtruderManager
 from cura import LayerDataBuilder
 from cura import LayerDataDecorator
 from cura import LayerPolygon
+from cura.LayerSegments import LayerSegments
 
 import numpy
-from time import time
+from time import sleep, time
 from cura.Machines.Models.ExtrudersModel import ExtrudersModel
 catalog = i18nCatalog("cura")
 
@@ -45,13 +47,25 @@ def colorCodeToRGBA(color_code):
 
 
 class ProcessSlicedLayersJob(Job):
-    def __init__(self, layers):
+    def __init__(self, layers, all_layers_received = True):
+        """Creates a job to convert the layer messages of the engine into layer data.
+
+        :param layers: The optimized layer messages that were received so far.
+        :param all_layers_received: Whether the engine is done sending layers. If not, the job keeps waiting for
+        layers that are added with addLayer() until setAllLayersReceived() is called, and shows the layers that are
+        processed so far in the meantime.
+        """
+
         super().__init__()
-        self._layers = layers
+        self._layers = list(layers)
+        self._all_layers_received = all_layers_received
         self._scene = Application.getInstance().getController().getScene()
         self._progress_message = Message(catalog.i18nc("@info:status", "Processing Layers"), 0, False, -1)
         self._abort_requested = False
         self._build_plate_number = None
+        self._layer_data_cache = None
+        self._layer_processing_pool = None
+        self._pending_layers = {}  # Index of each layer message that is being converted by the pool -> its future.
 
     def abort(self):
         """Aborts the processing of layers.
@@ -64,12 +78,43 @@ class ProcessSlicedLayersJob(Job):
 
         self._abort_requested = True
 
+    def addLayer(self, layer):
+        """Add a layer message that the engine sent after the job was started.
+
+        :param layer: The optimized layer message.
+        """
+
+        self._layers.append(layer)
+
+    def setAllLayersReceived(self):
+        """Indicate that the engine is done sending layers, so the job can finish once they are all processed."""
+
+        self._all_layers_received = True
+
+    def isStreaming(self):
+        """Whether the job is still waiting for layers from the engine."""
+
+        return not self._all_layers_received
+
     def setBuildPlate(self, new_value):
         self._build_plate_number = new_value
 
     def getBuildPlate(self):
         return self._build_plate_number
 
+    def setLayerDataCache(self, layer_data_cache):
+        """Store the processed layer data in a LayerDataCache, and show it from there.
+
+        The layer data that is shown is then backed by the file of the cache, instead of being kept in memory.
+        """
+
+        self._layer_data_cache = layer_data_cache
+
+    def setLayerProcessingPool(self, layer_processing_pool):
+        """Convert the layer messages in the worker processes of a LayerProcessingPool, instead of in the job."""
+
+        self._layer_processing_pool = layer_processing_pool
+
     def run(self):
         Logger.log("d", "Processing new layer for build plate %s..." % self._build_plate_number)
         start_time = time()
@@ -95,105 +140,272 @@ class ProcessSlicedLayersJob(Job):
         # sure any old layer data is really cleaned up before adding new.
         gc.collect()
 
-        mesh = MeshData()
-        layer_data = LayerDataBuilder.LayerDataBuilder()
-        layer_count = len(self._layers)
-
-        # Find the minimum layer number
-        # When disabling the remove empty first layers setting, the minimum layer number will be a positive
-        # value. In that case the first empty layers will be discarded and start processing layers from the
-        # first layer with data.
-        # When using a raft, the raft layers are sent as layers < 0. Instead of allowing layers < 0, we
-        # simply offset all other layers so the lowest layer is always 0. It could happens that the first
-        # raft layer has value -8 but there are just 4 raft (negative) layers.
+        compact_attributes = bool(Application.getInstance().getPreferences().getValue("view/compact_layer_attributes"))
+        layer_data = LayerDataBuilder.LayerDataBuilder(compact_attributes)
+        material_color_map = self._getMaterialColorMap()
+
+        # We have to scale the colors for compatibility mode
+        if OpenGLContext.isLegacyOpenGL() or bool(Application.getInstance().getPreferences().getValue("view/force_layer_view_compatibility_mode")):
+            line_type_brightness = 0.5  # for compatibility mode
+        else:
+            line_type_brightness = 1.0
+
+        # The layer numbers depend on all layers (see _getLayerNumbering). While the engine is still sending layers,
+        # they are numbered with the layers received so far, and checked again once all layers are in.
+        streaming = self.isStreaming()
+        if streaming:
+            min_layer_number, negative_layers = sys.maxsize, 0
+        else:
+            min_layer_number, negative_layers = self._getLayerNumbering(self._layers)
+        layer_numbers = []  # The absolute layer number that each processed layer got, or None if it was skipped.
+        last_publish_time = time()
+
+        while len(layer_numbers) < len(self._layers) or not self._all_layers_received:
+            if self._abort_requested:
+                self._abortProcessing(new_node)
+                return
+
+            if len(layer_numbers) == len(self._layers):
+                # Waiting for the engine. Show what we have so far, so the layer view grows while slicing.
+                if len(layer_data.getLayers()) > len(layer_data.getElementCounts()) and time() - last_publish_time > self._publish_interval:
+                    self._publishLayerData(new_node, layer_data.build(material_color_map, line_type_brightness))
+                    last_publish_time = time()
+                sleep(0.05)
+                continue
+
+            segments = None
+            if self._layer_processing_pool is not None:
+                segments = self._receiveLayer(len(layer_numbers))
+                if self._abort_requested:
+                    self._abortProcessing(new_node)
+                    return
+
+            layer = self._layers[len(layer_numbers)]
+            if streaming and layer.repeatedMessageCount("path_segment") > 0:
+                if layer.id < min_layer_number:
+                    min_layer_number = layer.id
+                if layer.id < 0:
+                    negative_layers += 1
+            abs_layer_number = self._getAbsoluteLayerNumber(layer.id, min_layer_number, negative_layers)
+            layer_numbers.append(abs_layer_number)
+            if abs_layer_number is not None:
+                self._processLayer(layer, abs_layer_number, layer_data, segments)
+
+            Job.yieldThread()
+            progress = (len(layer_numbers) / len(self._layers)) * 99
+
+            if self._abort_requested:
+                self._abortProcessing(new_node)
+                return
+            if self._progress_message:
+                self._progress_message.setProgress(progress)
+
+        # We are done processing all the layers we got from the engine. If the layers that arrived later changed the
+        # numbering of the layers that were already processed, process them all again with the final numbering.
+        min_layer_number, negative_layers = self._getLayerNumbering(self._layers)
+        if layer_numbers != [self._getAbsoluteLayerNumber(layer.id, min_layer_number, negative_layers) for layer in self._layers]:
+            Logger.log("d", "Layers were received out of order, processing them again.")
+            # The path segments don't depend on the layer number, so the ones that were converted are reused.
+            processed_layer_data = layer_data
+            layer_data = LayerDataBuilder.LayerDataBuilder(compact_attributes)
+            for layer, processed_layer_number in zip(self._layers, layer_numbers):
+                abs_layer_number = self._getAbsoluteLayerNumber(layer.id, min_layer_number, negative_layers)
+                if abs_layer_number is not None:
+                    segments = processed_layer_data.getLayer(processed_layer_number).getSegments() if processed_layer_number is not None else None
+                    self._processLayer(layer, abs_layer_number, layer_data, segments)
+                Job.yieldThread()
+                if self._abort_requested:
+                    self._abortProcessing(new_node)
+                    return
+
+        # Now create a mesh out of the data. Only the layers that weren't shown yet still need to be built.
+        layer_mesh = layer_data.build(material_color_map, line_type_brightness)
+
+        if self._abort_requested:
+            self._abortProcessing(new_node)
+            return
+
+        if self._layer_data_cache is not None and self._layer_data_cache.store(self._build_plate_number, layer_mesh):
+            cached_layer_mesh = self._layer_data_cache.load(self._build_plate_number)
+            if cached_layer_mesh is not None:
+                layer_mesh = cached_layer_mesh
+
+        self._publishLayerData(new_node, layer_mesh)  # Note: After this we can no longer abort!
+
+        if self._progress_message:
+            self._progress_message.setProgress(100)
+
+        if self._progress_message:
+            self._progress_message.hide()
+
+        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
+        self._layers = None
+
+        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
+        if compact_attributes:
+            Logger.log("d", "Compact layer attributes saved %s bytes on build plate %s", layer_data.getBytesSaved(), self._build_plate_number)
+
+    _publish_interval = 0.5  # Minimum time in seconds between showing two partial results while the engine is slicing.
+
+    @staticmethod
+    def _getLayerNumbering(layers):
+        """Find the minimum layer number and the number of raft layers.
+
+        When disabling the remove empty first layers setting, the minimum layer number will be a positive
+        value. In that case the first empty layers will be discarded and start processing layers from the
+        first layer with data.
+        When using a raft, the raft layers are sent as layers < 0. Instead of allowing layers < 0, we
+        simply offset all other layers so the lowest layer is always 0. It could happens that the first
+        raft layer has value -8 but there are just 4 raft (negative) layers.
+
+        :return: A tuple of the minimum layer number and the number of negative layers.
+        """
+
         min_layer_number = sys.maxsize
         negative_layers = 0
-        for layer in self._layers:
+        for layer in layers:
             if layer.repeatedMessageCount("path_segment") > 0:
                 if layer.id < min_layer_number:
                     min_layer_number = layer.id
                 if layer.id < 0:
                     negative_layers += 1
+        return min_layer_number, negative_layers
 
-        current_layer = 0
+    @staticmethod
+    def _getAbsoluteLayerNumber(layer_id, min_layer_number, negative_layers):
+        """Get the layer number that a layer is shown with.
 
-        for layer in self._layers:
-            # If the layer is below the minimum, it means that there is no data, so that we don't create a layer
-            # data. However, if there are empty layers in between, we compute them.
-            if layer.id < min_layer_number:
-                continue
+        :return: The layer number, or None if the layer is below the minimum, which means that it has no data. However,
+        if there are empty layers in between, they do get a layer number.
+        """
 
-            # Layers are offset by the minimum layer number. In case the raft (negative layers) is being used,
-            # then the absolute layer number is adjusted by removing the empty layers that can be in between raft
-            # and the model
-            abs_layer_number = layer.id - min_layer_number
-            if layer.id >= 0 and negative_layers != 0:
-                abs_layer_number += (min_layer_number + negative_layers)
+        if layer_id < min_layer_number:
+            return None
 
-            layer_data.addLayer(abs_layer_number)
-            this_layer = layer_data.getLayer(abs_layer_number)
-            layer_data.setLayerHeight(abs_layer_number, layer.height)
-            layer_data.setLayerThickness(abs_layer_number, layer.thickness)
+        # Layers are offset by the minimum layer number. In case the raft (negative layers) is being used,
+        # then the absolute layer number is adjusted by removing the empty layers that can be in between raft
+        # and the model
+        abs_layer_number = layer_id - min_layer_number
+        if layer_id >= 0 and negative_layers != 0:
+            abs_layer_number += (min_layer_number + negative_layers)
+        return abs_layer_number
 
-            for p in range(layer.repeatedMessageCount("path_segment")):
-                polygon = layer.getRepeatedMessage("path_segment", p)
+    def _receiveLayer(self, index):
+        """Get the path segments of a layer message from the layer processing pool.
 
-                extruder = polygon.extruder
+        The layers after it are submitted to the pool, so the workers can convert them while this one is processed.
 
-                line_types = numpy.fromstring(polygon.line_type, dtype = "u1")  # Convert bytearray to numpy array
+        :return: The segments, or None if the pool failed, in which case the job converts the layers itself. Also None
+        if the job is aborted while waiting.
+        """
 
-                line_types = line_types.reshape((-1,1))
+        pool = self._layer_processing_pool
+        try:
+            # Only a few layers per worker are in flight, so the copies of their buffers don't use much memory.
+            for next_index in range(index, min(len(self._layers), index + 2 * pool.getWorkerCount())):
+                if next_index not in self._pending_layers:
+                    self._pending_layers[next_index] = pool.submit(self._layers[next_index].height, *self._getSegmentBuffers(self._layers[next_index]))
 
-                points = numpy.fromstring(polygon.points, dtype = "f4")  # Convert bytearray to numpy array
-                if polygon.point_type == 0: # Point2D
-                    points = points.reshape((-1,2))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-                else:  # Point3D
-                    points = points.reshape((-1,3))
+            future = self._pending_layers.pop(index)
+            while True:
+                try:
+                    return pool.getSegments(future, timeout = 0.05)
+                except concurrent.futures.TimeoutError:
+                    if self._abort_requested:
+                        pool.discard(future)
+                        return None
+        except Exception:
+            Logger.logException("w", "The layer processing pool failed, processing the layers in the job instead.")
+            self._discardPendingLayers()
+            self._layer_processing_pool = None
+            return None
+
+    def _discardPendingLayers(self):
+        for future in self._pending_layers.values():
+            self._layer_processing_pool.discard(future)
+        self._pending_layers = {}
+
+    @staticmethod
+    def _getSegmentBuffers(layer):
+        """Get the raw buffers of the path segments of a layer message, as LayerSegments.fromBuffers takes them."""
+
+        segments = [layer.getRepeatedMessage("path_segment", p) for p in range(layer.repeatedMessageCount("path_segment"))]
+        return ([segment.extruder for segment in segments],
+                [segment.point_type for segment in segments],
+                [segment.points for segment in segments],
+                [segment.line_type for segment in segments],
+                [segment.line_width for segment in segments],
+                [segment.line_thickness for segment in segments],
+                [segment.line_feedrate for segment in segments])
+
+    def _processLayer(self, layer, abs_layer_number, layer_data, segments = None):
+        """Convert the path segments of a layer message into layer data.
+
+        :param layer: The optimized layer message.
+        :param abs_layer_number: The layer number to add the layer with.
+        :param layer_data: The layer data builder to add the layer to.
+        :param segments: The path segments of the layer, if they were already converted.
+        """
 
-                line_widths = numpy.fromstring(polygon.line_width, dtype = "f4")  # Convert bytearray to numpy array
-                line_widths = line_widths.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+        layer_data.addLayer(abs_layer_number)
+        this_layer = layer_data.getLayer(abs_layer_number)
+        layer_data.setLayerHeight(abs_layer_number, layer.height)
+        layer_data.setLayerThickness(abs_layer_number, layer.thickness)
 
-                line_thicknesses = numpy.fromstring(polygon.line_thickness, dtype = "f4")  # Convert bytearray to numpy array
-                line_thicknesses = line_thicknesses.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+        if segments is None:
+            # Convert all path segments of the layer at once. The layer stores them as they are, with one array per
+            # attribute, instead of as a LayerPolygon per segment.
+            segments = LayerSegments.fromBuffers(layer.height, *self._getSegmentBuffers(layer))
 
-                line_feedrates = numpy.fromstring(polygon.line_feedrate, dtype = "f4")  # Convert bytearray to numpy array
-                line_feedrates = line_feedrates.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+        # Check the line types of the whole layer at once, instead of for every polygon separately.
+        LayerPolygon.LayerPolygon.validateLineTypes(segments.line_types)
+        this_layer.setSegments(segments)
 
-                # Create a new 3D-array, copy the 2D points over and insert the right height.
-                # This uses manual array creation + copy rather than numpy.insert since this is
-                # faster.
-                new_points = numpy.empty((len(points), 3), numpy.float32)
-                if polygon.point_type == 0:  # Point2D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = layer.height / 1000  # layer height value is in backend representation
-                    new_points[:, 2] = -points[:, 1]
-                else: # Point3D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = points[:, 2]
-                    new_points[:, 2] = -points[:, 1]
+    def _publishLayerData(self, new_node, layer_mesh):
+        """Show the layer data in the scene.
 
-                this_poly = LayerPolygon.LayerPolygon(extruder, line_types, new_points, line_widths, line_thicknesses, line_feedrates)
-                this_poly.buildCache()
+        The first time, the node is added to the scene. After that, only its layer data is replaced and the layer view
+        is told to update its layer range.
+        """
 
-                this_layer.polygons.append(this_poly)
+        decorator = new_node.getDecorator(LayerDataDecorator.LayerDataDecorator)
+        if decorator is None:
+            # Add LayerDataDecorator to scene node to indicate that the node has layer data
+            decorator = LayerDataDecorator.LayerDataDecorator()
+            new_node.addDecorator(decorator)
+        decorator.setLayerData(layer_mesh)
 
-                Job.yieldThread()
-            Job.yieldThread()
-            current_layer += 1
-            progress = (current_layer / layer_count) * 99
-            # TODO: Rebuild the layer data mesh once the layer has been processed.
-            # This needs some work in LayerData so we can add the new layers instead of recreating the entire mesh.
+        if new_node.getParent() is None:
+            new_node.setMeshData(MeshData())
+            # Set build volume as parent, the build volume can move as a result of raft settings.
+            # It makes sense to set the build volume as parent: the print is actually printed on it.
+            new_node_parent = Application.getInstance().getBuildVolume()
+            new_node.setParent(new_node_parent)
 
-            if self._abort_requested:
-                if self._progress_message:
-                    self._progress_message.hide()
-                return
-            if self._progress_message:
-                self._progress_message.setProgress(progress)
+            settings = Application.getInstance().getGlobalContainerStack()
+            if not settings.getProperty("machine_center_is_zero", "value"):
+                new_node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
+        else:
+            view = Application.getInstance().getController().getActiveView()
+            if view and view.getPluginId() == "SimulationView":
+                Application.getInstance().callLater(view.calculateMaxLayers)
+
+    def _abortProcessing(self, new_node):
+        """Stop processing, removing the layers that were already shown from the scene."""
+
+        if self._layer_processing_pool is not None:
+            self._discardPendingLayers()
+        if new_node.getParent() is not None:
+            new_node.setParent(None)
+        if self._progress_message:
+            self._progress_message.hide()
+
+    def _getMaterialColorMap(self):
+        """Find out colors per extruder
 
-        # We are done processing all the layers we got from the engine, now create a mesh out of the data
+        :return: An array with a row of [r, g, b, a] for each extruder.
+        """
 
-        # Find out colors per extruder
         global_container_stack = Application.getInstance().getGlobalContainerStack()
         manager = ExtruderManager.getInstance()
         extruders = manager.getActiveExtruderStacks()
@@ -214,44 +426,7 @@ class ProcessSlicedLayersJob(Job):
             color_code = global_container_stack.material.getMetaDataEntry("color_code", default = "#e0e000")
             color = colorCodeToRGBA(color_code)
             material_color_map[0, :] = color
-
-        # We have to scale the colors for compatibility mode
-        if OpenGLContext.isLegacyOpenGL() or bool(Application.getInstance().getPreferences().getValue("view/force_layer_view_compatibility_mode")):
-            line_type_brightness = 0.5  # for compatibility mode
-        else:
-            line_type_brightness = 1.0
-        layer_mesh = layer_data.build(material_color_map, line_type_brightness)
-
-        if self._abort_requested:
-            if self._progress_message:
-                self._progress_message.hide()
-            return
-
-        # Add LayerDataDecorator to scene node to indicate that the node has layer data
-        decorator = LayerDataDecorator.LayerDataDecorator()
-        decorator.setLayerData(layer_mesh)
-        new_node.addDecorator(decorator)
-
-        new_node.setMeshData(mesh)
-        # Set build volume as parent, the build volume can move as a result of raft settings.
-        # It makes sense to set the build volume as parent: the print is actually printed on it.
-        new_node_parent = Application.getInstance().getBuildVolume()
-        new_node.setParent(new_node_parent)  # Note: After this we can no longer abort!
-
-        settings = Application.getInstance().getGlobalContainerStack()
-        if not settings.getProperty("machine_center_is_zero", "value"):
-            new_node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
-
-        if self._progress_message:
-            self._progress_message.setProgress(100)
-
-        if self._progress_message:
-            self._progress_message.hide()
-
-        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
-        self._layers = None
-
-        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
+        return material_color_map
 
     def _onActiveViewChanged(self):
         if self.isRunning():
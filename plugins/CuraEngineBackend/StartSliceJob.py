@@ -1,17 +1,21 @@
 # Copyright (c) 2020 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import hashlib
 import numpy
 from string import Formatter
 from enum import IntEnum
+import struct
 import time
-from typing import Any, cast, Dict, List, Optional, Set
+from typing import Any, cast, Dict, List, NamedTuple, Optional, Set, Tuple
 import re
 import Arcus #For typing.
 from PyQt5.QtCore import QCoreApplication
 
 from UM.Job import Job
 from UM.Logger import Logger
+from UM.Math.Matrix import Matrix #For typing.
+from UM.Mesh.MeshData import MeshData #For typing.
 from UM.Scene.SceneNode import SceneNode
 from UM.Settings.ContainerStack import ContainerStack #For typing.
 from UM.Settings.InstanceContainer import InstanceContainer
@@ -25,13 +29,20 @@ from UM.Settings.Validator import ValidatorState
 from UM.Settings.SettingRelation import RelationType
 
 from cura.CuraApplication import CuraApplication
+from cura.MeshPayloadCache import MeshPayloadCache
 from cura.Scene.CuraSceneNode import CuraSceneNode
 from cura.OneAtATimeIterator import OneAtATimeIterator
 from cura.Settings.ExtruderManager import ExtruderManager
+from cura.Settings.SettingsSnapshotCache import SettingsSnapshotCache
+from cura.SliceResultCache import CachedMessage, SliceResultCache
 
 
 NON_PRINTING_MESH_SETTINGS = ["anti_overhang_mesh", "infill_mesh", "cutting_mesh"]
 
+# The evaluated settings of the global stack ("-1") and of each extruder (by extruder_nr), and the settings of the
+# global stack that are limited to an extruder, with the position of that extruder.
+SettingsSnapshot = NamedTuple("SettingsSnapshot", [("settings", Dict[str, Dict[str, Any]]), ("limit_to_extruder", List[Tuple[str, int]])])
+
 
 class StartJobResult(IntEnum):
     Finished = 1
@@ -99,6 +110,19 @@ class StartSliceJob(Job):
         self._build_plate_number = None #type: Optional[int]
 
         self._all_extruders_settings = None #type: Optional[Dict[str, Any]] # cache for all setting values from all stacks (global & extruder) for the current machine
+        self._settings_snapshot = None #type: Optional[SettingsSnapshot]
+        self._settings_snapshot_cache = None #type: Optional[SettingsSnapshotCache]
+
+        self._mesh_payload_cache = None #type: Optional[MeshPayloadCache]
+        self._reused_object_count = 0 #type: int
+        self._object_count = 0 #type: int
+        self._reused_vertex_bytes = 0 #type: int
+        self._vertex_bytes = 0 #type: int
+
+        self._slice_result_cache = None #type: Optional[SliceResultCache]
+        self._engine_version = "" #type: str
+        self._slice_result_key = None #type: Optional[str]
+        self._cached_slice_result = None #type: Optional[List[CachedMessage]]
 
     def getSliceMessage(self) -> Arcus.PythonMessage:
         return self._slice_message
@@ -106,6 +130,51 @@ class StartSliceJob(Job):
     def setBuildPlate(self, build_plate_number: int) -> None:
         self._build_plate_number = build_plate_number
 
+    def setMeshPayloadCache(self, mesh_payload_cache: Optional[MeshPayloadCache]) -> None:
+        """Set the cache to reuse the vertices of objects that didn't change since a previous slice from."""
+
+        self._mesh_payload_cache = mesh_payload_cache
+
+    def setSettingsSnapshotCache(self, settings_snapshot_cache: Optional[SettingsSnapshotCache]) -> None:
+        """Set the cache to reuse the settings of a previous slice from, if they didn't change since."""
+
+        self._settings_snapshot_cache = settings_snapshot_cache
+
+    def setSliceResultCache(self, slice_result_cache: Optional[SliceResultCache], engine_version: str) -> None:
+        """Set the cache to look for the results of an identical slice in.
+
+        :param engine_version: Identifies the engine, since another engine can give other results for the same message.
+        """
+
+        self._slice_result_cache = slice_result_cache
+        self._engine_version = engine_version
+
+    def getSliceResultKey(self) -> Optional[str]:
+        """Get the key of the results of this slice in the slice result cache, or None if there is no cache."""
+
+        return self._slice_result_key
+
+    def getCachedSliceResult(self) -> Optional[List[CachedMessage]]:
+        """Get the messages that the engine sent for an identical slice, or None if it wasn't sliced before."""
+
+        return self._cached_slice_result
+
+    def getReusedObjectCount(self) -> int:
+        """Get the number of objects in the slice message of which the vertices came from the mesh payload cache."""
+
+        return self._reused_object_count
+
+    def getObjectCount(self) -> int:
+        return self._object_count
+
+    def getReusedVertexBytes(self) -> int:
+        """Get the number of bytes of vertices in the slice message that came from the mesh payload cache."""
+
+        return self._reused_vertex_bytes
+
+    def getVertexBytes(self) -> int:
+        return self._vertex_bytes
+
     def _checkStackForErrors(self, stack: ContainerStack) -> bool:
         """Check if a stack has any errors."""
 
@@ -295,6 +364,7 @@ class StartSliceJob(Job):
         for extruder_stack in global_stack.extruderList:
             self._buildExtruderMessage(extruder_stack)
 
+        object_digests = [] #type: List[bytes]
         for group in filtered_object_groups:
             group_message = self._slice_message.addRepeatedMessage("object_lists")
             parent = group[0].getParent()
@@ -305,35 +375,152 @@ class StartSliceJob(Job):
                 mesh_data = object.getMeshData()
                 if mesh_data is None:
                     continue
-                rot_scale = object.getWorldTransformation().getTransposed().getData()[0:3, 0:3]
-                translate = object.getWorldTransformation().getData()[:3, 3]
-
-                # This effectively performs a limited form of MeshData.getTransformed that ignores normals.
-                verts = mesh_data.getVertices()
-                verts = verts.dot(rot_scale)
-                verts += translate
-
-                # Convert from Y up axes to Z up axes. Equals a 90 degree rotation.
-                verts[:, [1, 2]] = verts[:, [2, 1]]
-                verts[:, 1] *= -1
 
                 obj = group_message.addRepeatedMessage("objects")
                 obj.id = id(object)
                 obj.name = object.getName()
-                indices = mesh_data.getIndices()
-                if indices is not None:
-                    flat_verts = numpy.take(verts, indices.flatten(), axis=0)
-                else:
-                    flat_verts = numpy.array(verts)
-
-                obj.vertices = flat_verts
+                world_transformation = object.getWorldTransformation()
+                vertices = self._getObjectVertices(mesh_data, world_transformation)
+                obj.vertices = vertices
+                if self._slice_result_cache is not None:
+                    object_digests.append(self._getVerticesDigest(mesh_data, world_transformation, vertices))
 
                 self._handlePerObjectSettings(cast(CuraSceneNode, object), obj)
 
                 Job.yieldThread()
 
+        Logger.log("d", "Reused the vertices of %d of %d objects (%.1f of %.1f MB) for the slice message.",
+                   self._reused_object_count, self._object_count, self._reused_vertex_bytes / 1024 / 1024, self._vertex_bytes / 1024 / 1024)
+
+        if self._slice_result_cache is not None:
+            self._slice_result_key = self._hashSliceMessage(object_digests)
+            self._cached_slice_result = self._slice_result_cache.load(self._slice_result_key)
+
         self.setResult(StartJobResult.Finished)
 
+    # The tokens of the time of the slice. They are sent along with the global settings, but the engine doesn't use
+    # them, so they would only make the key different for each slice. Where the start or end g-code uses them, they are
+    # part of the g-code that is hashed.
+    _unhashed_settings = {"time", "date", "day"}
+
+    def _hashSliceMessage(self, object_digests: List[bytes]) -> str:
+        """Get a hash of the contents of the slice message, as the key of its results in the slice result cache.
+
+        The ids of the objects are left out, since they are different each time that a scene is loaded, and so are the
+        time tokens. Instead of the vertices themselves, the hashes of the vertices of the objects are hashed, which the
+        mesh payload cache keeps for objects that didn't change.
+
+        :param object_digests: The hashes of the vertices of all objects, in the order of the message.
+        """
+
+        digest = hashlib.sha256()
+
+        def addNumber(value: int) -> None:
+            digest.update(struct.pack("<q", value))
+
+        def addBytes(value: Any) -> None:
+            if isinstance(value, str):
+                value = value.encode("utf-8")
+            addNumber(len(value) if isinstance(value, bytes) else value.nbytes)
+            digest.update(value)
+
+        def addSettings(message: Arcus.PythonMessage, field_name: str) -> None:
+            addNumber(message.repeatedMessageCount(field_name))
+            for index in range(message.repeatedMessageCount(field_name)):
+                setting = message.getRepeatedMessage(field_name, index)
+                if setting.name in self._unhashed_settings:
+                    continue
+                addBytes(setting.name)
+                addBytes(setting.value)
+
+        addBytes(self._engine_version)
+        addSettings(self._slice_message.getMessage("global_settings"), "settings")
+        addNumber(self._slice_message.repeatedMessageCount("extruders"))
+        for index in range(self._slice_message.repeatedMessageCount("extruders")):
+            extruder = self._slice_message.getRepeatedMessage("extruders", index)
+            addNumber(extruder.id)
+            addSettings(extruder.getMessage("settings"), "settings")
+        addNumber(self._slice_message.repeatedMessageCount("limit_to_extruder"))
+        for index in range(self._slice_message.repeatedMessageCount("limit_to_extruder")):
+            setting_extruder = self._slice_message.getRepeatedMessage("limit_to_extruder", index)
+            addBytes(setting_extruder.name)
+            addNumber(setting_extruder.extruder)
+
+        digests = iter(object_digests)
+        addNumber(self._slice_message.repeatedMessageCount("object_lists"))
+        for group_index in range(self._slice_message.repeatedMessageCount("object_lists")):
+            group_message = self._slice_message.getRepeatedMessage("object_lists", group_index)
+            addSettings(group_message, "settings")
+            addNumber(group_message.repeatedMessageCount("objects"))
+            for index in range(group_message.repeatedMessageCount("objects")):
+                obj = group_message.getRepeatedMessage("objects", index)
+                addBytes(obj.name)
+                addBytes(next(digests))
+                addSettings(obj, "settings")
+        return digest.hexdigest()
+
+    def _getVerticesDigest(self, mesh_data: MeshData, world_transformation: Matrix, vertices: numpy.ndarray) -> bytes:
+        """Get the hash of the vertices of an object, from the mesh payload cache if the object didn't change."""
+
+        if self._mesh_payload_cache is None:
+            return MeshPayloadCache.hashVertices(vertices)
+        return self._mesh_payload_cache.getDigest(mesh_data, world_transformation.getData(), vertices)
+
+    def _getObjectVertices(self, mesh_data: MeshData, world_transformation: Matrix) -> numpy.ndarray:
+        """Get the vertices of an object to send to the engine: the corners of each face, in build volume coordinates.
+
+        If the mesh is in the same position as in a previous slice, the vertices are taken from the mesh payload cache.
+        """
+
+        transformation = world_transformation.getData()
+        vertices = self._mesh_payload_cache.get(mesh_data, transformation) if self._mesh_payload_cache is not None else None
+        if vertices is not None:
+            self._reused_object_count += 1
+            self._reused_vertex_bytes += vertices.nbytes
+        else:
+            vertices = self._transformVertices(mesh_data, world_transformation)
+            if self._mesh_payload_cache is not None:
+                self._mesh_payload_cache.store(mesh_data, transformation, vertices)
+        self._object_count += 1
+        self._vertex_bytes += vertices.nbytes
+        return vertices
+
+    # Converts from Y up axes to Z up axes: (x, y, z) becomes (x, -z, y). Equals a 90 degree rotation.
+    _y_up_to_z_up = numpy.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]], dtype = numpy.float64)
+
+    # The number of corners to take from the vertices at a time. Numpy converts and buffers the indices it takes with,
+    # so taking them all at once would temporarily need about as much memory again as the corners themselves.
+    _corner_block_size = 1 << 18
+
+    @classmethod
+    def _transformVertices(cls, mesh_data: MeshData, world_transformation: Matrix) -> numpy.ndarray:
+        """Get the corners of each face of a mesh in build volume coordinates, as 32-bit floats like the engine reads them.
+
+        This effectively performs a limited form of MeshData.getTransformed that ignores normals. The rotation and scale
+        of the object and the conversion to Z up axes are combined into one matrix, so that the vertices are transformed
+        with a single multiplication in 32-bit floats. The vertices are transformed before they are expanded to the
+        corners of each face, which are written into the array that is sent in blocks, so that no other copies are made.
+        """
+
+        data = world_transformation.getData()
+        rot_scale = (cls._y_up_to_z_up.dot(data[0:3, 0:3])).T.astype(numpy.float32)
+        translate = cls._y_up_to_z_up.dot(data[0:3, 3]).astype(numpy.float32)
+
+        verts = mesh_data.getVertices()
+        transformed = numpy.empty((verts.shape[0], 3), dtype = numpy.float32)
+        numpy.matmul(verts.astype(numpy.float32, copy = False), rot_scale, out = transformed)
+        transformed += translate
+
+        indices = mesh_data.getIndices()
+        if indices is None:
+            return transformed
+        indices = indices.reshape(-1)
+        corners = numpy.empty((indices.size, 3), dtype = numpy.float32)
+        for start in range(0, indices.size, cls._corner_block_size):
+            end = start + cls._corner_block_size
+            numpy.take(transformed, indices[start:end], axis = 0, out = corners[start:end])
+        return corners
+
     def cancel(self) -> None:
         super().cancel()
         self._is_cancelled = True
@@ -352,6 +539,13 @@ class StartSliceJob(Job):
         :return: A dictionary of replacement tokens to the values they should be replaced with.
         """
 
+        result = self._evaluateSettings(stack)
+        result.update(self._buildTimeReplacementTokens())
+        return result
+
+    def _evaluateSettings(self, stack: ContainerStack) -> Dict[str, Any]:
+        """Get the values of all settings of a stack, including the renamed settings that can be used as tokens."""
+
         result = {}
         for key in stack.getAllKeys():
             result[key] = stack.getProperty(key, "value")
@@ -360,26 +554,63 @@ class StartSliceJob(Job):
         result["print_bed_temperature"] = result["material_bed_temperature"] # Renamed settings.
         result["print_temperature"] = result["material_print_temperature"]
         result["travel_speed"] = result["speed_travel"]
-        result["time"] = time.strftime("%H:%M:%S") #Some extra settings.
-        result["date"] = time.strftime("%d-%m-%Y")
-        result["day"] = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"][int(time.strftime("%w"))]
-        result["initial_extruder_nr"] = CuraApplication.getInstance().getExtruderManager().getInitialExtruderNr()
-
         return result
 
+    @staticmethod
+    def _buildTimeReplacementTokens() -> Dict[str, Any]:
+        """Creates the tokens that don't come from the settings, and so can change between slices with the same settings."""
+
+        return {
+            "time": time.strftime("%H:%M:%S"), #Some extra settings.
+            "date": time.strftime("%d-%m-%Y"),
+            "day": ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"][int(time.strftime("%w"))],
+            "initial_extruder_nr": CuraApplication.getInstance().getExtruderManager().getInitialExtruderNr()
+        }
+
     def _cacheAllExtruderSettings(self):
         global_stack = cast(ContainerStack, CuraApplication.getInstance().getGlobalContainerStack())
+        extruder_stacks = ExtruderManager.getInstance().getActiveExtruderStacks()
+        stacks = [global_stack] + extruder_stacks
+        start_time = time.perf_counter()
+
+        # The settings only need to be evaluated if they changed since the previous slice.
+        snapshot = self._settings_snapshot_cache.get(stacks) if self._settings_snapshot_cache is not None else None
+        reused = snapshot is not None
+        if snapshot is None:
+            revision = self._settings_snapshot_cache.getRevision() if self._settings_snapshot_cache is not None else 0
+            snapshot = self._createSettingsSnapshot(global_stack, extruder_stacks)
+            if self._settings_snapshot_cache is not None:
+                self._settings_snapshot_cache.store(revision, stacks, snapshot)
+        self._settings_snapshot = snapshot
 
         # NB: keys must be strings for the string formatter
-        self._all_extruders_settings = {
-            "-1": self._buildReplacementTokens(global_stack)
+        time_tokens = self._buildTimeReplacementTokens()
+        self._all_extruders_settings = {}
+        for extruder_nr, settings in snapshot.settings.items():
+            self._all_extruders_settings[extruder_nr] = settings.copy()  # The snapshot may be used again, so it must not change.
+            self._all_extruders_settings[extruder_nr].update(time_tokens)
+
+        Logger.log("d", "Evaluating the settings for the slice took %.3f s%s.", time.perf_counter() - start_time, " (reused from the previous slice)" if reused else "")
+
+    def _createSettingsSnapshot(self, global_stack: ContainerStack, extruder_stacks: List[ContainerStack]) -> SettingsSnapshot:
+        settings = {
+            "-1": self._evaluateSettings(global_stack)
         }
         QCoreApplication.processEvents()  # Ensure that the GUI does not freeze.
-        for extruder_stack in ExtruderManager.getInstance().getActiveExtruderStacks():
+        for extruder_stack in extruder_stacks:
             extruder_nr = extruder_stack.getProperty("extruder_nr", "value")
-            self._all_extruders_settings[str(extruder_nr)] = self._buildReplacementTokens(extruder_stack)
+            settings[str(extruder_nr)] = self._evaluateSettings(extruder_stack)
             QCoreApplication.processEvents()  # Ensure that the GUI does not freeze.
 
+        limit_to_extruder = []  # type: List[Tuple[str, int]]
+        for key in global_stack.getAllKeys():
+            extruder_position = int(round(float(global_stack.getProperty(key, "limit_to_extruder"))))
+            if extruder_position >= 0:  # Set to a specific extruder.
+                limit_to_extruder.append((key, extruder_position))
+            Job.yieldThread()
+
+        return SettingsSnapshot(settings, limit_to_extruder)
+
     def _expandGcodeTokens(self, value: str, default_extruder_nr: int = -1) -> str:
         """Replace setting tokens in a piece of g-code.
 
@@ -486,13 +717,16 @@ class StartSliceJob(Job):
             limit_to_extruder property.
         """
 
-        for key in stack.getAllKeys():
-            extruder_position = int(round(float(stack.getProperty(key, "limit_to_extruder"))))
-            if extruder_position >= 0:  # Set to a specific extruder.
-                setting_extruder = self._slice_message.addRepeatedMessage("limit_to_extruder")
-                setting_extruder.name = key
-                setting_extruder.extruder = extruder_position
-            Job.yieldThread()
+        if self._settings_snapshot is None:
+            self._cacheAllExtruderSettings()
+
+        if self._settings_snapshot is None:
+            return
+
+        for key, extruder_position in self._settings_snapshot.limit_to_extruder:
+            setting_extruder = self._slice_message.addRepeatedMessage("limit_to_extruder")
+            setting_extruder.name = key
+            setting_extruder.extruder = extruder_position
 
     def _handlePerObjectSettings(self, node: CuraSceneNode, message: Arcus.PythonMessage):
         """Check if a node has per object settings and ensure that they are set correctly in the message
@@ -0,0 +1,24 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from typing import Any, List
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura.SliceResultCache import SliceResultCache
+
+
+class StoreSliceResultJob(Job):
+    """Writes the messages that the engine sent for a slice to the slice result cache, outside of the main thread."""
+
+    def __init__(self, slice_result_cache: SliceResultCache, key: str, messages: List[Any]) -> None:
+        super().__init__()
+        self._slice_result_cache = slice_result_cache
+        self._key = key
+        self._messages = messages
+
+    def run(self) -> None:
+        if self._slice_result_cache.store(self._key, self._messages):
+            Logger.log("d", "Stored the result of the slice in the slice result cache as %s.", self._key)
+        self._messages = []
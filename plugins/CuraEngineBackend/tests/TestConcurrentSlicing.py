@@ -0,0 +1,277 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from UM.Backend.Backend import BackendState
+
+from cura.GCodeBuffer import GCodeBuffer
+from cura.SliceResultCache import CachedMessage
+from ..CuraEngineBackend import CuraEngineBackend
+from ..StartSliceJob import StartJobResult
+
+
+def createEngine(port):
+    engine = MagicMock(name = "engine_{port}".format(port = port))
+    engine.port = port
+    return engine
+
+
+def createJob(result = StartJobResult.Finished, cached_slice_result = None):
+    job = MagicMock(name = "start_slice_job")
+    job.isCancelled = MagicMock(return_value = False)
+    job.getError = MagicMock(return_value = None)
+    job.getResult = MagicMock(return_value = result)
+    job.getCachedSliceResult = MagicMock(return_value = cached_slice_result)
+    job.getSliceResultKey = MagicMock(return_value = None)
+    return job
+
+
+@pytest.fixture()
+def engine_pool():
+    pool = MagicMock(name = "engine_pool")
+    pool.take = MagicMock(side_effect = [createEngine(port) for port in range(49676, 49686)])
+    return pool
+
+
+@pytest.fixture()
+def backend(engine_pool):
+    """A back-end that is slicing build plate 0 with its own engine, and could slice build plates 1 and 2 as well.
+
+    The back-end isn't initialised, since that would start an engine. Only what slicing several build plates needs is set.
+    """
+
+    backend = CuraEngineBackend.__new__(CuraEngineBackend)
+    preferences = {"backend/max_concurrent_slices": 3}
+    backend._application = MagicMock(name = "application")
+    backend._application.getPreferences().getValue = MagicMock(side_effect = lambda key: preferences[key])
+    backend._application.getMultiBuildPlateModel().activeBuildPlate = 0
+    backend._application.isShuttingDown = MagicMock(return_value = False)
+    backend._engine_pool = engine_pool
+    backend._slicing = True
+    backend._slice_start_time = None
+    backend._start_slice_job_build_plate = 0
+    backend._tool_active = False
+    backend._layer_view_active = False
+    backend._process_layers_job = None
+    backend._build_plates_to_be_sliced = [1, 2]
+    backend._build_plates_to_slice_alone = set()
+    backend._plate_slicers = {}
+    backend._scene = MagicMock(name = "scene")
+    backend._scene.gcode_dict = {0: GCodeBuffer()}
+    backend._stored_optimized_layer_data = {}
+    backend._slice_result_recordings = {}
+    backend._slice_result_cache = None
+    backend._layer_data_cache = None
+    backend._plate_message_handlers = {
+        "cura.proto.GCodeLayer": backend._addGCodeLayer,
+        "cura.proto.GCodePrefix": backend._addGCodePrefix,
+        "cura.proto.SlicingFinished": backend._onPlateSlicingFinished
+    }
+    backend._numObjectsPerBuildPlate = MagicMock(return_value = {0: 1, 1: 1, 2: 1})
+    backend._createStartSliceJob = MagicMock(side_effect = lambda slice_message, build_plate: createJob())
+    backend.setState = MagicMock()
+    backend.processingProgress = MagicMock()
+    backend.enableTimer = MagicMock()
+    backend._invokeSlice = MagicMock()
+    return backend
+
+
+def receive(plate_slicer, type_name, **fields):
+    """Let the engine of a build plate that is sliced next to the back-end send a message."""
+
+    engine_socket = plate_slicer._engine.socket
+    engine_socket.takeNextMessage = MagicMock(return_value = CachedMessage(type_name, fields))
+    engine_socket.messageReceived.connect.call_args[0][0]()
+
+
+def test_startPlateSlicers(backend, engine_pool):
+    backend._startPlateSlicers()
+
+    assert sorted(backend._plate_slicers) == [1, 2]
+    assert backend._build_plates_to_be_sliced == []
+    assert backend._plate_slicers[1].getPort() == 49676
+    for build_plate, plate_slicer in backend._plate_slicers.items():
+        assert backend._scene.gcode_dict[build_plate] == GCodeBuffer()
+        plate_slicer.getStartSliceJob().start.assert_called_once_with()
+    backend._createStartSliceJob.assert_has_calls([call(backend._plate_slicers[1]._engine.socket.createMessage.return_value, 1),
+                                                   call(backend._plate_slicers[2]._engine.socket.createMessage.return_value, 2)])
+
+
+def test_startPlateSlicersActiveFirst(backend):
+    backend._application.getPreferences().getValue.side_effect = lambda key: 2
+    backend._application.getMultiBuildPlateModel().activeBuildPlate = 2
+
+    backend._startPlateSlicers()
+
+    assert list(backend._plate_slicers) == [2]
+    assert backend._build_plates_to_be_sliced == [1]
+
+
+def test_startPlateSlicersNoEngine(backend, engine_pool):
+    engine_pool.take.side_effect = None
+    engine_pool.take.return_value = None
+
+    backend._startPlateSlicers()
+
+    assert backend._plate_slicers == {}
+    assert backend._build_plates_to_be_sliced == [1, 2]
+
+
+def test_startPlateSlicersEmptyBuildPlate(backend):
+    backend._numObjectsPerBuildPlate.return_value = {0: 1, 1: 0, 2: 1}
+
+    backend._startPlateSlicers()
+
+    assert list(backend._plate_slicers) == [2]
+    assert backend._scene.gcode_dict[1] == GCodeBuffer()
+    assert backend._build_plates_to_be_sliced == []
+
+
+def test_routeMessages(backend):
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[2]
+    job = plate_slicer.getStartSliceJob()
+
+    backend._onPlateStartSliceCompleted(job)
+    receive(plate_slicer, "cura.proto.GCodeLayer", data = b"G1 X10\n")
+    receive(plate_slicer, "cura.proto.GCodePrefix", data = b";FLAVOR:Marlin\n")
+
+    plate_slicer._engine.socket.sendMessage.assert_called_once_with(job.getSliceMessage())
+    assert list(backend._scene.gcode_dict[2]) == [";FLAVOR:Marlin\n", "G1 X10\n"]
+    assert list(backend._scene.gcode_dict[1]) == []
+    assert list(backend._scene.gcode_dict[0]) == []
+
+
+def test_plateSlicingFinished(backend, engine_pool):
+    backend._application.getPreferences().getValue.side_effect = lambda key: 2
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[1]
+    backend._onPlateStartSliceCompleted(plate_slicer.getStartSliceJob())
+
+    receive(plate_slicer, "cura.proto.SlicingFinished")
+
+    plate_slicer._engine.stop.assert_called_once_with()
+    engine_pool.releasePort.assert_called_once_with(plate_slicer.getPort())
+    assert list(backend._plate_slicers) == [2]  # The next build plate is sliced with the next engine.
+
+
+def test_startSliceFailed(backend, engine_pool):
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[1]
+    job = plate_slicer.getStartSliceJob()
+    job.getResult.return_value = StartJobResult.SettingError
+
+    backend._onPlateStartSliceCompleted(job)
+
+    # The back-end slices the build plate itself when it is done, to show what's wrong.
+    plate_slicer._engine.stop.assert_called_once_with()
+    engine_pool.releasePort.assert_called_once_with(plate_slicer.getPort())
+    assert backend._build_plates_to_slice_alone == {1}
+    assert backend._build_plates_to_be_sliced == [1]
+    assert list(backend._plate_slicers) == [2]
+
+
+def test_plateSlicerError(backend):
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[2]
+    backend._onPlateStartSliceCompleted(plate_slicer.getStartSliceJob())
+
+    plate_slicer._engine.socket.error.connect.call_args[0][0](MagicMock(name = "connection_reset_error"))
+
+    plate_slicer._engine.stop.assert_called_once_with()
+    assert backend._build_plates_to_slice_alone == {2}
+    assert backend._build_plates_to_be_sliced == [2]
+    assert list(backend._plate_slicers) == [1]
+
+
+def test_sliceAloneWhenBackendIsDone(backend):
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[2]
+    backend._slicing = False
+
+    backend._onPlateSlicerError(plate_slicer)
+
+    assert backend._build_plates_to_be_sliced == [2]
+    backend.enableTimer.assert_called_once_with()
+    backend._invokeSlice.assert_called_once_with()
+
+
+def test_cachedSliceResult(backend):
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[1]
+    job = plate_slicer.getStartSliceJob()
+    job.getCachedSliceResult.return_value = [CachedMessage("cura.proto.GCodeLayer", {"data": b"G28\n"})]
+
+    backend._onPlateStartSliceCompleted(job)
+
+    plate_slicer._engine.socket.sendMessage.assert_not_called()
+    plate_slicer._engine.stop.assert_called_once_with()
+    assert list(backend._scene.gcode_dict[1]) == ["G28\n"]
+    assert 1 not in backend._plate_slicers
+
+
+def test_doneWhenPlateSlicersAreDone(backend):
+    backend._startPlateSlicers()
+    for plate_slicer in backend._plate_slicers.values():
+        backend._onPlateStartSliceCompleted(plate_slicer.getStartSliceJob())
+
+    backend._onSlicingFinishedMessage(CachedMessage("cura.proto.SlicingFinished"))
+    receive(backend._plate_slicers[1], "cura.proto.SlicingFinished")
+
+    assert call(BackendState.Done) not in backend.setState.call_args_list
+    backend.processingProgress.emit.assert_not_called()
+
+    receive(backend._plate_slicers[2], "cura.proto.SlicingFinished")
+
+    backend.setState.assert_called_once_with(BackendState.Done)
+    backend.processingProgress.emit.assert_called_once_with(1.0)
+
+
+def test_doneWhenBackendIsDone(backend):
+    backend._startPlateSlicers()
+    for plate_slicer in list(backend._plate_slicers.values()):
+        backend._onPlateStartSliceCompleted(plate_slicer.getStartSliceJob())
+        receive(plate_slicer, "cura.proto.SlicingFinished")
+
+    backend.setState.assert_not_called()
+
+    backend._onSlicingFinishedMessage(CachedMessage("cura.proto.SlicingFinished"))
+
+    backend.setState.assert_called_once_with(BackendState.Done)
+    backend.processingProgress.emit.assert_called_once_with(1.0)
+
+
+def test_plateSliceResultIsStored(backend):
+    backend._slice_result_cache = MagicMock(name = "slice_result_cache")
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[1]
+    job = plate_slicer.getStartSliceJob()
+    job.getSliceResultKey.return_value = "slice_result_key"
+    backend._onPlateStartSliceCompleted(job)
+    receive(plate_slicer, "cura.proto.GCodeLayer", data = b"G1 X10\n")
+
+    with patch(CuraEngineBackend.__module__ + ".StoreSliceResultJob") as store_job:
+        receive(plate_slicer, "cura.proto.SlicingFinished")
+
+    cache, key, messages = store_job.call_args[0]
+    assert cache is backend._slice_result_cache
+    assert key == "slice_result_key"
+    assert [message.getTypeName() for message in messages] == ["cura.proto.GCodeLayer"]
+    store_job.return_value.start.assert_called_once_with()
+    assert 1 not in backend._slice_result_recordings
+
+
+def test_stoppedPlateSliceResultIsNotStored(backend):
+    backend._slice_result_cache = MagicMock(name = "slice_result_cache")
+    backend._startPlateSlicers()
+    plate_slicer = backend._plate_slicers[1]
+    job = plate_slicer.getStartSliceJob()
+    job.getSliceResultKey.return_value = "slice_result_key"
+    backend._onPlateStartSliceCompleted(job)
+
+    backend._stopPlateSlicers()
+
+    assert backend._slice_result_recordings == {}
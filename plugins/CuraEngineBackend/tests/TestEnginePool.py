@@ -0,0 +1,205 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from unittest.mock import MagicMock, patch
+
+import Arcus
+import pytest
+
+from ..EnginePool import EnginePool
+
+
+def createSocket():
+    socket = MagicMock(name = "socket")
+    socket.registerAllMessageTypes = MagicMock(return_value = True)
+    socket.getState = MagicMock(return_value = Arcus.SocketState.Listening)
+    return socket
+
+
+@pytest.fixture(autouse = True)
+def sockets():
+    with patch(EnginePool.__module__ + ".SignalSocket", side_effect = createSocket):
+        yield
+
+
+def createPool(size, start_engine = None, on_engine_connected = None):
+    if start_engine is None:
+        start_engine = MagicMock(side_effect = lambda port: MagicMock(name = "process_{port}".format(port = port)))
+    return EnginePool(size, 49675, "Cura.proto", start_engine, on_engine_connected)
+
+
+def setState(engine, state):
+    """Let the socket of an engine report a new state, like Arcus does."""
+
+    engine.socket.getState.return_value = state
+    for call in engine.socket.stateChanged.connect.call_args_list:
+        call[0][0](state)
+
+
+def setError(engine, error_code):
+    error = MagicMock(getErrorCode = MagicMock(return_value = error_code))
+    for call in engine.socket.error.connect.call_args_list:
+        call[0][0](error)
+
+
+def test_fill():
+    pool = createPool(2)
+
+    pool.fill()
+
+    assert [engine.port for engine in pool._engines] == [49675, 49676]
+    for engine in pool._engines:
+        engine.socket.registerAllMessageTypes.assert_called_once_with(EnginePool.getProtocolFileArgument("Cura.proto"))
+        engine.socket.listen.assert_called_once_with("127.0.0.1", engine.port)
+
+
+def test_fillRegisterFailed():
+    pool = createPool(2)
+
+    with patch(EnginePool.__module__ + ".SignalSocket", side_effect = lambda: MagicMock(registerAllMessageTypes = MagicMock(return_value = False))):
+        pool.fill()
+
+    assert pool._engines == []
+
+
+def test_startEngineWhenListening():
+    start_engine = MagicMock(return_value = MagicMock(name = "process"))
+    pool = createPool(1, start_engine)
+    pool.fill()
+    engine = pool._engines[0]
+
+    setState(engine, Arcus.SocketState.Listening)
+
+    start_engine.assert_called_once_with(49675)
+    assert engine.process is start_engine.return_value
+
+
+def test_startEngineFailed():
+    pool = createPool(1, MagicMock(return_value = None))
+    pool.fill()
+    engine = pool._engines[0]
+
+    setState(engine, Arcus.SocketState.Listening)
+
+    assert pool._engines == []
+    engine.socket.close.assert_called_once_with()
+
+
+def test_takeNotConnected():
+    pool = createPool(1)
+    pool.fill()
+
+    assert pool.take() is None
+    assert len(pool._engines) == 1
+
+
+def test_take():
+    on_engine_connected = MagicMock()
+    pool = createPool(2, on_engine_connected = on_engine_connected)
+    pool.fill()
+    for engine in pool._engines:
+        setState(engine, Arcus.SocketState.Listening)
+    setState(pool._engines[1], Arcus.SocketState.Connected)
+    on_engine_connected.assert_called_once_with()
+
+    engine = pool.take()
+
+    assert engine.port == 49676
+    assert engine not in pool._engines
+    engine.socket.stateChanged.disconnect.assert_called_once_with(engine._onSocketStateChanged)
+    # The pool is filled up again, on a port that isn't taken.
+    assert [pool_engine.port for pool_engine in pool._engines] == [49675, 49677]
+    assert pool.take() is None
+
+
+def test_releasePort():
+    pool = createPool(1)
+    pool.fill()
+    setState(pool._engines[0], Arcus.SocketState.Connected)
+    engine = pool.take()
+    setState(pool._engines[0], Arcus.SocketState.Connected)
+    pool.take()
+
+    pool.releasePort(engine.port)
+    setState(pool._engines[0], Arcus.SocketState.Connected)
+    pool.take()
+
+    assert [pool_engine.port for pool_engine in pool._engines] == [engine.port]
+
+
+def test_noFreePort():
+    pool = createPool(3)
+
+    with patch.object(EnginePool, "_port_range", 2):
+        pool.fill()
+
+    assert [engine.port for engine in pool._engines] == [49675, 49676]
+
+
+def test_bindFailed():
+    pool = createPool(2)
+    pool.fill()
+    engine = pool._engines[0]
+
+    setError(engine, Arcus.ErrorCode.BindFailedError)
+
+    # The port is probably in use by another program, so the engine is replaced by one on the next free port.
+    assert engine not in pool._engines
+    engine.socket.close.assert_called_once_with()
+    assert sorted(pool_engine.port for pool_engine in pool._engines) == [49676, 49677]
+
+
+def test_engineFailed():
+    pool = createPool(2)
+    pool.fill()
+    engine = pool._engines[0]
+
+    setError(engine, Arcus.ErrorCode.ConnectionResetError)
+
+    assert [pool_engine.port for pool_engine in pool._engines] == [49676]
+    pool.fill()  # When the next engine is taken.
+    assert [pool_engine.port for pool_engine in pool._engines] == [49676, 49675]
+
+
+def test_debugError():
+    pool = createPool(1)
+    pool.fill()
+    engine = pool._engines[0]
+
+    setError(engine, Arcus.ErrorCode.Debug)
+
+    assert pool._engines == [engine]
+
+
+def test_setSize():
+    pool = createPool(3)
+    pool.fill()
+    engines = list(pool._engines)
+
+    pool.setSize(1)
+
+    assert pool._engines == engines[:1]
+    for engine in engines[1:]:
+        engine.socket.close.assert_called_once_with()
+
+    pool.setSize(2)
+
+    assert len(pool._engines) == 2
+
+
+def test_shutdown():
+    pool = createPool(2)
+    pool.fill()
+    for engine in pool._engines:
+        setState(engine, Arcus.SocketState.Listening)
+    engines = list(pool._engines)
+    processes = [engine.process for engine in engines]
+
+    pool.shutdown()
+
+    assert pool._engines == []
+    for engine, process in zip(engines, processes):
+        process.terminate.assert_called_once_with()
+        engine.socket.close.assert_called_once_with()
+    pool.fill()
+    assert pool._engines == []
@@ -0,0 +1,83 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from unittest.mock import MagicMock
+
+import Arcus
+
+from ..PlateSlicer import PlateSlicer
+
+
+def createEngine(port = 49676):
+    engine = MagicMock(name = "engine")
+    engine.port = port
+    return engine
+
+
+def receive(engine, message):
+    """Let the socket of an engine receive a message, like Arcus does."""
+
+    engine.socket.takeNextMessage = MagicMock(return_value = message)
+    engine.socket.messageReceived.connect.call_args[0][0]()
+
+
+def test_routeMessages():
+    engine = createEngine()
+    handler = MagicMock()
+    plate_slicer = PlateSlicer(2, engine, {"cura.proto.GCodeLayer": handler}, MagicMock())
+    message = MagicMock(getTypeName = MagicMock(return_value = "cura.proto.GCodeLayer"))
+
+    receive(engine, message)
+
+    handler.assert_called_once_with(2, message)
+    assert plate_slicer.getBuildPlate() == 2
+    assert plate_slicer.getPort() == 49676
+
+
+def test_ignoreOtherMessages():
+    engine = createEngine()
+    handler = MagicMock()
+    PlateSlicer(2, engine, {"cura.proto.GCodeLayer": handler}, MagicMock())
+
+    receive(engine, MagicMock(getTypeName = MagicMock(return_value = "cura.proto.Progress")))
+
+    handler.assert_not_called()
+
+
+def test_sendMessage():
+    engine = createEngine()
+    plate_slicer = PlateSlicer(2, engine, {}, MagicMock())
+
+    message = plate_slicer.createMessage("cura.proto.Slice")
+    plate_slicer.sendMessage(message)
+
+    engine.socket.createMessage.assert_called_once_with("cura.proto.Slice")
+    engine.socket.sendMessage.assert_called_once_with(message)
+
+
+def test_socketError():
+    engine = createEngine()
+    on_error = MagicMock()
+    plate_slicer = PlateSlicer(2, engine, {}, on_error)
+    on_socket_error = engine.socket.error.connect.call_args[0][0]
+
+    on_socket_error(MagicMock(getErrorCode = MagicMock(return_value = Arcus.ErrorCode.Debug)))
+    on_error.assert_not_called()
+
+    on_socket_error(MagicMock(getErrorCode = MagicMock(return_value = Arcus.ErrorCode.ConnectionResetError)))
+    on_error.assert_called_once_with(plate_slicer)
+
+
+def test_stop():
+    engine = createEngine()
+    plate_slicer = PlateSlicer(2, engine, {}, MagicMock())
+    job = MagicMock(name = "start_slice_job")
+    plate_slicer.setStartSliceJob(job)
+
+    plate_slicer.stop()
+
+    job.cancel.assert_called_once_with()
+    assert plate_slicer.getStartSliceJob() is None
+    engine.socket.messageReceived.disconnect.assert_called_once_with(plate_slicer._onMessageReceived)
+    engine.socket.error.disconnect.assert_called_once_with(plate_slicer._onSocketError)
+    engine.stop.assert_called_once_with()
@@ -0,0 +1,71 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import time
+from unittest.mock import MagicMock, patch
+
+from ..StartSliceJob import SettingsSnapshot, StartSliceJob
+
+
+class FakeMessage:
+    """Holds the fields and sub-messages of a message like Arcus does, for the parts of the slice message that are hashed."""
+
+    def __init__(self) -> None:
+        self._messages = {}
+        self._repeated = {}
+
+    def getMessage(self, field_name):
+        return self._messages.setdefault(field_name, FakeMessage())
+
+    def addRepeatedMessage(self, field_name):
+        message = FakeMessage()
+        self._repeated.setdefault(field_name, []).append(message)
+        return message
+
+    def repeatedMessageCount(self, field_name):
+        return len(self._repeated.get(field_name, []))
+
+    def getRepeatedMessage(self, field_name, index):
+        return self._repeated[field_name][index]
+
+
+def getSliceResultKey(start_gcode, slice_time):
+    """Build the global settings of a slice message at a certain time, and get the key of its results."""
+
+    settings = {
+        "machine_start_gcode": start_gcode,
+        "machine_end_gcode": "M104 S0",
+        "layer_height": 0.1
+    }
+    real_strftime = time.strftime
+    application = MagicMock(name = "application")
+    application.getExtruderManager().getInitialExtruderNr = MagicMock(return_value = 0)
+    with patch("cura.CuraApplication.CuraApplication.getInstance", MagicMock(return_value = application)):
+        with patch("cura.Settings.ExtruderManager.ExtruderManager.getInstance", MagicMock(return_value = MagicMock(getActiveExtruderStacks = MagicMock(return_value = [])))):
+            with patch.object(StartSliceJob, "_createSettingsSnapshot", MagicMock(return_value = SettingsSnapshot({"-1": settings}, []))):
+                with patch("time.strftime", lambda format: real_strftime(format, time.localtime(slice_time))):
+                    job = StartSliceJob(FakeMessage())
+                    job.setSliceResultCache(MagicMock(name = "slice_result_cache"), "4.6")
+                    job._buildGlobalSettingsMessage(MagicMock(name = "global_stack"))
+    return job._hashSliceMessage([])
+
+
+def test_sliceResultKeyIndependentOfTime():
+    monday_morning = time.mktime((2020, 3, 2, 9, 0, 0, 0, 0, -1))
+    tuesday_evening = time.mktime((2020, 3, 3, 21, 30, 15, 0, 0, -1))
+
+    assert getSliceResultKey("G28", monday_morning) == getSliceResultKey("G28", tuesday_evening)
+
+
+def test_sliceResultKeyWithTimeInStartGcode():
+    monday_morning = time.mktime((2020, 3, 2, 9, 0, 0, 0, 0, -1))
+    tuesday_evening = time.mktime((2020, 3, 3, 21, 30, 15, 0, 0, -1))
+
+    # The g-code that the engine puts in front is different, so the result can't be used.
+    assert getSliceResultKey(";Sliced on {day} {date}\nG28", monday_morning) != getSliceResultKey(";Sliced on {day} {date}\nG28", tuesday_evening)
+
+
+def test_sliceResultKeyChangesWithSettings():
+    monday_morning = time.mktime((2020, 3, 2, 9, 0, 0, 0, 0, -1))
+
+    assert getSliceResultKey("G28", monday_morning) != getSliceResultKey("G28 X", monday_morning)
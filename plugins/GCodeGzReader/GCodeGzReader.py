@@ -26,10 +26,12 @@ class GCodeGzReader(MeshReader):
         self._supported_extensions = [".gcode.gz"]
 
     def _read(self, file_name):
-        with open(file_name, "rb") as file:
-            file_data = file.read()
-        uncompressed_gcode = gzip.decompress(file_data).decode("utf-8")
-        PluginRegistry.getInstance().getPluginObject("GCodeReader").preReadFromStream(uncompressed_gcode)
-        result = PluginRegistry.getInstance().getPluginObject("GCodeReader").readFromStream(uncompressed_gcode, file_name)
+        # The file is decompressed and decoded while it's being parsed, so neither the compressed nor the uncompressed
+        # g-code is ever in memory as a whole. The header is read from a stream of its own, like GCodeReader does.
+        gcode_reader = PluginRegistry.getInstance().getPluginObject("GCodeReader")
+        with gzip.open(file_name, "rt", encoding = "utf-8") as file:
+            gcode_reader.preReadFromStream(file)
+        with gzip.open(file_name, "rt", encoding = "utf-8") as file:
+            result = gcode_reader.readFromStream(file, file_name)
 
         return result
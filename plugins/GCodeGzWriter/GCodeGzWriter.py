@@ -2,8 +2,8 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 import gzip
-from io import StringIO, BufferedIOBase #To write the g-code to a temporary buffer, and for typing.
-from typing import cast, List
+from io import TextIOWrapper, BufferedIOBase #To encode the g-code while it's being compressed, and for typing.
+from typing import Callable, cast, List, Optional
 
 from UM.Logger import Logger
 from UM.Mesh.MeshWriter import MeshWriter #The class we're extending/implementing.
@@ -24,18 +24,26 @@ class GCodeGzWriter(MeshWriter):
     def __init__(self) -> None:
         super().__init__(add_to_recent_files = False)
 
-    def write(self, stream: BufferedIOBase, nodes: List[SceneNode], mode = MeshWriter.OutputMode.BinaryMode) -> bool:
+    def write(self, stream: BufferedIOBase, nodes: List[SceneNode], mode = MeshWriter.OutputMode.BinaryMode, on_progress: Optional[Callable[[int, int], None]] = None) -> bool:
         """Writes the gzipped g-code to a stream.
 
         Note that even though the function accepts a collection of nodes, the
         entire scene is always written to the file since it is not possible to
         separate the g-code for just specific nodes.
 
+        The g-code is encoded and compressed block by block while the g-code
+        writer writes it, so neither the uncompressed nor the compressed g-code
+        is ever in memory as a whole.
+
         :param stream: The stream to write the gzipped g-code to.
         :param nodes: This is ignored.
         :param mode: Additional information on what type of stream to use. This
             must always be binary mode.
-        :return: Whether the write was successful.
+        :param on_progress: The function to call while the g-code is written.
+            Parameters are characters_written / characters_total.
+        :return: Whether the write was successful. If there is no g-code to
+            write, nothing is written to the stream. If the g-code writer fails
+            while writing, what was compressed up to then is in the stream.
         """
 
         if mode != MeshWriter.OutputMode.BinaryMode:
@@ -43,14 +51,17 @@ class GCodeGzWriter(MeshWriter):
             self.setInformation(catalog.i18nc("@error:not supported", "GCodeGzWriter does not support text mode."))
             return False
 
-        #Get the g-code from the g-code writer.
-        gcode_textio = StringIO() #We have to convert the g-code into bytes.
+        #Let the g-code writer write into a stream that compresses it straight into the output stream.
         gcode_writer = cast(MeshWriter, PluginRegistry.getInstance().getPluginObject("GCodeWriter"))
-        success = gcode_writer.write(gcode_textio, None)
+        if not gcode_writer.canWrite(): #Check this before the gzip header is written into the output stream.
+            self.setInformation(gcode_writer.getInformation())
+            return False
+        with gzip.GzipFile(fileobj = stream, mode = "wb") as gzip_file: #Closing this doesn't close the output stream.
+            gcode_textio = TextIOWrapper(gzip_file, encoding = "utf-8", newline = "") #We have to convert the g-code into bytes.
+            success = gcode_writer.write(gcode_textio, None, on_progress = on_progress)
+            gcode_textio.flush()
+            gcode_textio.detach()
         if not success: #Writing the g-code failed. Then I can also not write the gzipped g-code.
             self.setInformation(gcode_writer.getInformation())
             return False
-
-        result = gzip.compress(gcode_textio.getvalue().encode("utf-8"))
-        stream.write(result)
         return True
@@ -0,0 +1,117 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import gzip
+import io
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from UM.Mesh.MeshWriter import MeshWriter
+from .. import GCodeGzWriter as GCodeGzWriterModule
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))  # To get the g-code writer.
+from GCodeWriter.GCodeWriter import GCodeWriter
+
+
+class NonSeekableStream(io.RawIOBase):
+    """A stream that only keeps what is written to it, like a socket or a file that is being downloaded."""
+
+    def __init__(self):
+        super().__init__()
+        self.written = bytearray()
+        self.largest_write = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.written.extend(data)
+        self.largest_write = max(self.largest_write, len(data))
+        return len(data)
+
+
+def createGCodeWriter(gcode_list):
+    application = MagicMock()
+    application.getMultiBuildPlateModel().activeBuildPlate = 0
+    application.getController().getScene().gcode_dict = {0: gcode_list}
+    with patch("UM.Application.Application.getInstance", MagicMock(return_value = application)):
+        gcode_writer = GCodeWriter()
+    gcode_writer._application = application
+    return gcode_writer, application
+
+
+@pytest.fixture
+def gcode_list():
+    layers = [";LAYER:{number}\n".format(number = number) + "".join("G1 X{x:.3f} Y{y:.3f} E{e:.5f}\n".format(x = line * 0.137 % 200, y = line * 0.291 % 200, e = line * 0.0173) for line in range(number * 1000, (number + 1) * 1000)) for number in range(20)]
+    return [";FLAVOR:Marlin\n"] + layers + [";SETTING_3 {}\n"]
+
+
+def test_writeInBlocks(gcode_list):
+    gcode_writer, application = createGCodeWriter(gcode_list)
+    gcode_writer.block_size = 1000
+    stream = io.StringIO()
+    progress = []
+
+    with patch("UM.Application.Application.getInstance", MagicMock(return_value = application)):
+        assert gcode_writer.write(stream, None, on_progress = lambda written, total: progress.append((written, total)))
+
+    total = sum(len(gcode) for gcode in gcode_list)
+    assert stream.getvalue() == "".join(gcode_list)
+    assert progress[-1] == (total, total)
+    assert all(later[0] - earlier[0] <= gcode_writer.block_size for earlier, later in zip(progress, progress[1:]))
+
+
+@pytest.mark.parametrize("stream_type", [io.BytesIO, NonSeekableStream])
+def test_writeStreamsCompressedGCode(gcode_list, stream_type):
+    gcode_writer, application = createGCodeWriter(gcode_list)
+    gcode_writer.block_size = 1000
+    plugin_registry = MagicMock()
+    plugin_registry.getPluginObject = MagicMock(return_value = gcode_writer)
+    stream = stream_type()
+    progress = []
+
+    with patch("UM.Application.Application.getInstance", MagicMock(return_value = application)):
+        with patch("UM.PluginRegistry.PluginRegistry.getInstance", MagicMock(return_value = plugin_registry)):
+            assert GCodeGzWriterModule.GCodeGzWriter().write(stream, None, on_progress = lambda written, total: progress.append(written))
+
+    written = stream.getvalue() if stream_type is io.BytesIO else bytes(stream.written)
+    assert gzip.decompress(written).decode("utf-8") == "".join(gcode_list)
+    assert progress[-1] == sum(len(gcode) for gcode in gcode_list)
+    if stream_type is NonSeekableStream:
+        # The compressed g-code is written while it's being compressed, not as a whole at the end.
+        assert stream.largest_write < len(written)
+
+
+def test_writeFailure():
+    gcode_writer = MagicMock()
+    gcode_writer.write = MagicMock(return_value = False)
+    gcode_writer.getInformation = MagicMock(return_value = "Unable to write G-code.")
+    plugin_registry = MagicMock()
+    plugin_registry.getPluginObject = MagicMock(return_value = gcode_writer)
+    gcode_gz_writer = GCodeGzWriterModule.GCodeGzWriter()
+
+    with patch("UM.PluginRegistry.PluginRegistry.getInstance", MagicMock(return_value = plugin_registry)):
+        assert not gcode_gz_writer.write(io.BytesIO(), None)
+    assert gcode_gz_writer.getInformation() == "Unable to write G-code."
+
+
+def test_writeWithoutGCode():
+    gcode_writer, application = createGCodeWriter(None)  # The active build plate isn't sliced.
+    plugin_registry = MagicMock()
+    plugin_registry.getPluginObject = MagicMock(return_value = gcode_writer)
+    gcode_gz_writer = GCodeGzWriterModule.GCodeGzWriter()
+    stream = io.BytesIO()
+
+    with patch("UM.Application.Application.getInstance", MagicMock(return_value = application)):
+        with patch("UM.PluginRegistry.PluginRegistry.getInstance", MagicMock(return_value = plugin_registry)):
+            assert not gcode_gz_writer.write(stream, None)
+
+    assert stream.getvalue() == b""  # Not even the gzip header.
+    assert gcode_gz_writer.getInformation() == "Please prepare G-code before exporting."
+
+
+def test_writeTextMode():
+    assert not GCodeGzWriterModule.GCodeGzWriter().write(io.StringIO(), None, mode = MeshWriter.OutputMode.TextMode)
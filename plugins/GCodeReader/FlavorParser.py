@@ -1,9 +1,16 @@
 # Copyright (c) 2020 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import hashlib
+import json
 import math
+import multiprocessing
+import os
 import re
-from typing import Dict, List, NamedTuple, Optional, Union, Set
+import site
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, TimeoutError
+from time import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Pattern, Sequence, Set, TextIO, Tuple, Union
 
 import numpy
 
@@ -12,12 +19,17 @@ from UM.Job import Job
 from UM.Logger import Logger
 from UM.Math.Vector import Vector
 from UM.Message import Message
+from UM.Resources import Resources
 from UM.i18n import i18nCatalog
 
 from cura.CuraApplication import CuraApplication
+from cura.GCodeBuffer import GCodeBuffer
+from cura.LayerData import LayerData
 from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerDataCache import LayerDataCache
 from cura.LayerDataDecorator import LayerDataDecorator
 from cura.LayerPolygon import LayerPolygon
+from cura.LayerSegments import LayerSegments
 from cura.Scene.CuraSceneNode import CuraSceneNode
 from cura.Scene.GCodeListDecorator import GCodeListDecorator
 from cura.Settings.ExtruderManager import ExtruderManager
@@ -27,12 +39,211 @@ catalog = i18nCatalog("cura")
 PositionOptional = NamedTuple("Position", [("x", Optional[float]), ("y", Optional[float]), ("z", Optional[float]), ("f", Optional[float]), ("e", Optional[float])])
 Position = NamedTuple("Position", [("x", float), ("y", float), ("z", float), ("f", float), ("e", List[float])])
 
+# Everything that parsing the next line depends on, to be able to start parsing in the middle of the g-code.
+ParserState = NamedTuple("ParserState", [("position", Position), ("extruder_number", int), ("extrusion_length_offset", List[float]),
+                                         ("is_absolute_positioning", bool), ("is_absolute_extrusion", bool), ("layer_type", int),
+                                         ("previous_z", float), ("current_layer_thickness", float), ("previous_extrusion_value", float),
+                                         ("layer_number", int), ("min_layer_number", int), ("negative_layers", int), ("previous_layer", int)])
+# The arrays of a path, in the order of LayerSegments.fromArrays.
+PolygonArrays = NamedTuple("PolygonArrays", [("extruder", int), ("points", numpy.ndarray), ("line_types", numpy.ndarray),
+                                             ("line_widths", numpy.ndarray), ("line_thicknesses", numpy.ndarray), ("line_feedrates", numpy.ndarray)])
+# What parsing a range of layers results in: the state at the start and the end of the range, the number, height,
+# thickness and paths of each layer, the extruders that were seen and the number of the layer after the last one.
+RangeResult = Tuple[ParserState, ParserState, List[Tuple[int, float, float, Optional[LayerSegments]]], Set[int], int]
+
+
+class Path:
+    """The moves of the path that is being parsed, kept in preallocated columns.
+
+    Each move is a point with its X, Y, Z, feedrate, extrusion value and the line type of the line towards it. Setting
+    numpy elements one by one is slow in Python, so moves are collected in a flat list first and copied to the columns
+    in blocks. The columns grow when they are full. For flavor parsers that treat the path as a list, moves can also be
+    appended as lists, and the path can be indexed by move.
+    """
+
+    _block_size = 6 * 4096  # Values in the pending list before they are copied to the columns.
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self._columns = numpy.empty((6, capacity), dtype = numpy.float64)
+        self._count = 0  # Moves in the columns.
+        self._pending = []  # type: List[float]
+
+    def add(self, x: float, y: float, z: float, f: float, e: float, line_type: int) -> None:
+        pending = self._pending
+        pending.extend((x, y, z, f, e, line_type))
+        if len(pending) >= self._block_size:
+            self._flush()
+
+    def append(self, move: List[Union[float, int]]) -> None:
+        self.add(*move)
+
+    def clear(self) -> None:
+        self._count = 0
+        self._pending = []
+
+    def getColumns(self) -> numpy.ndarray:
+        """Get the moves as an array with a row for X, Y, Z, feedrate, extrusion value and line type."""
+
+        self._flush()
+        return self._columns[:, :self._count]
+
+    def _flush(self) -> None:
+        pending = self._pending
+        if not pending:
+            return
+        added = len(pending) // 6
+        count = self._count
+        capacity = self._columns.shape[1]
+        if count + added > capacity:
+            columns = numpy.empty((6, max(2 * capacity, count + added)), dtype = numpy.float64)
+            columns[:, :count] = self._columns[:, :count]
+            self._columns = columns
+        self._columns[:, count:count + added] = numpy.array(pending, dtype = numpy.float64).reshape((added, 6)).T
+        self._count = count + added
+        self._pending = []
+
+    def __len__(self) -> int:
+        return self._count + len(self._pending) // 6
+
+    def __getitem__(self, index: int) -> List[float]:
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("Path index out of range")
+        self._flush()
+        return self._columns[:, index].tolist()
+
+    def __iter__(self) -> Iterator[List[float]]:
+        return iter(self.getColumns().T.tolist())
+
+
+class StateScan:
+    """A light pass over g-code, to know the state of the parser at the start of each layer.
+
+    Parsing every line is what takes time, so only what doesn't settle within a layer of parsing is tracked: the
+    active extruder, the positioning and extrusion modes, the extrusion value of each extruder and the offsets of G92.
+    Only the tool changes and the G90, G91 and G92 commands are looked at as they pass. Between those, the extrusion
+    value only depends on the last move that extrudes (with absolute extrusion), which is searched for backwards. The
+    height of a layer is that of its first move with a height.
+
+    Unusual g-code (e.g. commands of a flavor) may make the scan differ from the parser, so its states can only be used
+    as a starting point.
+    """
+
+    # Lower case parameters are rare, and are left to the parser.
+    _extrusion_pattern = re.compile(r"E([-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))")
+    _height_pattern = re.compile(r"Z([-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))")
+    # A move (G0 or G1), up to its comment.
+    _move_pattern = re.compile(r"^[ \t]*G[01](?![0-9.])[^;\n]*", re.MULTILINE)
+
+    def __init__(self) -> None:
+        self._extruder_number = 0
+        self._extrusion_values = [0.0]  # type: List[float]
+        self._extrusion_length_offset = [0.0]  # type: List[float]
+        self._is_absolute_positioning = True
+        self._is_absolute_extrusion = True
+        self._layer_z = None  # type: Optional[float]
+        self._segment_start = 0  # The first line of the chunk that wasn't scanned yet.
+
+    def scanCommand(self, lines: List[str]) -> None:
+        """Scan a tool change or G90, G91 or G92 command.
+
+        :param lines: The lines of the chunk so far, ending with the command.
+        """
+
+        command = FlavorParser._command_pattern.match(lines[-1])
+        if command is None:
+            return
+        self._scanSegment("".join(lines[self._segment_start:-1]))
+        self._segment_start = len(lines)
+        number = int(command.group(2))
+        if command.group(1) == "T":
+            self._extruder_number = number
+            while len(self._extrusion_values) <= number:
+                self._extrusion_values.append(0.0)
+                self._extrusion_length_offset.append(0.0)
+        elif number == 90 or number == 91:
+            self._is_absolute_positioning = self._is_absolute_extrusion = number == 90
+        elif number == 92:
+            comment_start = lines[-1].find(";")
+            extrusion = self._extrusion_pattern.search(lines[-1], command.end(), comment_start if comment_start >= 0 else len(lines[-1]))
+            if extrusion is not None:
+                e = float(extrusion.group(1))
+                self._extrusion_length_offset[self._extruder_number] = self._extrusion_values[self._extruder_number] - e
+                self._extrusion_values[self._extruder_number] = e
+
+    def endChunk(self, lines: List[str], chunk: str) -> None:
+        """Scan the rest of a chunk.
+
+        :param lines: The lines of the chunk.
+        :param chunk: The lines joined.
+        """
+
+        self._scanSegment(chunk if self._segment_start == 0 else "".join(lines[self._segment_start:]))
+        self._segment_start = 0
+        height = self._findMoveValue(chunk, "Z", self._height_pattern, last = False)
+        self._layer_z = height if height is not None else self._layer_z
+
+    def getState(self, state: "ParserState") -> "ParserState":
+        """Get the state after the last chunk, as far as it is known.
+
+        :param state: The state to take what isn't tracked from, including the numbering of the layers.
+        """
+
+        previous_z = self._layer_z if self._layer_z is not None else state.previous_z
+        position = Position(0, 0, previous_z, 0, list(self._extrusion_values))
+        return state._replace(position = position, extruder_number = self._extruder_number,
+                              extrusion_length_offset = list(self._extrusion_length_offset),
+                              is_absolute_positioning = self._is_absolute_positioning, is_absolute_extrusion = self._is_absolute_extrusion,
+                              previous_z = previous_z, previous_extrusion_value = self._extrusion_values[self._extruder_number])
+
+    def _scanSegment(self, segment: str) -> None:
+        """Track the extrusion value over g-code without tool changes or changes of the modes."""
+
+        if self._is_absolute_extrusion:
+            e = self._findMoveValue(segment, "E", self._extrusion_pattern, last = True)
+            if e is not None:
+                self._extrusion_values[self._extruder_number] = e
+        else:
+            for match in self._move_pattern.finditer(segment):
+                extrusion = self._extrusion_pattern.search(match.group(0))
+                if extrusion is not None:
+                    self._extrusion_values[self._extruder_number] += float(extrusion.group(1))
+
+    @staticmethod
+    def _findMoveValue(text: str, letter: str, pattern: Pattern, last: bool) -> Optional[float]:
+        """Find the value of a parameter of the first or last move (G0 or G1) in the text that has it."""
+
+        position = len(text) if last else 0
+        while True:
+            found = text.rfind(letter, 0, position) if last else text.find(letter, position)
+            if found < 0:
+                return None
+            line_start = text.rfind("\n", 0, found) + 1
+            line_end = text.find("\n", found)
+            line = text[line_start:line_end if line_end >= 0 else len(text)]
+            command = FlavorParser._command_pattern.match(line)
+            if command is not None and command.group(1) == "G" and command.group(2) in ("0", "1"):
+                comment_start = line.find(";")
+                value = pattern.search(line, command.end(), comment_start if comment_start >= 0 else len(line))
+                if value is not None:
+                    return float(value.group(1))
+            if last:
+                position = line_start
+            elif line_end < 0:
+                return None
+            else:
+                position = line_end
+
 
 class FlavorParser:
     """This parser is intended to interpret the common firmware codes among all the different flavors"""
 
     def __init__(self) -> None:
-        CuraApplication.getInstance().hideMessageSignal.connect(self._onHideMessage)
+        application = CuraApplication.getInstance()
+        if application is not None:  # There is no application in the worker processes that parse layers in parallel.
+            application.hideMessageSignal.connect(self._onHideMessage)
         self._cancelled = False
         self._message = None  # type: Optional[Message]
         self._layer_number = 0
@@ -48,8 +259,9 @@ class FlavorParser:
         self._current_layer_thickness = 0.2  # default
         self._filament_diameter = 2.85       # default
         self._previous_extrusion_value = 0.0  # keep track of the filament retractions
-
-        CuraApplication.getInstance().getPreferences().addPreference("gcodereader/show_caution", True)
+        self._g_code_functions = {}  # type: Dict[int, Optional[Callable[[Position, PositionOptional, Path], Position]]]
+        # When parsing a range of layers in parallel, the arrays of the paths of each layer instead of LayerPolygons.
+        self._polygon_arrays = None  # type: Optional[Dict[int, List[PolygonArrays]]]
 
     def _clearValues(self) -> None:
         self._extruder_number = 0
@@ -57,18 +269,27 @@ class FlavorParser:
         self._layer_type = LayerPolygon.Inset0Type
         self._layer_number = 0
         self._previous_z = 0 # type: float
-        self._layer_data_builder = LayerDataBuilder()
+        self._previous_extrusion_value = 0.0
+        # The numbering of the layers, with the raft layers (which are negative in the g-code) from 0 up.
+        self._min_layer_number = 0
+        self._negative_layers = 0
+        self._previous_layer = 0
+        application = CuraApplication.getInstance()
+        compact_attributes = application is not None and bool(application.getPreferences().getValue("view/compact_layer_attributes"))
+        self._layer_data_builder = LayerDataBuilder(compact_attributes)
+        self._built_layers_changed = False  # Whether paths were added to layers that were already shown.
         self._is_absolute_positioning = True    # It can be absolute (G90) or relative (G91)
         self._is_absolute_extrusion = True  # It can become absolute (M82, default) or relative (M83)
 
+    _value_end_pattern = re.compile("[;\\s]")
+
     @staticmethod
     def _getValue(line: str, code: str) -> Optional[Union[str, int, float]]:
         n = line.find(code)
         if n < 0:
             return None
         n += len(code)
-        pattern = re.compile("[;\\s]")
-        match = pattern.search(line, n)
+        match = FlavorParser._value_end_pattern.search(line, n)
         m = match.start() if match is not None else -1
         try:
             if m < 0:
@@ -95,47 +316,42 @@ class FlavorParser:
         if message == self._message:
             self._cancelled = True
 
-    def _createPolygon(self, layer_thickness: float, path: List[List[Union[float, int]]], extruder_offsets: List[float]) -> bool:
-        countvalid = 0
-        for point in path:
-            if point[5] > 0:
-                countvalid += 1
-                if countvalid >= 2:
-                    # we know what to do now, no need to count further
-                    continue
-        if countvalid < 2:
+    def _createPolygon(self, layer_thickness: float, path: Path, extruder_offsets: List[float]) -> bool:
+        columns = path.getColumns()
+        if numpy.count_nonzero(columns[5] > 0) < 2:
             return False
         try:
             self._layer_data_builder.addLayer(self._layer_number)
-            self._layer_data_builder.setLayerHeight(self._layer_number, path[0][2])
+            self._layer_data_builder.setLayerHeight(self._layer_number, float(columns[2, 0]))
             self._layer_data_builder.setLayerThickness(self._layer_number, layer_thickness)
             this_layer = self._layer_data_builder.getLayer(self._layer_number)
             if not this_layer:
                 return False
         except ValueError:
             return False
-        count = len(path)
-        line_types = numpy.empty((count - 1, 1), numpy.int32)
-        line_widths = numpy.empty((count - 1, 1), numpy.float32)
-        line_thicknesses = numpy.empty((count - 1, 1), numpy.float32)
-        line_feedrates = numpy.empty((count - 1, 1), numpy.float32)
-        line_widths[:, 0] = 0.35  # Just a guess
-        line_thicknesses[:, 0] = layer_thickness
+        if self._layer_number in self._layer_data_builder.getElementCounts():
+            self._built_layers_changed = True
+        count = columns.shape[1]
         points = numpy.empty((count, 3), numpy.float32)
-        extrusion_values = numpy.empty((count, 1), numpy.float32)
-        i = 0
-        for point in path:
-            points[i, :] = [point[0] + extruder_offsets[0], point[2], -point[1] - extruder_offsets[1]]
-            extrusion_values[i] = point[4]
-            if i > 0:
-                line_feedrates[i - 1] = point[3]
-                line_types[i - 1] = point[5]
-                if point[5] in [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType]:
-                    line_widths[i - 1] = 0.1
-                    line_thicknesses[i - 1] = 0.0 # Travels are set as zero thickness lines
-                else:
-                    line_widths[i - 1] = self._calculateLineWidth(points[i], points[i-1], extrusion_values[i], extrusion_values[i-1], layer_thickness)
-            i += 1
+        points[:, 0] = columns[0] + extruder_offsets[0]
+        points[:, 1] = columns[2]
+        points[:, 2] = -columns[1] - extruder_offsets[1]
+        extrusion_values = columns[4].astype(numpy.float32)
+
+        # The type and feedrate of a line are those of the point that it goes to.
+        line_types = columns[5, 1:].astype(numpy.int32).reshape((count - 1, 1))
+        line_feedrates = columns[3, 1:].astype(numpy.float32).reshape((count - 1, 1))
+        line_widths = self._calculateLineWidths(points, extrusion_values, layer_thickness).reshape((count - 1, 1))
+        line_thicknesses = numpy.full((count - 1, 1), layer_thickness, dtype = numpy.float32)
+        travels = numpy.isin(line_types, [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType])
+        line_widths[travels] = 0.1
+        line_thicknesses[travels] = 0.0  # Travels are set as zero thickness lines
+
+        if self._polygon_arrays is not None:
+            LayerPolygon.validateLineTypes(line_types)
+            self._polygon_arrays.setdefault(self._layer_number, []).append(
+                PolygonArrays(self._extruder_number, points, line_types, line_widths, line_thicknesses, line_feedrates))
+            return True
 
         this_poly = LayerPolygon(self._extruder_number, line_types, points, line_widths, line_thicknesses, line_feedrates)
         this_poly.buildCache()
@@ -148,32 +364,33 @@ class FlavorParser:
         self._layer_data_builder.setLayerHeight(layer_number, 0)
         self._layer_data_builder.setLayerThickness(layer_number, 0)
 
-    def _calculateLineWidth(self, current_point: Position, previous_point: Position, current_extrusion: float, previous_extrusion: float, layer_thickness: float) -> float:
+    def _calculateLineWidths(self, points: numpy.ndarray, extrusion_values: numpy.ndarray, layer_thickness: float) -> numpy.ndarray:
+        """Calculate the width of the lines between the points from the filament that is extruded along them.
+
+        :param points: The points of the path, as X, height and -Y.
+        :param extrusion_values: The extrusion value at each point.
+        :return: The width of each line.
+        """
+
         # Area of the filament
         Af = (self._filament_diameter / 2) ** 2 * numpy.pi
-        # Length of the extruded filament
-        de = current_extrusion - previous_extrusion
-        # Volumne of the extruded filament
-        dVe = de * Af
+        # Volume of the extruded filament
+        dVe = numpy.diff(extrusion_values) * Af
         # Length of the printed line
-        dX = numpy.sqrt((current_point[0] - previous_point[0])**2 + (current_point[2] - previous_point[2])**2)
-        # When the extruder recovers from a retraction, we get zero distance
-        if dX == 0:
-            return 0.1
-        # Area of the printed line. This area is a rectangle
-        Ae = dVe / dX
-        # This area is a rectangle with area equal to layer_thickness * layer_width
-        line_width = Ae / layer_thickness
+        dX = numpy.sqrt(numpy.diff(points[:, 0]) ** 2 + numpy.diff(points[:, 2]) ** 2)
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            # Area of the printed line. This area is a rectangle with area equal to layer_thickness * layer_width
+            line_widths = dVe / dX / layer_thickness
 
         # A threshold is set to avoid weird paths in the GCode
-        if line_width > 1.2:
-            return 0.35
+        line_widths[line_widths > 1.2] = 0.35
         # Prevent showing infinitely wide lines
-        if line_width < 0.0:
-            return 0.0
-        return line_width
+        line_widths[line_widths < 0.0] = 0.0
+        # When the extruder recovers from a retraction, we get zero distance
+        line_widths[dX == 0] = 0.1
+        return line_widths
 
-    def _gCode0(self, position: Position, params: PositionOptional, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode0(self, position: Position, params: PositionOptional, path: Path) -> Position:
         x, y, z, f, e = position
 
         if self._is_absolute_positioning:
@@ -190,10 +407,10 @@ class FlavorParser:
         if params.e is not None:
             new_extrusion_value = params.e if self._is_absolute_extrusion else e[self._extruder_number] + params.e
             if new_extrusion_value > e[self._extruder_number]:
-                path.append([x, y, z, f, new_extrusion_value + self._extrusion_length_offset[self._extruder_number], self._layer_type])  # extrusion
+                path.add(x, y, z, f, new_extrusion_value + self._extrusion_length_offset[self._extruder_number], self._layer_type)  # extrusion
                 self._previous_extrusion_value = new_extrusion_value
             else:
-                path.append([x, y, z, f, new_extrusion_value + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveRetractionType])  # retraction
+                path.add(x, y, z, f, new_extrusion_value + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveRetractionType)  # retraction
             e[self._extruder_number] = new_extrusion_value
 
             # Only when extruding we can determine the latest known "layer height" which is the difference in height between extrusions
@@ -202,16 +419,16 @@ class FlavorParser:
                 self._current_layer_thickness = z - self._previous_z # allow a tiny overlap
                 self._previous_z = z
         elif self._previous_extrusion_value > e[self._extruder_number]:
-            path.append([x, y, z, f, e[self._extruder_number] + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveRetractionType])
+            path.add(x, y, z, f, e[self._extruder_number] + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveRetractionType)
         else:
-            path.append([x, y, z, f, e[self._extruder_number] + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveCombingType])
+            path.add(x, y, z, f, e[self._extruder_number] + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveCombingType)
         return self._position(x, y, z, f, e)
 
 
     # G0 and G1 should be handled exactly the same.
     _gCode1 = _gCode0
 
-    def _gCode28(self, position: Position, params: PositionOptional, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode28(self, position: Position, params: PositionOptional, path: Path) -> Position:
         """Home the head."""
 
         return self._position(
@@ -221,21 +438,21 @@ class FlavorParser:
             position.f,
             position.e)
 
-    def _gCode90(self, position: Position, params: PositionOptional, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode90(self, position: Position, params: PositionOptional, path: Path) -> Position:
         """Set the absolute positioning"""
 
         self._is_absolute_positioning = True
         self._is_absolute_extrusion = True
         return position
 
-    def _gCode91(self, position: Position, params: PositionOptional, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode91(self, position: Position, params: PositionOptional, path: Path) -> Position:
         """Set the relative positioning"""
 
         self._is_absolute_positioning = False
         self._is_absolute_extrusion = False
         return position
 
-    def _gCode92(self, position: Position, params: PositionOptional, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode92(self, position: Position, params: PositionOptional, path: Path) -> Position:
         """Reset the current position to the values specified.
 
         For example: G92 X10 will set the X to 10 without any physical motion.
@@ -255,46 +472,44 @@ class FlavorParser:
             params.f if params.f is not None else position.f,
             position.e)
 
-    def processGCode(self, G: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
-        func = getattr(self, "_gCode%s" % G, None)
-        line = line.split(";", 1)[0]  # Remove comments (if any)
+    # The command of a line: an optional line number, then a G, M or T code. Codes with a fraction (G28.1) are skipped.
+    _command_pattern = re.compile(r"[ \t]*(?:N[0-9]+[ \t]+)?([GMT])([0-9]+)(?![0-9.])")
+    # The words of a line: a letter followed by a number.
+    _word_pattern = re.compile(r"([A-Za-z])([-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))")
+    # Where each parameter goes in PositionOptional.
+    _parameter_indices = {"X": 0, "Y": 1, "Z": 2, "F": 3, "E": 4, "x": 0, "y": 1, "z": 2, "f": 3, "e": 4}
+
+    def processGCode(self, G: int, line: str, position: Position, path: Path) -> Position:
+        try:
+            func = self._g_code_functions[G]
+        except KeyError:
+            func = self._g_code_functions[G] = getattr(self, "_gCode%s" % G, None)
         if func is not None:
-            s = line.upper().split(" ")
-            x, y, z, f, e = None, None, None, None, None
-            for item in s[1:]:
-                if len(item) <= 1:
-                    continue
-                if item.startswith(";"):
-                    continue
-                try:
-                    if item[0] == "X":
-                        x = float(item[1:])
-                    elif item[0] == "Y":
-                        y = float(item[1:])
-                    elif item[0] == "Z":
-                        z = float(item[1:])
-                    elif item[0] == "F":
-                        f = float(item[1:]) / 60
-                    elif item[0] == "E":
-                        e = float(item[1:])
-                except ValueError:  # Improperly formatted g-code: Coordinates are not floats.
-                    continue  # Skip the command then.
-            params = PositionOptional(x, y, z, f, e)
-            return func(position, params, path)
+            # All parameters are found with a single scan, up to the comment (if any).
+            comment_start = line.find(";")
+            params = [None, None, None, None, None]  # type: List[Optional[float]]
+            for letter, value in self._word_pattern.findall(line, 0, comment_start if comment_start >= 0 else len(line)):
+                index = self._parameter_indices.get(letter)
+                if index is not None:
+                    params[index] = float(value)
+            if params[3] is not None:
+                params[3] /= 60
+            return func(position, PositionOptional(*params), path)
         return position
 
-    def processTCode(self, T: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
+    def processTCode(self, T: int, line: str, position: Position, path: Path) -> Position:
         self._extruder_number = T
         if self._extruder_number + 1 > len(position.e):
             self._extrusion_length_offset.extend([0] * (self._extruder_number - len(position.e) + 1))
             position.e.extend([0] * (self._extruder_number - len(position.e) + 1))
         return position
 
-    def processMCode(self, M: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
+    def processMCode(self, M: int, line: str, position: Position, path: Path) -> Position:
         pass
 
     _type_keyword = ";TYPE:"
     _layer_keyword = ";LAYER:"
+    _setting_keyword = ";SETTING_"
 
     def _extruderOffsets(self) -> Dict[int, List[float]]:
         """For showing correct x, y offsets for each extruder"""
@@ -306,12 +521,91 @@ class FlavorParser:
                 extruder.getProperty("machine_nozzle_offset_y", "value")]
         return result
 
+    @staticmethod
+    def _countLines(stream: Union[str, TextIO], content_hash: Optional["hashlib._Hash"] = None) -> int:
+        """Count the lines of g-code in a light pass, without splitting them.
+
+        A file is read in large blocks and rewound afterwards.
+
+        :param content_hash: A hash to add the g-code to, while it's being read anyway.
+        """
+
+        if isinstance(stream, str):
+            if content_hash is not None:
+                content_hash.update(stream.encode("utf-8"))
+            return stream.count("\n") + 1
+        line_count = 1
+        for block in iter(lambda: stream.read(1 << 20), ""):
+            line_count += block.count("\n")
+            if content_hash is not None:
+                content_hash.update(block.encode("utf-8"))
+        stream.seek(0)
+        return line_count
+
+    @staticmethod
+    def iterateLines(stream: Union[str, TextIO]) -> Iterator[str]:
+        """Go through the lines of g-code, including their line ending, without splitting all of it at once."""
+
+        if not isinstance(stream, str):
+            yield from stream
+            return
+        start = 0
+        while True:
+            end = stream.find("\n", start) + 1
+            if end == 0:
+                if start < len(stream):
+                    yield stream[start:]
+                return
+            yield stream[start:end]
+            start = end
+
+    _publish_interval = 0.5  # Minimum time in seconds between showing two partial results while parsing.
+
+    def _publishLayerData(self, scene_node: CuraSceneNode, material_color_map: numpy.ndarray) -> None:
+        """Show the layers that were parsed so far, while the rest of the file is still being parsed.
+
+        The first time, the node is added to the scene and the preview is opened. After that, only its layer data is
+        replaced. Once the whole file is parsed, the node is added to the scene (again) like any other loaded node.
+        """
+
+        decorator = scene_node.getDecorator(LayerDataDecorator)
+        if decorator is None:
+            decorator = LayerDataDecorator()
+            scene_node.addDecorator(decorator)
+        decorator.setLayerData(self._layer_data_builder.build(material_color_map))
+
+        application = CuraApplication.getInstance()
+        if scene_node.getParent() is None:
+            scene_node.setParent(application.getController().getScene().getRoot())
+            application.callLater(lambda: (application.getController().setActiveStage("PreviewStage"),
+                                           application.getController().setActiveView("SimulationView")))
+        application.callLater(self._updateSimulationView)
+
+    @staticmethod
+    def _updateSimulationView() -> None:
+        """Let the layer view pick up the layers that were added to the layer data that it shows."""
+
+        view = CuraApplication.getInstance().getController().getActiveView()
+        if view is not None and view.getPluginId() == "SimulationView":
+            view.calculateMaxLayers()
+
     #
     # CURA-6643
     # This function needs the filename so it can be set to the SceneNode. Otherwise, if you load a GCode file and press
     # F5, that gcode SceneNode will be removed because it doesn't have a file to be reloaded from.
     #
-    def processGCodeStream(self, stream: str, filename: str) -> Optional["CuraSceneNode"]:
+    def processGCodeStream(self, stream: Union[str, TextIO], filename: str) -> Optional["CuraSceneNode"]:
+        """Parse g-code into layer data.
+
+        The layers that are parsed are shown in the layer view every so often, so the first layers of a large file can
+        be inspected while the rest is still being parsed. Hiding the progress message cancels the parsing, and
+        removes the partial result from the scene. With the gcodereader/parsing_workers preference, the layers of large
+        files are parsed by worker processes (see _parseInParallel).
+
+        :param stream: The g-code, or a (seekable) text file to read it from line by line. A file is read twice: once
+        to count its lines, and once to parse them. It is never held in memory as a whole.
+        """
+
         Logger.log("d", "Preparing to load g-code")
         self._cancelled = False
         # We obtain the filament diameter from the selected extruder to calculate line widths
@@ -324,7 +618,6 @@ class FlavorParser:
 
         scene_node = CuraSceneNode()
 
-        gcode_list = []
         self._is_layers_in_file = False
 
         self._extruder_offsets = self._extruderOffsets()  # dict with index the extruder number. can be empty
@@ -332,15 +625,9 @@ class FlavorParser:
         ##############################################################################################
         ##  This part is where the action starts
         ##############################################################################################
-        file_lines = 0
-        current_line = 0
-        for line in stream.split("\n"):
-            file_lines += 1
-            gcode_list.append(line + "\n")
-            if not self._is_layers_in_file and line[:len(self._layer_keyword)] == self._layer_keyword:
-                self._is_layers_in_file = True
-
-        file_step = max(math.floor(file_lines / 100), 1)
+        preview_cache = self._getPreviewCache()
+        content_hash = hashlib.sha1() if preview_cache is not None else None
+        file_lines = self._countLines(stream, content_hash)
 
         self._clearValues()
 
@@ -352,112 +639,6 @@ class FlavorParser:
         self._message.setProgress(0)
         self._message.show()
 
-        Logger.log("d", "Parsing g-code...")
-
-        current_position = Position(0, 0, 0, 0, [0])
-        current_path = [] #type: List[List[float]]
-        min_layer_number = 0
-        negative_layers = 0
-        previous_layer = 0
-        self._previous_extrusion_value = 0.0
-
-        for line in stream.split("\n"):
-            if self._cancelled:
-                Logger.log("d", "Parsing g-code file cancelled.")
-                return None
-            current_line += 1
-
-            if current_line % file_step == 0:
-                self._message.setProgress(math.floor(current_line / file_lines * 100))
-                Job.yieldThread()
-            if len(line) == 0:
-                continue
-
-            if line.find(self._type_keyword) == 0:
-                type = line[len(self._type_keyword):].strip()
-                if type == "WALL-INNER":
-                    self._layer_type = LayerPolygon.InsetXType
-                elif type == "WALL-OUTER":
-                    self._layer_type = LayerPolygon.Inset0Type
-                elif type == "SKIN":
-                    self._layer_type = LayerPolygon.SkinType
-                elif type == "SKIRT":
-                    self._layer_type = LayerPolygon.SkirtType
-                elif type == "SUPPORT":
-                    self._layer_type = LayerPolygon.SupportType
-                elif type == "FILL":
-                    self._layer_type = LayerPolygon.InfillType
-                elif type == "SUPPORT-INTERFACE":
-                    self._layer_type = LayerPolygon.SupportInterfaceType
-                elif type == "PRIME-TOWER":
-                    self._layer_type = LayerPolygon.PrimeTowerType
-                else:
-                    Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type)
-
-            # When the layer change is reached, the polygon is computed so we have just one layer per extruder
-            if self._is_layers_in_file and line[:len(self._layer_keyword)] == self._layer_keyword:
-                try:
-                    layer_number = int(line[len(self._layer_keyword):])
-                    self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
-                    current_path.clear()
-                    # Start the new layer at the end position of the last layer
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-
-                    # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
-                    # as in ProcessSlicedLayersJob
-                    if layer_number < min_layer_number:
-                        min_layer_number = layer_number
-                    if layer_number < 0:
-                        layer_number += abs(min_layer_number)
-                        negative_layers += 1
-                    else:
-                        layer_number += negative_layers
-
-                    # In case there is a gap in the layer count, empty layers are created
-                    for empty_layer in range(previous_layer + 1, layer_number):
-                        self._createEmptyLayer(empty_layer)
-
-                    self._layer_number = layer_number
-                    previous_layer = layer_number
-                except:
-                    pass
-
-            # This line is a comment. Ignore it (except for the layer_keyword)
-            if line.startswith(";"):
-                continue
-
-            G = self._getInt(line, "G")
-            if G is not None:
-                # When find a movement, the new posistion is calculated and added to the current_path, but
-                # don't need to create a polygon until the end of the layer
-                current_position = self.processGCode(G, line, current_position, current_path)
-                continue
-
-            # When changing the extruder, the polygon with the stored paths is computed
-            if line.startswith("T"):
-                T = self._getInt(line, "T")
-                if T is not None:
-                    self._extruders_seen.add(T)
-                    self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
-                    current_path.clear()
-
-                    # When changing tool, store the end point of the previous path, then process the code and finally
-                    # add another point with the new position of the head.
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-                    current_position = self.processTCode(T, line, current_position, current_path)
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-
-            if line.startswith("M"):
-                M = self._getInt(line, "M")
-                if M is not None:
-                    self.processMCode(M, line, current_position, current_path)
-
-        # "Flush" leftovers. Last layer paths are still stored
-        if len(current_path) > 1:
-            if self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0])):
-                self._layer_number += 1
-                current_path.clear()
-
         material_color_map = numpy.zeros((8, 4), dtype = numpy.float32)
         material_color_map[0, :] = [0.0, 0.7, 0.9, 1.0]
         material_color_map[1, :] = [0.7, 0.9, 0.0, 1.0]
@@ -467,19 +648,63 @@ class FlavorParser:
         material_color_map[5, :] = [0.0, 0.0, 0.7, 1.0]
         material_color_map[6, :] = [0.3, 0.3, 0.3, 1.0]
         material_color_map[7, :] = [0.7, 0.7, 0.7, 1.0]
-        layer_mesh = self._layer_data_builder.build(material_color_map)
-        decorator = LayerDataDecorator()
+
+        if not global_stack.getProperty("machine_center_is_zero", "value"):
+            machine_width = global_stack.getProperty("machine_width", "value")
+            machine_depth = global_stack.getProperty("machine_depth", "value")
+            scene_node.setPosition(Vector(-machine_width / 2, 0, machine_depth / 2))
+
+        Logger.log("d", "Parsing g-code...")
+
+        cached_preview = None  # type: Optional[Tuple[LayerData, Dict[str, Any]]]
+        if preview_cache is not None and content_hash is not None:
+            preview_key = self._getPreviewKey(content_hash, filename)
+            cached_preview = preview_cache.loadWithExtra(preview_key)
+
+        worker_count = self._getParsingWorkerCount()
+        if cached_preview is not None:
+            Logger.log("d", "Showing the layers of %s from the preview cache.", filename)
+            gcode_list = self._readChunks(stream, file_lines, scene_node, material_color_map)
+        elif worker_count > 1 and file_lines >= self._parallel_min_lines:
+            gcode_list = self._parseInParallel(stream, file_lines, worker_count, scene_node, material_color_map)
+        else:
+            gcode_list = self._parseSequentially(stream, file_lines, scene_node, material_color_map)
+        if gcode_list is None:
+            Logger.log("d", "Parsing g-code file cancelled.")
+            if scene_node.getParent() is not None:
+                scene_node.setParent(None)
+            return None
+
+        if cached_preview is not None:
+            layer_mesh, parse_result = cached_preview
+            self._layer_number = parse_result["layer_number"]
+            self._extruders_seen = set(parse_result["extruders_seen"])
+            self._is_layers_in_file = parse_result["is_layers_in_file"]
+        else:
+            # Only the layers that weren't shown yet still need to be built, unless paths were added to shown layers.
+            if self._built_layers_changed:
+                self._layer_data_builder.resetBuild()
+            layer_mesh = self._layer_data_builder.build(material_color_map)
+            if preview_cache is not None:
+                preview_cache.store(preview_key, layer_mesh, {"layer_number": self._layer_number,
+                                                              "extruders_seen": sorted(self._extruders_seen),
+                                                              "is_layers_in_file": self._is_layers_in_file})
+        decorator = scene_node.getDecorator(LayerDataDecorator)
+        if decorator is None:
+            decorator = LayerDataDecorator()
+            scene_node.addDecorator(decorator)
         decorator.setLayerData(layer_mesh)
-        scene_node.addDecorator(decorator)
+        if scene_node.getParent() is not None:
+            CuraApplication.getInstance().callLater(self._updateSimulationView)
 
         gcode_list_decorator = GCodeListDecorator()
         gcode_list_decorator.setGcodeFileName(filename)
-        gcode_list_decorator.setGCodeList(gcode_list)
+        gcode_list_decorator.setGCodeList(GCodeBuffer(gcode_list))
         scene_node.addDecorator(gcode_list_decorator)
 
         # gcode_dict stores gcode_lists for a number of build plates.
         active_build_plate_id = CuraApplication.getInstance().getMultiBuildPlateModel().activeBuildPlate
-        gcode_dict = {active_build_plate_id: gcode_list}
+        gcode_dict = {active_build_plate_id: gcode_list_decorator.getGCodeList()}
         CuraApplication.getInstance().getController().getScene().gcode_dict = gcode_dict #type: ignore #Because gcode_dict is generated dynamically.
 
         Logger.log("d", "Finished parsing g-code.")
@@ -488,11 +713,6 @@ class FlavorParser:
         if self._layer_number == 0:
             Logger.log("w", "File doesn't contain any valid layers")
 
-        if not global_stack.getProperty("machine_center_is_zero", "value"):
-            machine_width = global_stack.getProperty("machine_width", "value")
-            machine_depth = global_stack.getProperty("machine_depth", "value")
-            scene_node.setPosition(Vector(-machine_width / 2, 0, machine_depth / 2))
-
         Logger.log("d", "G-code loading finished.")
 
         if CuraApplication.getInstance().getPreferences().getValue("gcodereader/show_caution"):
@@ -508,3 +728,488 @@ class FlavorParser:
         backend.backendStateChange.emit(Backend.BackendState.Disabled)
 
         return scene_node
+
+    def _readChunks(self, stream: Union[str, TextIO], file_lines: int, scene_node: CuraSceneNode,
+                    material_color_map: numpy.ndarray) -> Optional[List[str]]:
+        """Split the g-code into its chunks, without parsing it.
+
+        :return: The chunks of the g-code, or None if the reading was cancelled.
+        """
+
+        gcode_list = []  # type: List[str]
+        for _ in self._followLines(self.iterateLines(stream), file_lines, gcode_list, scene_node, material_color_map):
+            pass  # Without any parsed layers, nothing is shown while reading.
+        return gcode_list if not self._cancelled else None
+
+    # Increase this when parsing changes, so that the previews of the earlier parser aren't shown anymore.
+    _preview_version = 1
+    _preview_cache = None  # type: Optional[LayerDataCache] # Shared by all flavors, created when it's first needed.
+
+    @staticmethod
+    def _getPreviewCache() -> Optional[LayerDataCache]:
+        """Get the cache with the layer data of g-code files that were opened before, or None if it's disabled."""
+
+        application = CuraApplication.getInstance()
+        try:
+            max_size = int(application.getPreferences().getValue("gcodereader/preview_cache_size")) * 1024 * 1024
+        except (TypeError, ValueError):
+            max_size = 0
+        if max_size <= 0:
+            if FlavorParser._preview_cache is not None:  # It was disabled in this session, so free the disk space.
+                FlavorParser._preview_cache.clear()
+                FlavorParser._preview_cache = None
+            return None
+        if FlavorParser._preview_cache is None:
+            FlavorParser._preview_cache = LayerDataCache(os.path.join(Resources.getCacheStoragePath(), "gcode_previews"), max_size, persistent = True)
+        else:
+            FlavorParser._preview_cache.setMaxSize(max_size)
+        return FlavorParser._preview_cache
+
+    def _getPreviewKey(self, content_hash: "hashlib._Hash", filename: str) -> str:
+        """Get the key of the layer data of g-code in the preview cache.
+
+        Next to the content, the key contains everything else that the layer data depends on: the file, the parser and
+        its settings, and the colors of the line types.
+        """
+
+        try:
+            stat = os.stat(filename)
+            file_identity = [stat.st_size, stat.st_mtime_ns]
+        except OSError:  # Not a file, e.g. when it's read from an archive.
+            file_identity = [0, 0]
+        key = hashlib.sha1(content_hash.digest())
+        key.update(json.dumps([type(self).__name__, self._preview_version, file_identity, self._filament_diameter,
+                               sorted(self._extruder_offsets.items()), self._current_layer_thickness,
+                               self._layer_data_builder.isCompact()]).encode("utf-8"))
+        key.update(numpy.ascontiguousarray(LayerPolygon.getColorMap(), dtype = numpy.float32).tobytes())
+        return key.hexdigest()
+
+    def _parseLines(self, lines: Iterator[str], position: Position, path: Path) -> Position:
+        """Parse lines of g-code, adding their moves to the path and the finished paths to the layers.
+
+        :return: The position after the last line.
+        """
+
+        for line in lines:
+            line = line[:-1] if line.endswith("\n") else line
+
+            if len(line) == 0:
+                continue
+
+            if line[0] == ";":
+                if line.startswith(self._type_keyword):
+                    type = line[len(self._type_keyword):].strip()
+                    if type == "WALL-INNER":
+                        self._layer_type = LayerPolygon.InsetXType
+                    elif type == "WALL-OUTER":
+                        self._layer_type = LayerPolygon.Inset0Type
+                    elif type == "SKIN":
+                        self._layer_type = LayerPolygon.SkinType
+                    elif type == "SKIRT":
+                        self._layer_type = LayerPolygon.SkirtType
+                    elif type == "SUPPORT":
+                        self._layer_type = LayerPolygon.SupportType
+                    elif type == "FILL":
+                        self._layer_type = LayerPolygon.InfillType
+                    elif type == "SUPPORT-INTERFACE":
+                        self._layer_type = LayerPolygon.SupportInterfaceType
+                    elif type == "PRIME-TOWER":
+                        self._layer_type = LayerPolygon.PrimeTowerType
+                    else:
+                        Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type)
+
+                # When the layer change is reached, the polygon is computed so we have just one layer per extruder
+                elif line.startswith(self._layer_keyword):
+                    self._is_layers_in_file = True
+                    try:
+                        layer_number = int(line[len(self._layer_keyword):])
+                        self._createPolygon(self._current_layer_thickness, path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
+                        path.clear()
+                        # Start the new layer at the end position of the last layer
+                        path.add(position.x, position.y, position.z, position.f, position.e[self._extruder_number], LayerPolygon.MoveCombingType)
+
+                        # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
+                        # as in ProcessSlicedLayersJob
+                        layer_number = self._numberLayer(layer_number)
+
+                        # In case there is a gap in the layer count, empty layers are created
+                        for empty_layer in range(self._previous_layer + 1, layer_number):
+                            self._createEmptyLayer(empty_layer)
+
+                        self._layer_number = layer_number
+                        self._previous_layer = layer_number
+                    except:
+                        pass
+
+                # This line is a comment. Ignore it (except for the type and layer keywords)
+                continue
+
+            command = self._command_pattern.match(line)
+            if command is None:
+                continue
+            code = command.group(1)
+            number = int(command.group(2))
+
+            if code == "G":
+                # When find a movement, the new posistion is calculated and added to the current_path, but
+                # don't need to create a polygon until the end of the layer
+                position = self.processGCode(number, line, position, path)
+
+            # When changing the extruder, the polygon with the stored paths is computed
+            elif code == "T":
+                self._extruders_seen.add(number)
+                self._createPolygon(self._current_layer_thickness, path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
+                path.clear()
+
+                # When changing tool, store the end point of the previous path, then process the code and finally
+                # add another point with the new position of the head.
+                path.add(position.x, position.y, position.z, position.f, position.e[self._extruder_number], LayerPolygon.MoveCombingType)
+                position = self.processTCode(number, line, position, path)
+                path.add(position.x, position.y, position.z, position.f, position.e[self._extruder_number], LayerPolygon.MoveCombingType)
+
+            else:
+                self.processMCode(number, line, position, path)
+
+        return position
+
+    def _numberLayer(self, layer_number: int) -> int:
+        """Get the number that a layer is stored as, from the number in its ;LAYER: line.
+
+        The raft layers have negative numbers in the g-code. They are moved to the start, and the other layers up.
+        """
+
+        if layer_number < self._min_layer_number:
+            self._min_layer_number = layer_number
+        if layer_number < 0:
+            layer_number += abs(self._min_layer_number)
+            self._negative_layers += 1
+        else:
+            layer_number += self._negative_layers
+        return layer_number
+
+    def _flushPath(self, path: Path) -> None:
+        """Add the path that is left at the end of the g-code to the last layer."""
+
+        if len(path) > 1:
+            if self._createPolygon(self._current_layer_thickness, path, self._extruder_offsets.get(self._extruder_number, [0, 0])):
+                self._layer_number += 1
+                path.clear()
+
+    def _getState(self, position: Position) -> ParserState:
+        return ParserState(self._position(position.x, position.y, position.z, position.f, list(position.e)), self._extruder_number,
+                           list(self._extrusion_length_offset), self._is_absolute_positioning, self._is_absolute_extrusion,
+                           self._layer_type, self._previous_z, self._current_layer_thickness, self._previous_extrusion_value,
+                           self._layer_number, self._min_layer_number, self._negative_layers, self._previous_layer)
+
+    def _setState(self, state: ParserState) -> Position:
+        """Continue parsing from a state that was taken with _getState.
+
+        :return: The position to continue from.
+        """
+
+        self._extruder_number = state.extruder_number
+        self._extrusion_length_offset = list(state.extrusion_length_offset)
+        self._is_absolute_positioning = state.is_absolute_positioning
+        self._is_absolute_extrusion = state.is_absolute_extrusion
+        self._layer_type = state.layer_type
+        self._previous_z = state.previous_z
+        self._current_layer_thickness = state.current_layer_thickness
+        self._previous_extrusion_value = state.previous_extrusion_value
+        self._layer_number = state.layer_number
+        self._min_layer_number = state.min_layer_number
+        self._negative_layers = state.negative_layers
+        self._previous_layer = state.previous_layer
+        position = state.position
+        return self._position(position.x, position.y, position.z, position.f, list(position.e))
+
+    def _parseSequentially(self, stream: Union[str, TextIO], file_lines: int, scene_node: CuraSceneNode,
+                           material_color_map: numpy.ndarray) -> Optional[List[str]]:
+        """Parse all of the g-code in this thread, line by line.
+
+        :return: The chunks of the g-code, or None if the parsing was cancelled.
+        """
+
+        gcode_list = []  # type: List[str] # Chunks of g-code: the header, each layer and the settings at the end.
+        path = Path()
+        lines = self._followLines(self.iterateLines(stream), file_lines, gcode_list, scene_node, material_color_map)
+        self._parseLines(lines, Position(0, 0, 0, 0, [0]), path)
+        if self._cancelled:
+            return None
+
+        # "Flush" leftovers. Last layer paths are still stored
+        self._flushPath(path)
+        return gcode_list
+
+    def _followLines(self, lines: Iterator[str], file_lines: int, gcode_list: List[str], scene_node: CuraSceneNode,
+                     material_color_map: numpy.ndarray) -> Iterator[str]:
+        """Pass on the lines to parse, while keeping track of the progress, the chunks and the layers to show.
+
+        Stops when the parsing is cancelled.
+        """
+
+        assert(self._message is not None)  # use for typing purposes
+        current_line = 0
+        file_step = max(math.floor(file_lines / 100), 1)
+        current_chunk = []  # type: List[str]
+        layer_started = False
+        last_publish_time = time()
+
+        for line in lines:
+            if self._cancelled:
+                return
+            current_line += 1
+
+            if current_line % file_step == 0:
+                self._message.setProgress(math.floor(current_line / file_lines * 100))
+                Job.yieldThread()
+
+            # All layers before the one that started on the previous line are complete, so show them if it's been a while.
+            if layer_started:
+                layer_started = False
+                if time() - last_publish_time > self._publish_interval and len(self._layer_data_builder.getLayers()) > len(self._layer_data_builder.getElementCounts()):
+                    self._publishLayerData(scene_node, material_color_map)
+                    last_publish_time = time()
+
+            # The g-code is kept in chunks instead of line by line. Every layer starts a new chunk, and so do the
+            # settings at the end (so that GCodeWriter can leave them out).
+            if line.startswith(self._layer_keyword) or (line.startswith(self._setting_keyword) and not (current_chunk and current_chunk[0].startswith(self._setting_keyword))):
+                if current_chunk:
+                    gcode_list.append("".join(current_chunk))
+                current_chunk = []
+                layer_started = line.startswith(self._layer_keyword)
+            current_chunk.append(line)
+            yield line
+
+        if current_chunk:
+            gcode_list.append("".join(current_chunk))
+
+    _parallel_min_lines = 500000  # Smaller files are parsed before the worker processes would have started.
+    _ranges_per_worker = 4  # More ranges than workers, so the first layers can be shown before all is parsed.
+    _warm_up_layers = 1  # The layers that a worker parses before its range, to settle the state that the range starts in.
+    _parsing_pool = None  # type: Optional[Executor] # Shared by all flavors, started when it's first needed.
+    _parsing_pool_size = 0
+
+    def _getParsingWorkerCount(self) -> int:
+        application = CuraApplication.getInstance()
+        try:
+            return int(application.getPreferences().getValue("gcodereader/parsing_workers"))
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _getParsingPool(worker_count: int) -> Executor:
+        if FlavorParser._parsing_pool is None or FlavorParser._parsing_pool_size != worker_count:
+            if FlavorParser._parsing_pool is not None:
+                FlavorParser._parsing_pool.shutdown(wait = False)
+            # Workers are always spawned, like those of the LayerProcessingPool. They find this plug-in the way that
+            # the plug-in registry does: as a top-level package in the directory of the plug-ins.
+            plugins_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            FlavorParser._parsing_pool = ProcessPoolExecutor(max_workers = worker_count, mp_context = multiprocessing.get_context("spawn"),
+                                                             initializer = site.addsitedir, initargs = (plugins_path, ))
+            FlavorParser._parsing_pool_size = worker_count
+        return FlavorParser._parsing_pool
+
+    def _parseInParallel(self, stream: Union[str, TextIO], file_lines: int, worker_count: int, scene_node: CuraSceneNode,
+                         material_color_map: numpy.ndarray) -> Optional[List[str]]:
+        """Parse ranges of layers in worker processes.
+
+        A first pass splits the g-code into its chunks, and scans the commands for the state that each layer starts in
+        (see StateScan). Then each range of layers is parsed by a worker. The worker starts from the scanned state at the
+        layer before its range, and parses that layer first to settle the rest of the state. Parsing is
+        deterministic, so the result of a range is exact if the state that it started in is the state that the range
+        before it ended in. This is checked for every range, in order. A range that started in another state (e.g.
+        because of commands that the scan doesn't know) is parsed again in this thread, from the right state.
+
+        :return: The chunks of the g-code, or None if the parsing was cancelled.
+        """
+
+        assert(self._message is not None)  # use for typing purposes
+        initial_state = self._getState(Position(0, 0, 0, 0, [0]))
+        gcode_list = []  # type: List[str]
+        chunk_states = [initial_state]  # type: List[ParserState] # What is known of the state at the start of each chunk.
+        chunk_lines = []  # type: List[int]
+        layer_chunks = []  # type: List[int] # The chunks that start with a layer.
+        current_chunk = []  # type: List[str]
+        current_line = 0
+        file_step = max(math.floor(file_lines / 100), 1)
+        scan = StateScan()
+
+        for line in self.iterateLines(stream):
+            if self._cancelled:
+                return None
+            current_line += 1
+            if current_line % file_step == 0:
+                # Splitting the g-code takes a small part of the time that parsing it does.
+                self._message.setProgress(math.floor(current_line / file_lines * 10))
+                Job.yieldThread()
+
+            if line.startswith(self._layer_keyword) or (line.startswith(self._setting_keyword) and not (current_chunk and current_chunk[0].startswith(self._setting_keyword))):
+                if current_chunk:
+                    gcode_list.append("".join(current_chunk))
+                    chunk_lines.append(len(current_chunk))
+                    scan.endChunk(current_chunk, gcode_list[-1])
+                    chunk_states.append(scan.getState(chunk_states[-1]._replace(
+                        layer_number = self._layer_number, min_layer_number = self._min_layer_number,
+                        negative_layers = self._negative_layers, previous_layer = self._previous_layer)))
+                current_chunk = []
+                if line.startswith(self._layer_keyword):
+                    self._is_layers_in_file = True
+                    end = line.find("\n")
+                    try:
+                        layer_number = self._numberLayer(int(line[len(self._layer_keyword):end if end >= 0 else len(line)]))
+                    except ValueError:
+                        pass
+                    else:
+                        layer_chunks.append(len(gcode_list))
+                        self._layer_number = self._previous_layer = layer_number
+            current_chunk.append(line)
+            if line.startswith(("T", "G9")):
+                scan.scanCommand(current_chunk)
+        if current_chunk:
+            gcode_list.append("".join(current_chunk))
+            chunk_lines.append(len(current_chunk))
+        self._setState(initial_state)
+
+        # The ranges start at layers, and have about the same number of lines.
+        range_starts = [0]
+        range_lines = 0
+        lines_per_range = file_lines / (worker_count * self._ranges_per_worker)
+        layer_chunk_set = set(layer_chunks)
+        for chunk_index, line_count in enumerate(chunk_lines):
+            if chunk_index in layer_chunk_set and range_lines >= lines_per_range:
+                range_starts.append(chunk_index)
+                range_lines = 0
+            range_lines += line_count
+        range_ends = range_starts[1:] + [len(gcode_list)]
+
+        pool = self._getParsingPool(worker_count)
+        futures = []  # type: List[Future]
+        for start, end in zip(range_starts, range_ends):
+            earlier_layers = [chunk_index for chunk_index in layer_chunks if chunk_index < start]
+            warm_up_start = earlier_layers[-self._warm_up_layers] if len(earlier_layers) >= self._warm_up_layers else 0
+            futures.append(pool.submit(_parseLayerRange, type(self), self._filament_diameter, self._extruder_offsets,
+                                       chunk_states[warm_up_start], gcode_list[warm_up_start:start], gcode_list[start:end],
+                                       end == len(gcode_list)))
+
+        reparsed_ranges = 0
+        last_publish_time = time()
+        exact_state = initial_state
+        pool_works = True
+        try:
+            for range_index, (start, end, future) in enumerate(zip(range_starts, range_ends, futures)):
+                result = self._waitForRange(future) if pool_works else None
+                if self._cancelled:
+                    return None
+                pool_works = result is not None
+                if result is None or result[0] != exact_state:
+                    reparsed_ranges += 1
+                    layer_data_builder = self._layer_data_builder
+                    try:
+                        result = self._parseRange(self._filament_diameter, self._extruder_offsets, exact_state,
+                                                  [], gcode_list[start:end], end == len(gcode_list))
+                    finally:
+                        self._layer_data_builder = layer_data_builder
+                        self._polygon_arrays = None
+                    if result is None:
+                        return None
+                start_state, end_state, layers, extruders_seen, layer_number = result
+                exact_state = end_state
+                self._mergeLayers(layers)
+                self._extruders_seen |= extruders_seen
+                self._setState(end_state)
+                self._layer_number = layer_number
+
+                self._message.setProgress(10 + math.floor((range_index + 1) / len(futures) * 90))
+                if time() - last_publish_time > self._publish_interval and end < len(gcode_list):
+                    self._publishLayerData(scene_node, material_color_map)
+                    last_publish_time = time()
+        finally:
+            for future in futures:
+                future.cancel()
+
+        Logger.log("d", "Parsed %s ranges of layers in parallel, of which %s again in order.", len(futures), reparsed_ranges)
+        return gcode_list
+
+    def _waitForRange(self, future: Future) -> Optional[RangeResult]:
+        """Wait for a worker to parse a range of layers, or for the parsing to be cancelled.
+
+        :return: The result of the range, or None if the parsing was cancelled or the pool failed. When the pool
+        failed, the ranges are parsed in this thread instead.
+        """
+
+        while not self._cancelled:
+            try:
+                return future.result(timeout = 0.05)
+            except TimeoutError:
+                Job.yieldThread()
+            except Exception:
+                Logger.logException("w", "The g-code parsing pool failed, parsing the layers in this thread instead.")
+                FlavorParser._parsing_pool = None  # Start a new pool the next time.
+                return None
+        return None
+
+    def _parseRange(self, filament_diameter: float, extruder_offsets: Dict[int, List[float]], state: ParserState,
+                    warm_up_chunks: Sequence[str], chunks: Sequence[str], is_last: bool) -> Optional[RangeResult]:
+        """Parse a range of layers on its own, into a layer data builder of its own. See _parseInParallel.
+
+        :param state: The state to start the warm-up (or the range itself, without warm-up) in.
+        :param warm_up_chunks: The chunks before the range, to get into the state that the range starts in.
+        :param chunks: The chunks of the range.
+        :param is_last: Whether the range goes up to the end of the g-code.
+        :return: The result of the range, or None if the parsing was cancelled.
+        """
+
+        self._filament_diameter = filament_diameter
+        self._extruder_offsets = extruder_offsets
+        self._polygon_arrays = {}
+        self._layer_data_builder = LayerDataBuilder()
+        position = self._setState(state)
+        path = Path()
+        if warm_up_chunks:
+            position = self._parseLines(self.iterateLines("".join(warm_up_chunks)), position, path)
+            # What was parsed before the range belongs to the range before it. That includes the path, which the
+            # layer that starts the range would finish.
+            self._polygon_arrays = {}
+            self._layer_data_builder = LayerDataBuilder()
+            path.clear()
+        start_state = self._getState(position)
+
+        for chunk in chunks:
+            if self._cancelled:
+                return None
+            position = self._parseLines(self.iterateLines(chunk), position, path)
+        end_state = self._getState(position)
+        if is_last:
+            self._flushPath(path)
+        else:
+            # The layer that starts the next range finishes the path.
+            self._createPolygon(self._current_layer_thickness, path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
+
+        layers = []  # type: List[Tuple[int, float, float, Optional[LayerSegments]]]
+        for layer_number, layer in self._layer_data_builder.getLayers().items():
+            polygons = self._polygon_arrays.get(layer_number)
+            segments = LayerSegments.fromArrays(*zip(*polygons)) if polygons else None
+            layers.append((layer_number, layer.height, layer.thickness, segments))
+        return start_state, end_state, layers, self._extruders_seen, self._layer_number
+
+    def _mergeLayers(self, layers: List[Tuple[int, float, float, Optional[LayerSegments]]]) -> None:
+        """Add the layers of a range that was parsed on its own, in the order of the g-code."""
+
+        for layer_number, height, thickness, segments in layers:
+            if layer_number in self._layer_data_builder.getElementCounts():
+                self._built_layers_changed = True
+            self._layer_data_builder.setLayerHeight(layer_number, height)
+            self._layer_data_builder.setLayerThickness(layer_number, thickness)
+            if segments is None:
+                continue
+            layer = self._layer_data_builder.getLayer(layer_number)
+            if layer.polygonCount() > 0:
+                segments = LayerSegments.concatenate([layer.getSegments(), segments])
+            layer.setSegments(segments)
+
+
+def _parseLayerRange(parser_class: type, filament_diameter: float, extruder_offsets: Dict[int, List[float]], state: ParserState,
+                     warm_up_chunks: Sequence[str], chunks: Sequence[str], is_last: bool) -> Optional[RangeResult]:
+    """Parse a range of layers with a new parser, in a worker process. See FlavorParser._parseRange."""
+
+    return parser_class()._parseRange(filament_diameter, extruder_offsets, state, warm_up_chunks, chunks, is_last)
@@ -2,7 +2,7 @@
 # Copyright (c) 2020 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
-from typing import Optional, Union, List, TYPE_CHECKING
+from typing import Optional, TextIO, Union, List, TYPE_CHECKING
 
 from UM.FileHandler.FileReader import FileReader
 from UM.Mesh.MeshReader import MeshReader
@@ -41,9 +41,18 @@ class GCodeReader(MeshReader):
         self._flavor_reader = None  # type: Optional[FlavorParser]
 
         Application.getInstance().getPreferences().addPreference("gcodereader/show_caution", True)
+        # The number of worker processes that large files are parsed with. With 0 or 1, files are parsed in one go.
+        Application.getInstance().getPreferences().addPreference("gcodereader/parsing_workers", 0)
+        # The layer data of files that were opened before is kept on disk up to this size, in MB. 0 disables it.
+        Application.getInstance().getPreferences().addPreference("gcodereader/preview_cache_size", 1024)
 
-    def preReadFromStream(self, stream, *args, **kwargs):
-        for line in stream.split("\n"):
+    def preReadFromStream(self, stream: Union[str, TextIO], *args, **kwargs):
+        """Find the flavor of the g-code in its ;FLAVOR: comment.
+
+        :param stream: The g-code, or a text file with it. It is read line by line, up to the flavor.
+        """
+
+        for line in FlavorParser.iterateLines(stream):
             if line[:len(self._flavor_keyword)] == self._flavor_keyword:
                 try:
                     self._flavor_reader = self._flavor_readers_dict[line[len(self._flavor_keyword):].rstrip()]
@@ -59,19 +68,18 @@ class GCodeReader(MeshReader):
     # PreRead is used to get the correct flavor. If not, Marlin is set by default
     def preRead(self, file_name, *args, **kwargs):
         with open(file_name, "r", encoding = "utf-8") as file:
-            file_data = file.read()
-        return self.preReadFromStream(file_data, args, kwargs)
+            return self.preReadFromStream(file, args, kwargs)
 
-    def readFromStream(self, stream: str, filename: str) -> Optional["CuraSceneNode"]:
+    def readFromStream(self, stream: Union[str, TextIO], filename: str) -> Optional["CuraSceneNode"]:
         if self._flavor_reader is None:
             return None
         return self._flavor_reader.processGCodeStream(stream, filename)
 
     def _read(self, file_name: str) -> Union["SceneNode", List["SceneNode"]]:
+        # The file is parsed line by line, so it isn't held in memory as a whole.
         with open(file_name, "r", encoding = "utf-8") as file:
-            file_data = file.read()
+            node = self.readFromStream(file, file_name)
         result = []  # type: List[SceneNode]
-        node = self.readFromStream(file_data, file_name)
         if node is not None:
             result.append(node)
         return result
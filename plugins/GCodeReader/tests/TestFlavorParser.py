@@ -0,0 +1,312 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import numpy
+import pytest
+
+from cura.LayerDataCache import LayerDataCache
+from cura.LayerPolygon import LayerPolygon
+from .. import FlavorParser as FlavorParserModule
+from ..FlavorParser import FlavorParser, Path
+
+
+class RecordingLayerPolygon(LayerPolygon):
+    """Keeps the arrays that a polygon is created with, without building its cache (which needs the theme)."""
+
+    def __init__(self, extruder, line_types, data, line_widths, line_thicknesses, line_feedrates):
+        self.arrays = (line_types.copy(), data.copy(), line_widths.copy(), line_thicknesses.copy(), line_feedrates.copy())
+        super().__init__(extruder, line_types, data, line_widths, line_thicknesses, line_feedrates)
+
+    def buildCache(self):
+        pass
+
+
+@pytest.fixture
+def parser():
+    application = MagicMock()
+    application.getPreferences.return_value.getValue.return_value = False
+    application.getGlobalContainerStack.return_value.extruderList.__getitem__.return_value.getProperty.return_value = 2.85
+    extruder_manager = MagicMock()
+    extruder_manager.getActiveExtruderStacks.return_value = []
+    with patch("cura.CuraApplication.CuraApplication.getInstance", MagicMock(return_value = application)), \
+            patch("cura.Settings.ExtruderManager.ExtruderManager.getInstance", MagicMock(return_value = extruder_manager)), \
+            patch.object(LayerPolygon, "getColorMap", return_value = numpy.ones((12, 4), dtype = numpy.float32)), \
+            patch.object(FlavorParserModule, "LayerPolygon", RecordingLayerPolygon), \
+            patch.object(FlavorParserModule, "Message", MagicMock()), \
+            patch.object(FlavorParserModule, "CuraSceneNode", MagicMock()):
+        yield FlavorParser()
+
+
+def generateGCode(layer_count):
+    lines = [";FLAVOR:Marlin", "G28"]
+    for layer_number in range(layer_count):
+        lines.append(";LAYER:{layer}".format(layer = layer_number))
+        lines.append("G0 X0 Y0 Z{z:.1f}".format(z = 0.2 * (layer_number + 1)))
+        lines.extend("G1 X{x} Y{y} E{e}".format(x = 10 * (i % 2), y = i, e = layer_number + i / 10) for i in range(1, 5))
+    return "\n".join(lines) + "\n"
+
+
+def generateMultiExtruderGCode(layer_count, relative = False):
+    """G-code with a prime before a G92, tool changes and line types, to parse in parallel."""
+
+    lines = [";FLAVOR:Marlin", "G28", "G91" if relative else "G90", "G1 X5 E15", "G92 E0"]
+    for layer_number in range(layer_count):
+        lines.append(";LAYER:{layer}".format(layer = layer_number))
+        lines.append("T{extruder}".format(extruder = (layer_number // 3) % 2))
+        lines.append(";TYPE:{type}".format(type = "WALL-OUTER" if layer_number % 2 else "FILL"))
+        lines.append("G0 F3000 X1 Y1 Z{z:.1f}".format(z = 0.2 if relative else 0.2 * (layer_number + 1)))
+        lines.extend("G1 X{x} Y{y} E{e}".format(x = 10 * (i % 2), y = i, e = i / 10 if relative else layer_number + i / 10) for i in range(1, 6))
+    lines.append(";SETTING_3 {}")
+    return "\n".join(lines) + "\n"
+
+
+def getLayerArrays(parser):
+    layers = {}
+    for layer_number, layer in parser._layer_data_builder.getLayers().items():
+        segments = layer.getSegments()
+        layers[layer_number] = [layer.height, layer.thickness] + [getattr(segments, name) for name in ("extruders", "points", "line_types", "line_widths", "line_thicknesses", "line_feedrates")]
+    return layers
+
+
+def referenceLineWidth(filament_diameter, current_point, previous_point, current_extrusion, previous_extrusion, layer_thickness):
+    """The line width as it was calculated per line before _createPolygon was vectorized."""
+
+    Af = (filament_diameter / 2) ** 2 * numpy.pi
+    de = current_extrusion - previous_extrusion
+    dVe = de * Af
+    dX = numpy.sqrt((current_point[0] - previous_point[0])**2 + (current_point[2] - previous_point[2])**2)
+    if dX == 0:
+        return 0.1
+    Ae = dVe / dX
+    line_width = Ae / layer_thickness
+    if line_width > 1.2:
+        return 0.35
+    if line_width < 0.0:
+        return 0.0
+    return line_width
+
+
+def referencePolygon(filament_diameter, layer_thickness, path, extruder_offsets):
+    """The arrays of a polygon as they were created point by point before _createPolygon was vectorized."""
+
+    count = len(path)
+    line_types = numpy.empty((count - 1, 1), numpy.int32)
+    line_widths = numpy.empty((count - 1, 1), numpy.float32)
+    line_thicknesses = numpy.empty((count - 1, 1), numpy.float32)
+    line_feedrates = numpy.empty((count - 1, 1), numpy.float32)
+    line_widths[:, 0] = 0.35
+    line_thicknesses[:, 0] = layer_thickness
+    points = numpy.empty((count, 3), numpy.float32)
+    extrusion_values = numpy.empty((count, 1), numpy.float32)
+    for i, point in enumerate(path):
+        points[i, :] = [point[0] + extruder_offsets[0], point[2], -point[1] - extruder_offsets[1]]
+        extrusion_values[i] = point[4]
+        if i > 0:
+            line_feedrates[i - 1] = point[3]
+            line_types[i - 1] = point[5]
+            if point[5] in [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType]:
+                line_widths[i - 1] = 0.1
+                line_thicknesses[i - 1] = 0.0
+            else:
+                line_widths[i - 1] = referenceLineWidth(filament_diameter, points[i], points[i - 1], extrusion_values[i], extrusion_values[i - 1], layer_thickness)
+    return line_types, points, line_widths, line_thicknesses, line_feedrates
+
+
+def createPolygon(parser, moves, layer_thickness = 0.2, extruder_offsets = (0, 0)):
+    path = Path(capacity = 4)
+    for move in moves:
+        path.append(move)
+    assert parser._createPolygon(layer_thickness, path, list(extruder_offsets))
+    return parser._layer_data_builder.getLayer(parser._layer_number).polygons[-1].arrays
+
+
+def test_createPolygonMatchesReference(parser):
+    rng = numpy.random.default_rng(42)
+    count = 500
+    x, y = rng.uniform(0, 200, (2, count))
+    x[100:110] = x[99]  # Zero-length moves.
+    y[100:110] = y[99]
+    z = numpy.full(count, 0.6)
+    f = rng.choice([25.0, 45.0, 120.0], count)
+    e = numpy.cumsum(rng.uniform(-0.5, 2.0, count))  # Includes negative and very large widths.
+    line_types = rng.choice([LayerPolygon.Inset0Type, LayerPolygon.InsetXType, LayerPolygon.SkinType, LayerPolygon.InfillType,
+                             LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType], count)
+    moves = numpy.column_stack((x, y, z, f, e, line_types)).tolist()
+    for move in moves:
+        move[5] = int(move[5])
+
+    for layer_thickness, extruder_offsets in [(0.2, (0, 0)), (0.1, (18, -2.5))]:
+        parser._layer_number += 1
+        result = createPolygon(parser, moves, layer_thickness, extruder_offsets)
+        expected = referencePolygon(parser._filament_diameter, layer_thickness, moves, extruder_offsets)
+
+        for actual_array, expected_array in zip(result, expected):
+            assert actual_array.shape == expected_array.shape
+            assert actual_array.dtype == expected_array.dtype
+            assert numpy.allclose(actual_array, expected_array, rtol = 1e-6, atol = 1e-7)
+
+
+def test_createPolygonClampsLineWidths(parser):
+    extrusion = LayerPolygon.Inset0Type
+    moves = [
+        [0, 0, 0.2, 30, 0, extrusion],
+        [10, 0, 0.2, 30, 0.3, extrusion],  # A regular line.
+        [10, 0, 0.2, 30, 0.4, extrusion],  # Zero length.
+        [11, 0, 0.2, 30, 10.0, extrusion],  # Too wide.
+        [20, 0, 0.2, 30, 5.0, extrusion],  # Negative.
+        [30, 0, 0.2, 30, 5.0, LayerPolygon.MoveCombingType],  # Travel.
+    ]
+
+    line_types, points, line_widths, line_thicknesses, line_feedrates = createPolygon(parser, moves)
+
+    regular_width = 0.3 * (parser._filament_diameter / 2) ** 2 * numpy.pi / 10 / 0.2
+    assert numpy.allclose(line_widths.ravel(), [regular_width, 0.1, 0.35, 0.0, 0.1])
+    assert numpy.allclose(line_thicknesses.ravel(), [0.2, 0.2, 0.2, 0.2, 0.0])
+    assert line_types.ravel().tolist() == [extrusion] * 4 + [LayerPolygon.MoveCombingType]
+
+
+def test_createPolygonNeedsTwoPointsWithType(parser):
+    path = Path()
+    path.append([0, 0, 0.2, 30, 0, LayerPolygon.NoneType])
+    path.append([10, 0, 0.2, 30, 1, LayerPolygon.Inset0Type])
+
+    assert not parser._createPolygon(0.2, path, [0, 0])
+
+
+def test_pathGrows():
+    path = Path(capacity = 2)
+    for i in range(10000):
+        path.add(i, 2 * i, 0.2, 30, i / 10, LayerPolygon.InfillType)
+
+    assert len(path) == 10000
+    assert path[-1] == [9999, 19998, 0.2, 30, 999.9, LayerPolygon.InfillType]
+    assert path.getColumns().shape == (6, 10000)
+    assert numpy.array_equal(path.getColumns()[1], numpy.arange(10000) * 2)
+
+
+def test_processGCodeStreamPublishesLayers(parser):
+    published = []  # The number of layers each time that the layers are shown.
+    parser._publishLayerData = MagicMock(side_effect = lambda scene_node, material_color_map: published.append(len(parser._layer_data_builder.getLayers())))
+    parser._publish_interval = -1  # Show the layers at every layer change.
+
+    scene_node = parser.processGCodeStream(generateGCode(5), "test.gcode")
+
+    assert scene_node is not None
+    assert published == [1, 2, 3, 4]  # The last layer is only shown once the whole file is parsed.
+    assert sorted(parser._layer_data_builder.getLayers()) == [0, 1, 2, 3, 4]
+
+
+def test_processGCodeStreamCancelled(parser):
+    parser._publishLayerData = MagicMock(side_effect = lambda scene_node, material_color_map: parser._onHideMessage(parser._message))
+    parser._publish_interval = -1
+
+    assert parser.processGCodeStream(generateGCode(5), "test.gcode") is None
+    # The partial result is removed from the scene again.
+    FlavorParserModule.CuraSceneNode.return_value.setParent.assert_called_with(None)
+
+
+@pytest.mark.parametrize("relative", [False, True])
+def test_processGCodeStreamInParallel(parser, relative):
+    gcode = generateMultiExtruderGCode(20, relative)
+    parser.processGCodeStream(gcode, "test.gcode")
+    expected = getLayerArrays(parser)
+
+    parsing_threads = set()
+    original_parse_range = FlavorParser._parseRange
+    def parseRange(self, *args):
+        parsing_threads.add(threading.current_thread())
+        return original_parse_range(self, *args)
+
+    parallel_parser = FlavorParser()
+    parallel_parser._getParsingWorkerCount = MagicMock(return_value = 2)
+    with ThreadPoolExecutor(2) as pool, \
+            patch.object(FlavorParser, "_getParsingPool", MagicMock(return_value = pool)), \
+            patch.object(FlavorParser, "_parallel_min_lines", 0), \
+            patch.object(FlavorParser, "_parseRange", parseRange):
+        assert parallel_parser.processGCodeStream(gcode, "test.gcode") is not None
+
+    assert parallel_parser._layer_number == parser._layer_number
+    assert parallel_parser._extruders_seen == parser._extruders_seen == {0, 1}
+    actual = getLayerArrays(parallel_parser)
+    assert list(actual) == list(expected)
+    for layer_number in expected:
+        for actual_value, expected_value in zip(actual[layer_number], expected[layer_number]):
+            assert numpy.array_equal(actual_value, expected_value), layer_number
+    # With relative positioning, the state at the start of a range isn't known without parsing everything before it.
+    # Those ranges are parsed again in order.
+    assert (threading.current_thread() in parsing_threads) == relative
+
+
+def test_processGCodeStreamInParallelWithoutPool(parser):
+    gcode = generateMultiExtruderGCode(10)
+    parser.processGCodeStream(gcode, "test.gcode")
+    expected = getLayerArrays(parser)
+
+    failed = Future()
+    failed.set_exception(RuntimeError("The worker died"))
+    pool = MagicMock()
+    pool.submit.return_value = failed
+    parallel_parser = FlavorParser()
+    parallel_parser._getParsingWorkerCount = MagicMock(return_value = 2)
+    with patch.object(FlavorParser, "_getParsingPool", MagicMock(return_value = pool)), \
+            patch.object(FlavorParser, "_parallel_min_lines", 0):
+        assert parallel_parser.processGCodeStream(gcode, "test.gcode") is not None
+
+    actual = getLayerArrays(parallel_parser)
+    assert list(actual) == list(expected)
+    for layer_number in expected:
+        for actual_value, expected_value in zip(actual[layer_number], expected[layer_number]):
+            assert numpy.array_equal(actual_value, expected_value), layer_number
+
+
+def test_processGCodeStreamInParallelCancelled(parser):
+    failed = Future()
+    failed.set_exception(RuntimeError("The worker died"))
+    pool = MagicMock()
+    pool.submit.return_value = failed
+    parser._getParsingWorkerCount = MagicMock(return_value = 2)
+    # Cancel while the first range is parsed again in this thread.
+    original_parse_lines = parser._parseLines
+    def parseLines(*args):
+        parser._onHideMessage(parser._message)
+        return original_parse_lines(*args)
+    parser._parseLines = parseLines
+    with patch.object(FlavorParser, "_getParsingPool", MagicMock(return_value = pool)), \
+            patch.object(FlavorParser, "_parallel_min_lines", 0):
+        assert parser.processGCodeStream(generateGCode(10), "test.gcode") is None
+
+
+def test_processGCodeStreamFromPreviewCache(parser, tmp_path):
+    gcode_file = tmp_path / "test.gcode"
+    gcode_file.write_text(generateGCode(5))
+    cache = LayerDataCache(str(tmp_path / "cache"), 10 * 1024 * 1024, persistent = True)
+    set_layer_data = FlavorParserModule.CuraSceneNode.return_value.getDecorator.return_value.setLayerData
+
+    with patch.object(FlavorParser, "_getPreviewCache", MagicMock(return_value = cache)):
+        with open(str(gcode_file)) as stream:
+            parser.processGCodeStream(stream, str(gcode_file))
+        parsed_layer_data = set_layer_data.call_args[0][0]
+        assert cache.getSize() > 0
+
+        cached_parser = FlavorParser()
+        cached_parser._parseSequentially = MagicMock(wraps = cached_parser._parseSequentially)
+        with open(str(gcode_file)) as stream:
+            assert cached_parser.processGCodeStream(stream, str(gcode_file)) is not None
+        cached_parser._parseSequentially.assert_not_called()
+        cached_layer_data = set_layer_data.call_args[0][0]
+        assert cached_layer_data is not parsed_layer_data
+        assert numpy.array_equal(cached_layer_data.getVertices(), parsed_layer_data.getVertices())
+        assert sorted(cached_layer_data.getLayers()) == sorted(parsed_layer_data.getLayers())
+        assert cached_parser._layer_number == parser._layer_number
+
+        # A file that changed (or was touched) is parsed again.
+        stat = os.stat(str(gcode_file))
+        os.utime(str(gcode_file), ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        with open(str(gcode_file)) as stream:
+            cached_parser.processGCodeStream(stream, str(gcode_file))
+        cached_parser._parseSequentially.assert_called_once()
@@ -0,0 +1,36 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import io
+
+from ..GCodeReader import GCodeReader
+
+
+def createReader():
+    # Not initialised, since that would need the application. Finding the flavor doesn't need it.
+    return GCodeReader.__new__(GCodeReader)
+
+
+def test_flavorInHeader():
+    reader = createReader()
+
+    reader.preReadFromStream(io.StringIO(";FLAVOR:RepRap\n;TIME:100\nG28\n"))
+
+    assert reader._flavor_reader is GCodeReader._flavor_readers_dict["RepRap"]
+
+
+def test_flavorAfterCommand():
+    # Like g-code that was post-processed, with a command in front of the header.
+    reader = createReader()
+
+    reader.preReadFromStream("M117 Printing\n;FLAVOR:RepRap\nG28\n")
+
+    assert reader._flavor_reader is GCodeReader._flavor_readers_dict["RepRap"]
+
+
+def test_noFlavor():
+    reader = createReader()
+
+    reader.preReadFromStream("G28\nG1 X10\n")
+
+    assert reader._flavor_reader is GCodeReader._flavor_readers_dict["Marlin"]
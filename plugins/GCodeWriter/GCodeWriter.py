@@ -4,6 +4,7 @@
 import re  # For escaping characters in the settings.
 import json
 import copy
+from typing import Callable, Optional
 
 from UM.Mesh.MeshWriter import MeshWriter
 from UM.Logger import Logger
@@ -51,12 +52,20 @@ class GCodeWriter(MeshWriter):
 
     _setting_keyword = ";SETTING_"
 
+    block_size = 1024 * 1024
+    """The number of characters that are written to the stream at once.
+
+    The g-code is written in blocks of this size, so that a stream that encodes
+    or compresses what is written to it (see GCodeGzWriter and UFPWriter) never
+    has to hold more than one block at a time, however large a layer is.
+    """
+
     def __init__(self):
         super().__init__(add_to_recent_files = False)
 
         self._application = Application.getInstance()
 
-    def write(self, stream, nodes, mode = MeshWriter.OutputMode.TextMode):
+    def write(self, stream, nodes, mode = MeshWriter.OutputMode.TextMode, on_progress: Optional[Callable[[int, int], None]] = None):
         """Writes the g-code for the entire scene to a stream.
 
         Note that even though the function accepts a collection of nodes, the
@@ -67,6 +76,8 @@ class GCodeWriter(MeshWriter):
         :param nodes: This is ignored.
         :param mode: Additional information on how to format the g-code in the
             file. This must always be text mode.
+        :param on_progress: The function to call after each block that is
+            written. Parameters are characters_written / characters_total.
         """
 
         if mode != MeshWriter.OutputMode.TextMode:
@@ -74,19 +85,20 @@ class GCodeWriter(MeshWriter):
             self.setInformation(catalog.i18nc("@error:not supported", "GCodeWriter does not support non-text mode."))
             return False
 
-        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
-        scene = Application.getInstance().getController().getScene()
-        if not hasattr(scene, "gcode_dict"):
-            self.setInformation(catalog.i18nc("@warning:status", "Please prepare G-code before exporting."))
-            return False
-        gcode_dict = getattr(scene, "gcode_dict")
-        gcode_list = gcode_dict.get(active_build_plate, None)
+        gcode_list = self._getGCodeList()
         if gcode_list is not None:
             has_settings = False
+            characters_total = sum(len(gcode) for gcode in gcode_list)
+            characters_written = 0
             for gcode in gcode_list:
                 if gcode[:len(self._setting_keyword)] == self._setting_keyword:
                     has_settings = True
-                stream.write(gcode)
+                for start in range(0, len(gcode), self.block_size):
+                    block = gcode[start:start + self.block_size] if len(gcode) > self.block_size else gcode
+                    stream.write(block)
+                    characters_written += len(block)
+                    if on_progress is not None:
+                        on_progress(characters_written, characters_total)
             # Serialise the current container stack and put it at the end of the file.
             if not has_settings:
                 settings = self._serialiseSettings(Application.getInstance().getGlobalContainerStack())
@@ -96,6 +108,28 @@ class GCodeWriter(MeshWriter):
         self.setInformation(catalog.i18nc("@warning:status", "Please prepare G-code before exporting."))
         return False
 
+    def canWrite(self) -> bool:
+        """Check whether there is g-code to write, before anything is written.
+
+        Writers that write the g-code into another stream (see GCodeGzWriter and UFPWriter) check this first, so that
+        they don't write anything if the g-code can't be written.
+
+        :return: Whether there is g-code to write. If not, the information of the writer says why.
+        """
+
+        if self._getGCodeList() is None:
+            self.setInformation(catalog.i18nc("@warning:status", "Please prepare G-code before exporting."))
+            return False
+        return True
+
+    def _getGCodeList(self):
+        """Get the g-code of the active build plate, or None if it isn't sliced."""
+
+        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
+        scene = Application.getInstance().getController().getScene()
+        gcode_dict = getattr(scene, "gcode_dict", {})
+        return gcode_dict.get(active_build_plate, None)
+
     def _createFlattenedContainerInstance(self, instance_container1, instance_container2):
         """Create a new container with container 2 as base and container 1 written over it."""
 
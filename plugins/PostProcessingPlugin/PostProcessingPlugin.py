@@ -20,6 +20,7 @@ from UM.Trust import Trust, TrustBasics
 from UM.i18n import i18nCatalog
 from cura import ApplicationMetadata
 from cura.CuraApplication import CuraApplication
+from cura.GCodeBuffer import GCodeBuffer
 
 i18n_catalog = i18nCatalog("cura")
 
@@ -93,6 +94,8 @@ class PostProcessingPlugin(QObject, Extension):
                     Logger.logException("e", "Exception in post-processing script.")
             if len(self._script_list):  # Add comment to g-code if any changes were made.
                 gcode_list[0] += ";POSTPROCESSED\n"
+            if not isinstance(gcode_list, GCodeBuffer):  # Scripts may return a plain list.
+                gcode_list = GCodeBuffer(gcode_list)
             gcode_dict[active_build_plate_id] = gcode_list
             setattr(scene, "gcode_dict", gcode_dict)
         else:
@@ -133,15 +133,15 @@ class SimulationPass(RenderPass):
                             # We look for the position of the head, searching the point of the current path
                             index = self._layer_view._current_path_num
                             offset = 0
-                            for polygon in layer_data.getLayer(layer).polygons:
+                            for points in layer_data.getLayer(layer).getPolygonPoints():
                                 # The size indicates all values in the two-dimension array, and the second dimension is
                                 # always size 3 because we have 3D points.
-                                if index >= polygon.data.size // 3 - offset:
-                                    index -= polygon.data.size // 3 - offset
+                                if index >= points.size // 3 - offset:
+                                    index -= points.size // 3 - offset
                                     offset = 1  # This is to avoid the first point when there is more than one polygon, since has the same value as the last point in the previous polygon
                                     continue
                                 # The head position is calculated and translated
-                                head_position = Vector(polygon.data[index+offset][0], polygon.data[index+offset][1], polygon.data[index+offset][2]) + node.getWorldPosition()
+                                head_position = Vector(points[index+offset][0], points[index+offset][1], points[index+offset][2]) + node.getWorldPosition()
                                 break
                             break
                         if self._layer_view._minimum_layer_num > layer:
@@ -176,14 +176,18 @@ class SimulationPass(RenderPass):
                 # Create a new batch that is not range-limited
                 batch = RenderBatch(self._layer_shader, type = RenderBatch.RenderType.Solid)
 
-                if self._layer_view.getCurrentLayerMesh():
-                    batch.addItem(node.getWorldTransformation(), self._layer_view.getCurrentLayerMesh())
+                # Each top layer is drawn with its own brightness, so its mesh doesn't need recoloring. The uniforms of
+                # the items are set through the bindings of the shader, which map "brightness" to u_brightness.
+                for layer_mesh, brightness in self._layer_view.getCurrentLayerMeshes():
+                    batch.addItem(node.getWorldTransformation(), layer_mesh, uniforms = {"brightness": brightness})
 
                 if self._layer_view.getCurrentLayerJumps():
-                    batch.addItem(node.getWorldTransformation(), self._layer_view.getCurrentLayerJumps())
+                    batch.addItem(node.getWorldTransformation(), self._layer_view.getCurrentLayerJumps(), uniforms = {"brightness": 1.0})
 
                 if len(batch.items) > 0:
                     batch.render(self._scene.getActiveCamera())
+                    # The uniforms of the items stay set, but all other layers are drawn at full brightness.
+                    self._layer_shader.setUniformValue("u_brightness", 1.0)
 
         # The nozzle is drawn when once we know the correct position of the head,
         # but the user is not using the layer slider, and the compatibility mode is not enabled
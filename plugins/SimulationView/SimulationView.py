@@ -2,12 +2,16 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 import sys
+import threading
+import weakref
+from collections import OrderedDict
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QOpenGLContext
 from PyQt5.QtWidgets import QApplication
 
 from UM.Application import Application
+from UM.Decorators import deprecated
 from UM.Event import Event, KeyEvent
 from UM.Job import Job
 from UM.Logger import Logger
@@ -39,9 +43,10 @@ from .SimulationViewProxy import SimulationViewProxy
 import numpy
 import os.path
 
-from typing import Optional, TYPE_CHECKING, List, cast
+from typing import Optional, TYPE_CHECKING, List, Tuple, cast
 
 if TYPE_CHECKING:
+    from UM.Mesh.MeshData import MeshData
     from UM.Scene.SceneNode import SceneNode
     from UM.Scene.Scene import Scene
     from UM.Settings.ContainerStack import ContainerStack
@@ -66,9 +71,10 @@ class SimulationView(CuraView):
         self._max_layers = 0
         self._current_layer_num = 0
         self._minimum_layer_num = 0
-        self._current_layer_mesh = None
+        self._current_layer_meshes = []  # type: List[Tuple[MeshData, float]] # The mesh of each top layer with its brightness.
         self._current_layer_jumps = None
         self._top_layers_job = None  # type: Optional["_CreateTopLayersJob"]
+        self._layer_mesh_cache = _LayerMeshCache()
         self._activity = False
         self._old_max_layers = 0
 
@@ -103,6 +109,7 @@ class SimulationView(CuraView):
         Application.getInstance().getPreferences().addPreference("view/top_layer_count", 5)
         Application.getInstance().getPreferences().addPreference("view/only_show_top_layers", False)
         Application.getInstance().getPreferences().addPreference("view/force_layer_view_compatibility_mode", False)
+        Application.getInstance().getPreferences().addPreference("view/compact_layer_attributes", False)
 
         Application.getInstance().getPreferences().addPreference("layerview/layer_view_type", 0)
         Application.getInstance().getPreferences().addPreference("layerview/extruder_opacities", "")
@@ -212,7 +219,7 @@ class SimulationView(CuraView):
         self._simulation_running = running
 
     def resetLayerData(self) -> None:
-        self._current_layer_mesh = None
+        self._current_layer_meshes = []
         self._current_layer_jumps = None
         self._max_feedrate = sys.float_info.min
         self._min_feedrate = sys.float_info.max
@@ -393,17 +400,20 @@ class SimulationView(CuraView):
             max_layer_number = -sys.maxsize
             for layer_id in layer_data.getLayers():
 
+                layer = layer_data.getLayer(layer_id)
                 # If a layer doesn't contain any polygons, skip it (for infill meshes taller than print objects
-                if len(layer_data.getLayer(layer_id).polygons) < 1:
+                if layer.polygonCount() < 1:
                     continue
 
                 # Store the max and min feedrates and thicknesses for display purposes
-                for p in layer_data.getLayer(layer_id).polygons:
-                    self._max_feedrate = max(float(p.lineFeedrates.max()), self._max_feedrate)
-                    self._min_feedrate = min(float(p.lineFeedrates.min()), self._min_feedrate)
-                    self._max_thickness = max(float(p.lineThicknesses.max()), self._max_thickness)
+                line_feedrates = layer.lineFeedrates
+                line_thicknesses = layer.lineThicknesses
+                if len(line_feedrates) > 0:
+                    self._max_feedrate = max(float(line_feedrates.max()), self._max_feedrate)
+                    self._min_feedrate = min(float(line_feedrates.min()), self._min_feedrate)
+                    self._max_thickness = max(float(line_thicknesses.max()), self._max_thickness)
                     try:
-                        self._min_thickness = min(float(p.lineThicknesses[numpy.nonzero(p.lineThicknesses)].min()), self._min_thickness)
+                        self._min_thickness = min(float(line_thicknesses[numpy.nonzero(line_thicknesses)].min()), self._min_thickness)
                     except ValueError:
                         # Sometimes, when importing a GCode the line thicknesses are zero and so the minimum (avoiding
                         # the zero) can't be calculated
@@ -564,8 +574,25 @@ class SimulationView(CuraView):
 
         return False
 
-    def getCurrentLayerMesh(self):
-        return self._current_layer_mesh
+    def getCurrentLayerMeshes(self) -> List[Tuple["MeshData", float]]:
+        """Get the meshes of the top layers, each with the brightness to draw its colors with."""
+
+        return self._current_layer_meshes
+
+    @deprecated("Please use getCurrentLayerMeshes instead.", "4.6")
+    def getCurrentLayerMesh(self) -> Optional["MeshData"]:
+        """Get the meshes of the top layers combined in one mesh, with their brightness applied to their colors."""
+
+        if not self._current_layer_meshes:
+            return None
+        layer_mesh = MeshBuilder()
+        for mesh, brightness in self._current_layer_meshes:
+            layer_mesh.addIndices(layer_mesh.getVertexCount() + mesh.getIndices())
+            layer_mesh.addVertices(mesh.getVertices())
+            colors = numpy.array(mesh.getColors(), dtype = numpy.float32)
+            colors[:, 0:3] *= brightness
+            layer_mesh.addColors(colors)
+        return layer_mesh.build()
 
     def getCurrentLayerJumps(self):
         return self._current_layer_jumps
@@ -603,7 +630,8 @@ class SimulationView(CuraView):
 
         self.setBusy(True)
 
-        self._top_layers_job = _CreateTopLayersJob(self._controller.getScene(), self._current_layer_num, self._solid_layers)
+        self._layer_mesh_cache.setMaxSize(self._solid_layers + _LayerMeshCache.DefaultSize)
+        self._top_layers_job = _CreateTopLayersJob(self._controller.getScene(), self._current_layer_num, self._solid_layers, self._layer_mesh_cache)
         self._top_layers_job.finished.connect(self._updateCurrentLayerMesh)  # type: ignore  # mypy doesn't understand the whole private class thing that's going on here.
         self._top_layers_job.start()  # type: ignore
 
@@ -613,7 +641,7 @@ class SimulationView(CuraView):
         if not job.getResult():
             return
         self.resetLayerData()  # Reset the layer data only when job is done. Doing it now prevents "blinking" data.
-        self._current_layer_mesh = job.getResult().get("layers")
+        self._current_layer_meshes = job.getResult().get("layers")
         if self._show_travel_moves:
             self._current_layer_jumps = job.getResult().get("jumps")
         self._controller.getScene().sceneChanged.emit(self._controller.getScene().getRoot())
@@ -669,13 +697,69 @@ class SimulationView(CuraView):
     def _onDontAskMeAgain(self, checked: bool) -> None:
         CuraApplication.getInstance().getPreferences().setValue(self._no_layers_warning_preference, not checked)
 
+class _LayerMeshCache:
+    """Keeps the meshes of the layers that were shown most recently.
+
+    When the layer slider moves by one layer, all top layers but one were already shown, so their meshes can be reused.
+    The meshes are kept per layer number and slice generation: when other layer data is shown, the meshes of the
+    previous layer data are no longer used.
+    """
+
+    # The number of layers to keep on top of the number of top layers, for when the slider moves back and forth.
+    DefaultSize = 20
+
+    def __init__(self) -> None:
+        self._max_size = self.DefaultSize
+        self._generation = 0
+        self._layer_data = None  # type: Optional[weakref.ReferenceType] # The layer data of the current generation.
+        self._meshes = OrderedDict()  # type: OrderedDict[Tuple[int, int, bool], Optional[MeshData]] # Least recently used first.
+        self._lock = threading.Lock()  # A cancelled job may still be running next to the one that replaced it.
+
+    def setMaxSize(self, max_size: int) -> None:
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def getMesh(self, layer_data, layer_number: int, jumps: bool = False) -> Optional["MeshData"]:
+        """Get the mesh (or the jumps) of a layer, creating it if it isn't in the cache.
+
+        :return: The mesh, or None if the layer has no lines to draw.
+        """
+
+        with self._lock:
+            if self._layer_data is None or self._layer_data() is not layer_data:
+                self._generation += 1
+                self._layer_data = weakref.ref(layer_data)
+                self._meshes.clear()
+            key = (self._generation, layer_number, jumps)
+            if key in self._meshes:
+                self._meshes.move_to_end(key)
+                return self._meshes[key]
+
+        layer = layer_data.getLayer(layer_number)
+        mesh = layer.createJumps() if jumps else layer.createMesh()
+        if mesh is not None and mesh.getVertices() is None:
+            mesh = None
+
+        with self._lock:
+            if key[0] == self._generation:
+                self._meshes[key] = mesh
+                self._evict()
+        return mesh
+
+    def _evict(self) -> None:
+        while len(self._meshes) > self._max_size:
+            self._meshes.popitem(last = False)
+
+
 class _CreateTopLayersJob(Job):
-    def __init__(self, scene: "Scene", layer_number: int, solid_layers: int) -> None:
+    def __init__(self, scene: "Scene", layer_number: int, solid_layers: int, layer_mesh_cache: _LayerMeshCache) -> None:
         super().__init__()
 
         self._scene = scene
         self._layer_number = layer_number
         self._solid_layers = solid_layers
+        self._layer_mesh_cache = layer_mesh_cache
         self._cancel = False
 
     def run(self) -> None:
@@ -688,29 +772,25 @@ class _CreateTopLayersJob(Job):
         if self._cancel or not layer_data:
             return
 
-        layer_mesh = MeshBuilder()
+        # The layers are drawn one by one, so their meshes can be reused when the slider moves.
+        layer_meshes = []  # type: List[Tuple[MeshData, float]]
         for i in range(self._solid_layers):
             layer_number = self._layer_number - i
             if layer_number < 0:
                 continue
 
             try:
-                layer = layer_data.getLayer(layer_number).createMesh()
+                layer_mesh = self._layer_mesh_cache.getMesh(layer_data, layer_number)
             except Exception:
                 Logger.logException("w", "An exception occurred while creating layer mesh.")
                 return
 
-            if not layer or layer.getVertices() is None:
+            if layer_mesh is None:
                 continue
 
-            layer_mesh.addIndices(layer_mesh.getVertexCount() + layer.getIndices())
-            layer_mesh.addVertices(layer.getVertices())
-
             # Scale layer color by a brightness factor based on the current layer number
-            # This will result in a range of 0.5 - 1.0 to multiply colors by.
-            brightness = numpy.ones((1, 4), dtype=numpy.float32) * (2.0 - (i / self._solid_layers)) / 2.0
-            brightness[0, 3] = 1.0
-            layer_mesh.addColors(layer.getColors() * brightness)
+            # This will result in a range of 0.5 - 1.0 to multiply colors by. The shader applies it.
+            layer_meshes.append((layer_mesh, (2.0 - (i / self._solid_layers)) / 2.0))
 
             if self._cancel:
                 return
@@ -721,11 +801,13 @@ class _CreateTopLayersJob(Job):
             return
 
         Job.yieldThread()
-        jump_mesh = layer_data.getLayer(self._layer_number).createJumps()
-        if not jump_mesh or jump_mesh.getVertices() is None:
-            jump_mesh = None
+        try:
+            jump_mesh = self._layer_mesh_cache.getMesh(layer_data, self._layer_number, jumps = True)
+        except Exception:
+            Logger.logException("w", "An exception occurred while creating layer jumps.")
+            return
 
-        self.setResult({"layers": layer_mesh.build(), "jumps": jump_mesh})
+        self.setResult({"layers": layer_meshes, "jumps": jump_mesh})
 
     def cancel(self) -> None:
         self._cancel = True
@@ -0,0 +1,97 @@
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from unittest.mock import MagicMock
+
+from ..SimulationView import _LayerMeshCache
+
+
+def createLayerData(layer_count):
+    """Create layer data of which each layer creates a new mesh (and jumps) every time it is asked to."""
+
+    layer_data = MagicMock(name = "layer_data")
+    layers = [MagicMock(name = "layer_{number}".format(number = number)) for number in range(layer_count)]
+    for layer in layers:
+        layer.createMesh.side_effect = lambda: MagicMock(name = "mesh")
+        layer.createJumps.side_effect = lambda: MagicMock(name = "jumps")
+    layer_data.getLayer.side_effect = lambda layer_number: layers[layer_number]
+    return layer_data, layers
+
+
+def test_reuseMesh():
+    cache = _LayerMeshCache()
+    layer_data, layers = createLayerData(3)
+
+    mesh = cache.getMesh(layer_data, 1)
+
+    assert cache.getMesh(layer_data, 1) is mesh
+    assert layers[1].createMesh.call_count == 1
+
+
+def test_reuseJumps():
+    cache = _LayerMeshCache()
+    layer_data, layers = createLayerData(3)
+
+    mesh = cache.getMesh(layer_data, 1)
+    jumps = cache.getMesh(layer_data, 1, jumps = True)
+
+    assert jumps is not mesh
+    assert cache.getMesh(layer_data, 1, jumps = True) is jumps
+    assert cache.getMesh(layer_data, 1) is mesh
+    assert layers[1].createJumps.call_count == 1
+    assert layers[1].createMesh.call_count == 1
+
+
+def test_emptyMesh():
+    cache = _LayerMeshCache()
+    layer_data, layers = createLayerData(1)
+    layers[0].createMesh.side_effect = lambda: MagicMock(getVertices = MagicMock(return_value = None))
+
+    assert cache.getMesh(layer_data, 0) is None
+    assert cache.getMesh(layer_data, 0) is None
+    assert layers[0].createMesh.call_count == 1  # That the layer has nothing to draw is remembered as well.
+
+
+def test_otherLayerData():
+    cache = _LayerMeshCache()
+    layer_data, layers = createLayerData(3)
+    mesh = cache.getMesh(layer_data, 1)
+    other_layer_data, other_layers = createLayerData(3)
+
+    other_mesh = cache.getMesh(other_layer_data, 1)
+
+    assert other_mesh is not mesh
+    assert other_layers[1].createMesh.call_count == 1
+    # The meshes of the previous layer data are forgotten, even when it is shown again.
+    assert cache.getMesh(layer_data, 1) is not mesh
+    assert layers[1].createMesh.call_count == 2
+
+
+def test_evictLeastRecentlyUsed():
+    cache = _LayerMeshCache()
+    cache.setMaxSize(2)
+    layer_data, layers = createLayerData(3)
+    first_mesh = cache.getMesh(layer_data, 0)
+    second_mesh = cache.getMesh(layer_data, 1)
+    cache.getMesh(layer_data, 0)  # Now the second layer is the least recently used.
+
+    cache.getMesh(layer_data, 2)
+
+    assert cache.getMesh(layer_data, 0) is first_mesh
+    assert cache.getMesh(layer_data, 1) is not second_mesh
+    assert layers[0].createMesh.call_count == 1
+    assert layers[1].createMesh.call_count == 2
+
+
+def test_shrink():
+    cache = _LayerMeshCache()
+    layer_data, layers = createLayerData(3)
+    for layer_number in range(3):
+        cache.getMesh(layer_data, layer_number)
+
+    cache.setMaxSize(1)
+
+    cache.getMesh(layer_data, 2)
+    cache.getMesh(layer_data, 0)
+    assert layers[2].createMesh.call_count == 1
+    assert layers[0].createMesh.call_count == 2
@@ -1,11 +1,11 @@
 # Copyright (c) 2020 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
-from typing import cast, List, Dict
+from typing import Callable, cast, List, Dict, Optional
 
 from Charon.VirtualFile import VirtualFile  # To open UFP files.
 from Charon.OpenMode import OpenMode  # To indicate that we want to write to UFP files.
-from io import StringIO  # For converting g-code to bytes.
+from io import TextIOWrapper  # For converting g-code to bytes.
 
 from UM.Logger import Logger
 from UM.Mesh.MeshWriter import MeshWriter  # The writer we need to implement.
@@ -54,7 +54,12 @@ class UFPWriter(MeshWriter):
     # Qt thread. The File read/write operations right now are executed on separated threads because they are scheduled
     # by the Job class.
     @call_on_qt_thread
-    def write(self, stream, nodes, mode = MeshWriter.OutputMode.BinaryMode):
+    def write(self, stream, nodes, mode = MeshWriter.OutputMode.BinaryMode, on_progress: Optional[Callable[[int, int], None]] = None):
+        gcode_writer = cast(MeshWriter, PluginRegistry.getInstance().getPluginObject("GCodeWriter"))
+        if not gcode_writer.canWrite():  # Check this before anything is written into the archive.
+            self.setInformation(gcode_writer.getInformation())
+            return False
+
         archive = VirtualFile()
         archive.openStream(stream, "application/x-ufp", OpenMode.WriteOnly)
 
@@ -62,14 +67,16 @@ class UFPWriter(MeshWriter):
 
         # Store the g-code from the scene.
         archive.addContentType(extension = "gcode", mime_type = "text/x-gcode")
-        gcode_textio = StringIO()  # We have to convert the g-code into bytes.
-        gcode_writer = cast(MeshWriter, PluginRegistry.getInstance().getPluginObject("GCodeWriter"))
-        success = gcode_writer.write(gcode_textio, None)
+        # The g-code writer writes into the archive stream directly, encoding the g-code block by block, so that the
+        # g-code isn't copied into a string and then into bytes first.
+        gcode = archive.getStream("/3D/model.gcode")
+        gcode_textio = TextIOWrapper(gcode, encoding = "UTF-8", newline = "")  # We have to convert the g-code into bytes.
+        success = gcode_writer.write(gcode_textio, None, on_progress = on_progress)
+        gcode_textio.flush()
+        gcode_textio.detach()  # Leave the archive stream open, the archive closes it.
         if not success:  # Writing the g-code failed. Then I can also not write the gzipped g-code.
             self.setInformation(gcode_writer.getInformation())
             return False
-        gcode = archive.getStream("/3D/model.gcode")
-        gcode.write(gcode_textio.getvalue().encode("UTF-8"))
         archive.addRelation(virtual_path = "/3D/model.gcode", relation_type = "http://schemas.ultimaker.org/package/2018/relationships/gcode")
 
         self._createSnapshot()
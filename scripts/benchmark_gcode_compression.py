@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures how long it takes to compress g-code for a network print job, until the first and until the last byte.
+
+The g-code is the reference corpus of benchmark_gcode_parser.py, or a g-code file. It is compressed in batches on the
+calling thread in the way it used to be done, where nothing can be sent until all of the g-code is compressed, and
+with NetworkedPrinterOutputDevice._compressGCodeMembers, which compresses gzip members in parallel and hands out
+each one as soon as it's done. This requires Uranium and the other dependencies of Cura to be importable, but not a
+running Cura.
+
+Usage: benchmark_gcode_compression.py [--lines N] [--file FILE] [--levels L [L ...]]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+from typing import List, Tuple
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark_gcode_parser import generate_gcode
+from cura.PrinterOutput import NetworkedPrinterOutputDevice as NetworkedPrinterOutputDeviceModule
+
+
+def compress_serially(gcode: List[str], compression_level: int) -> Tuple[float, float, int]:
+    """Compresses the g-code in batches of 1/4 MB on this thread, like the output device used to.
+
+    :return: The time until the first byte could be sent and until all of them could, in seconds, and the size.
+    """
+
+    start = time.perf_counter()
+    members = []
+    batched_lines = []  # type: List[str]
+    batched_lines_count = 0
+    for line in gcode:
+        batched_lines.append(line)
+        batched_lines_count += len(line)
+        if batched_lines_count >= NetworkedPrinterOutputDeviceModule.NetworkedPrinterOutputDevice._compression_batch_size:
+            members.append(gzip.compress("".join(batched_lines).encode("utf-8"), compression_level))
+            batched_lines = []
+            batched_lines_count = 0
+    if batched_lines:
+        members.append(gzip.compress("".join(batched_lines).encode("utf-8"), compression_level))
+    compressed = b"".join(members)
+    duration = time.perf_counter() - start
+    return duration, duration, len(compressed)
+
+
+def compress_in_parallel(gcode: List[str], compression_level: int) -> Tuple[float, float, int]:
+    """Compresses the g-code with the compression threads of the output device.
+
+    :return: The time until the first member was done and until all of them were, in seconds, and the size.
+    """
+
+    application = MagicMock()
+    application.getPreferences.return_value.getValue.return_value = compression_level
+    with patch("cura.CuraApplication.CuraApplication.getInstance", MagicMock(return_value = application)), \
+            patch.object(NetworkedPrinterOutputDeviceModule, "QCoreApplication", MagicMock()):
+        output_device = NetworkedPrinterOutputDeviceModule.NetworkedPrinterOutputDevice(device_id = "benchmark", address = "127.0.0.1", properties = {})
+        output_device._progress_message = MagicMock()
+        output_device._gcode = gcode
+
+        start = time.perf_counter()
+        first_byte = None
+        size = 0
+        for member in output_device._compressGCodeMembers():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(member)
+        return first_byte or 0.0, time.perf_counter() - start, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark compressing g-code for network printing.")
+    parser.add_argument("--lines", type = int, default = 1000000, help = "Number of lines in the generated corpus.")
+    parser.add_argument("--file", help = "A g-code file to compress instead of the generated corpus.")
+    parser.add_argument("--levels", type = int, nargs = "+", default = [9, 6, 1], help = "Compression levels to measure.")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding = "utf-8") as f:
+            gcode = f.readlines()
+    else:
+        gcode = list(generate_gcode(args.lines))
+    size = sum(len(line) for line in gcode)
+    print("{lines} lines, {size:.1f} MB, {workers} compression threads".format(lines = len(gcode), size = size / 1024 / 1024,
+                                                                             workers = NetworkedPrinterOutputDeviceModule.NetworkedPrinterOutputDevice._compression_worker_count))
+
+    for compression_level in args.levels:
+        for name, compress in [("serial", compress_serially), ("parallel", compress_in_parallel)]:
+            first_byte, total, compressed_size = compress(gcode, compression_level)
+            print("level {level} {name:>8}: first byte after {first_byte:.3f} s, done after {total:.3f} s, {ratio:.1%} of the size".format(
+                level = compression_level, name = name, first_byte = first_byte, total = total, ratio = compressed_size / size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures how many lines of g-code per second the GCodeReader plug-in parses.
+
+The reference corpus is a synthetic print in the style of CuraEngine: a header, then layers of walls, skin and infill
+with travel moves, retractions, a G92 per layer and extruder switches. It is generated with the given number of lines
+and the same seed every time, so the results of different runs can be compared. A g-code file can be given instead.
+This requires Uranium and the other dependencies of Cura to be importable, but not a running Cura.
+
+With --workers, the layers are parsed in parallel (see FlavorParser._parseInParallel). The time then includes starting
+the worker processes, which Cura only does for the first file.
+
+Usage: benchmark_gcode_parser.py [--lines N] [--file FILE] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Iterator
+from unittest.mock import MagicMock, patch
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins"))
+from cura.LayerPolygon import LayerPolygon
+
+
+def generate_gcode(line_count: int) -> Iterator[str]:
+    """Generates the lines of the reference corpus."""
+
+    rng = numpy.random.default_rng(1234)
+    yield ";FLAVOR:Marlin\n"
+    yield ";Generated with the g-code parser benchmark\n"
+    yield "M82 ;absolute extrusion mode\n"
+    yield "G28 ;Home\n"
+    written = 4
+    layer = 0
+    extrusion = 0.0
+    while written < line_count:
+        yield ";LAYER:{layer}\n".format(layer = layer)
+        yield "G92 E0\n"
+        extrusion = 0.0
+        written += 2
+        if layer % 50 == 49:
+            yield "T{extruder}\n".format(extruder = (layer // 50) % 2)
+            written += 1
+        z = 0.2 * (layer + 1)
+        for feature in ["WALL-OUTER", "WALL-INNER", "SKIN", "FILL"]:
+            yield ";TYPE:{feature}\n".format(feature = feature)
+            yield "G0 F7200 X{x:.3f} Y{y:.3f} Z{z:.1f}\n".format(x = rng.uniform(0, 200), y = rng.uniform(0, 200), z = z)
+            written += 2
+            for x, y in rng.uniform(0, 200, (200, 2)):
+                extrusion += 0.05
+                yield "G1 X{x:.3f} Y{y:.3f} E{e:.5f}\n".format(x = x, y = y, e = extrusion)
+            written += 200
+            yield "G1 F2700 E{e:.5f}\n".format(e = extrusion - 6.5)  # Retract.
+            yield "G1 F2700 E{e:.5f}\n".format(e = extrusion)  # Unretract.
+            written += 2
+        layer += 1
+    yield ";End of Gcode\n"
+    yield ";SETTING_3 {\"global_quality\": \"[general]\\nversion = 4\"}\n"
+
+
+def parse(gcode: str, workers: int = 0) -> float:
+    """Parses g-code with the Marlin flavor parser.
+
+    :param workers: The number of worker processes to parse the layers with, or 0 to parse them in one go.
+    :return: The time it took in seconds.
+    """
+
+    application = MagicMock()
+    application.getPreferences.return_value.getValue.side_effect = lambda key: {"gcodereader/show_caution": False, "gcodereader/parsing_workers": workers}.get(key, False)
+    global_stack = application.getGlobalContainerStack.return_value
+    global_stack.extruderList.__getitem__.return_value.getProperty.return_value = 2.85
+    extruder_manager = MagicMock()
+    extruder_manager.getActiveExtruderStacks.return_value = []
+
+    # The colors come from the theme, which isn't available outside of Cura. They don't matter for the measurement.
+    with patch("cura.CuraApplication.CuraApplication.getInstance", MagicMock(return_value = application)), \
+            patch("cura.Settings.ExtruderManager.ExtruderManager.getInstance", MagicMock(return_value = extruder_manager)), \
+            patch.object(LayerPolygon, "getColorMap", MagicMock(return_value = numpy.ones((12, 4), dtype = numpy.float32))):
+        from GCodeReader import FlavorParser
+        from GCodeReader.MarlinFlavorParser import MarlinFlavorParser
+        with patch.object(FlavorParser, "Message", MagicMock()):
+            parser = MarlinFlavorParser()
+            start = time.perf_counter()
+            parser.processGCodeStream(gcode, "benchmark.gcode")
+            return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark parsing g-code.")
+    parser.add_argument("--lines", type = int, default = 1000000, help = "Number of lines in the generated corpus.")
+    parser.add_argument("--file", help = "A g-code file to parse instead of the generated corpus.")
+    parser.add_argument("--workers", type = int, default = 0, help = "Number of worker processes to parse with (0 is sequential).")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding = "utf-8") as f:
+            gcode = f.read()
+    else:
+        gcode = "".join(generate_gcode(args.lines))
+    line_count = gcode.count("\n") + 1
+
+    duration = parse(gcode, args.workers)
+    print("{lines} lines in {duration:.2f} s: {speed:.0f} lines/s".format(lines = line_count, duration = duration, speed = line_count / duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures the time and peak memory it takes to build the layer data of a print.
+
+A synthetic print is generated with the given number of lines (path segments between two points). Its layer data is
+built in the way it used to be done, layer by layer and polygon by polygon with a pass per extruder for the material
+colors, and with LayerDataBuilder, which gathers each attribute of all layers at once, with float32 and with compact
+vertex attributes. This requires Uranium to be importable.
+
+Usage: benchmark_layer_build.py [--lines N] [--layers N] [--extruders N]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerPolygon import LayerPolygon
+from cura.LayerSegments import LayerSegments
+
+
+def generate_print(line_count: int, layer_count: int, extruder_count: int, compact_attributes: bool = False) -> LayerDataBuilder:
+    """Generates a print with paths of random length, line types and extruders."""
+
+    rng = numpy.random.default_rng(1234)
+    builder = LayerDataBuilder(compact_attributes)
+    lines_per_layer = line_count // layer_count
+    for layer_nr in range(layer_count):
+        line_counts = rng.integers(1, 200, lines_per_layer // 100 + 1)
+        line_counts = line_counts[numpy.cumsum(line_counts) <= lines_per_layer]
+        if line_counts.sum() < lines_per_layer:
+            line_counts = numpy.append(line_counts, lines_per_layer - line_counts.sum())
+        layer_line_count = int(line_counts.sum())
+        point_count = layer_line_count + len(line_counts)
+        points = rng.uniform(0, 200, (point_count, 3)).astype(numpy.float32)
+        points[:, 1] = (layer_nr + 1) * 0.2
+        segments = LayerSegments(
+            extruders = rng.integers(0, extruder_count, len(line_counts)).astype(numpy.int32),
+            points = points,
+            line_types = rng.integers(0, 12, (layer_line_count, 1)).astype(numpy.uint8),
+            line_widths = numpy.full((layer_line_count, 1), 0.4, dtype = numpy.float32),
+            line_thicknesses = numpy.full((layer_line_count, 1), 0.2, dtype = numpy.float32),
+            line_feedrates = numpy.full((layer_line_count, 1), 60, dtype = numpy.float32),
+            line_offsets = numpy.concatenate(([0], numpy.cumsum(line_counts))),
+            point_offsets = numpy.concatenate(([0], numpy.cumsum(line_counts + 1)))
+        )
+        builder.addLayer(layer_nr)
+        builder.getLayer(layer_nr).setSegments(segments)
+    return builder
+
+
+def build_per_layer(builder: LayerDataBuilder, material_color_map: numpy.ndarray) -> None:
+    """Builds the layer data as it was done before: per layer, per polygon and per extruder."""
+
+    layers = builder.getLayers()
+    vertex_count = sum(layers[layer].lineMeshVertexCount() for layer in layers)
+    index_count = sum(layers[layer].lineMeshElementCount() for layer in layers)
+    vertices = numpy.empty((vertex_count, 3), numpy.float32)
+    line_dimensions = numpy.empty((vertex_count, 2), numpy.float32)
+    colors = numpy.empty((vertex_count, 4), numpy.float32)
+    feedrates = numpy.empty(vertex_count, numpy.float32)
+    extruders = numpy.empty(vertex_count, numpy.float32)
+    line_types = numpy.empty(vertex_count, numpy.float32)
+    indices = numpy.empty((index_count, 2), numpy.int32)
+
+    vertex_offset = index_offset = 0
+    for layer in sorted(layers):
+        for polygon in layers[layer].polygons:
+            polygon.build(vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
+            vertex_offset += polygon.lineMeshVertexCount()
+            index_offset += polygon.lineMeshElementCount()
+
+    material_colors = numpy.zeros((vertex_count, 4), numpy.float32)
+    for extruder_nr in range(material_color_map.shape[0]):
+        material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
+    material_colors[line_types == LayerPolygon.MoveCombingType] = colors[line_types == LayerPolygon.MoveCombingType]
+    material_colors[line_types == LayerPolygon.MoveRetractionType] = colors[line_types == LayerPolygon.MoveRetractionType]
+
+
+def measure(name: str, build) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    build()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{name:>12}: {duration:8.2f} s, {peak:9.1f} MB peak".format(name = name, duration = duration, peak = peak / 1e6))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark building the layer data of a print.")
+    parser.add_argument("--lines", type = int, default = 10000000, help = "Number of lines in the print.")
+    parser.add_argument("--layers", type = int, default = 1000, help = "Number of layers in the print.")
+    parser.add_argument("--extruders", type = int, default = 2, help = "Number of extruders.")
+    args = parser.parse_args()
+
+    # The colors come from the theme, which isn't available outside of Cura. They don't matter for the measurement.
+    LayerPolygon.getColorMap = classmethod(lambda cls: numpy.ones((12, 4), dtype = numpy.float32))
+    material_color_map = numpy.ones((args.extruders, 4), dtype = numpy.float32)
+
+    builder = generate_print(args.lines, args.layers, args.extruders)
+    print("{lines} lines in {layers} layers".format(lines = args.lines, layers = args.layers))
+    measure("per layer", lambda: build_per_layer(builder, material_color_map))
+    measure("single pass", lambda: builder.build(material_color_map))
+    del builder
+
+    builder = generate_print(args.lines, args.layers, args.extruders, compact_attributes = True)
+    measure("compact", lambda: builder.build(material_color_map))
+    print("Compact attributes saved {saved:.1f} MB".format(saved = builder.getBytesSaved() / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures how fast the path segments of the engine's layer messages are converted to numpy arrays.
+
+The layer messages are read from a recording: a pickle file with a list of layers, each of them a dict with the fields
+"id", "height", "thickness" and "path_segment", the latter being a list of dicts with the fields of the path segments
+as sent by CuraEngine (see plugins/CuraEngineBackend/Cura.proto). Without a recording, a synthetic one is generated.
+
+With --polygons, the conversion into LayerPolygons (including the validation of the line types) is measured as well.
+That requires Uranium to be importable.
+
+Usage: benchmark_layer_conversion.py [--recording FILE] [--save-recording FILE] [--layers N] [--segments N] [--polygons]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import struct
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cura.LayerSegments import LayerSegments
+
+
+def generate_recording(layer_count: int, segments_per_layer: int) -> List[Dict[str, Any]]:
+    """Generates layers that look like what the engine sends, with random segment lengths."""
+
+    rng = random.Random(1234)
+    layers = []
+    for layer_nr in range(layer_count):
+        segments = []
+        for _ in range(segments_per_layer):
+            line_count = rng.randint(1, 200)
+            points = numpy.random.uniform(0, 200, (line_count + 1) * 2).astype(numpy.float32)
+            segments.append({
+                "extruder": rng.randint(0, 1),
+                "point_type": 0,
+                "points": points.tobytes(),
+                "line_type": numpy.random.randint(0, 12, line_count).astype(numpy.uint8).tobytes(),
+                "line_width": struct.pack("%df" % line_count, *([0.4] * line_count)),
+                "line_thickness": struct.pack("%df" % line_count, *([0.2] * line_count)),
+                "line_feedrate": struct.pack("%df" % line_count, *([60.0] * line_count)),
+            })
+        layers.append({"id": layer_nr, "height": (layer_nr + 1) * 200, "thickness": 200, "path_segment": segments})
+    return layers
+
+
+def convert_per_segment(layer: Dict[str, Any]) -> None:
+    """The conversion as it was done before: one set of arrays per segment.
+
+    numpy.fromstring copied the buffers. Newer versions of numpy no longer support its binary mode, so that is
+    emulated here with a copy of numpy.frombuffer.
+    """
+
+    for segment in layer["path_segment"]:
+        line_types = numpy.frombuffer(segment["line_type"], dtype = "u1").copy().reshape((-1, 1))
+        points = numpy.frombuffer(segment["points"], dtype = "f4").copy()
+        if segment["point_type"] == 0:
+            points = points.reshape((-1, 2))
+        else:
+            points = points.reshape((-1, 3))
+        line_widths = numpy.frombuffer(segment["line_width"], dtype = "f4").copy().reshape((-1, 1))
+        line_thicknesses = numpy.frombuffer(segment["line_thickness"], dtype = "f4").copy().reshape((-1, 1))
+        line_feedrates = numpy.frombuffer(segment["line_feedrate"], dtype = "f4").copy().reshape((-1, 1))
+
+        new_points = numpy.empty((len(points), 3), numpy.float32)
+        if segment["point_type"] == 0:
+            new_points[:, 0] = points[:, 0]
+            new_points[:, 1] = layer["height"] / 1000
+            new_points[:, 2] = -points[:, 1]
+        else:
+            new_points[:, 0] = points[:, 0]
+            new_points[:, 1] = points[:, 2]
+            new_points[:, 2] = -points[:, 1]
+
+
+def convert_per_layer(layer: Dict[str, Any]) -> None:
+    """The conversion as it is done now, for all segments of a layer at once."""
+
+    segments = layer["path_segment"]
+    LayerSegments.fromBuffers(layer["height"],
+                              [segment["extruder"] for segment in segments],
+                              [segment["point_type"] for segment in segments],
+                              [segment["points"] for segment in segments],
+                              [segment["line_type"] for segment in segments],
+                              [segment["line_width"] for segment in segments],
+                              [segment["line_thickness"] for segment in segments],
+                              [segment["line_feedrate"] for segment in segments])
+
+
+def create_polygons(layer: Dict[str, Any], validate_per_line: bool) -> None:
+    """Convert a layer into LayerPolygons, as ProcessSlicedLayersJob does.
+
+    :param validate_per_line: Validate the line types the way LayerPolygon used to: line by line, for each polygon.
+    Otherwise they are validated once for the whole layer.
+    """
+
+    from cura.LayerPolygon import LayerPolygon
+
+    segments = layer["path_segment"]
+    layer_segments = LayerSegments.fromBuffers(layer["height"],
+                                               [segment["extruder"] for segment in segments],
+                                               [segment["point_type"] for segment in segments],
+                                               [segment["points"] for segment in segments],
+                                               [segment["line_type"] for segment in segments],
+                                               [segment["line_width"] for segment in segments],
+                                               [segment["line_thickness"] for segment in segments],
+                                               [segment["line_feedrate"] for segment in segments])
+    if not validate_per_line:
+        LayerPolygon.validateLineTypes(layer_segments.line_types)
+    for p in range(len(layer_segments)):
+        lines = layer_segments.getLines(p)
+        line_types = layer_segments.line_types[lines]
+        if validate_per_line:
+            for i in range(len(line_types)):
+                if line_types[i] >= 12:
+                    line_types[i] = LayerPolygon.NoneType
+        polygon = LayerPolygon(int(layer_segments.extruders[p]), line_types, layer_segments.points[layer_segments.getPoints(p)],
+                               layer_segments.line_widths[lines], layer_segments.line_thicknesses[lines], layer_segments.line_feedrates[lines],
+                               validated_types = True)
+        polygon.buildCache()
+
+
+def measure(name: str, convert, layers: List[Dict[str, Any]], repeat: int) -> float:
+    segment_count = sum(len(layer["path_segment"]) for layer in layers)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for layer in layers:
+            convert(layer)
+        best = min(best, time.perf_counter() - start)
+    print("{name:>20}: {seconds:8.3f} s, {rate:12.0f} segments/s, {per_layer:8.2f} ms/layer".format(name = name, seconds = best, rate = segment_count / best, per_layer = best / len(layers) * 1000))
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark the conversion of sliced layer messages.")
+    parser.add_argument("--recording", help = "Pickle file with recorded layer messages.")
+    parser.add_argument("--save-recording", help = "Save the (generated) recording to this file.")
+    parser.add_argument("--layers", type = int, default = 400, help = "Number of layers to generate.")
+    parser.add_argument("--segments", type = int, default = 100, help = "Number of segments per layer to generate.")
+    parser.add_argument("--polygons", action = "store_true", help = "Also measure the creation of LayerPolygons.")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of times to repeat the measurement.")
+    args = parser.parse_args()
+
+    if args.recording:
+        with open(args.recording, "rb") as f:
+            layers = pickle.load(f)
+    else:
+        layers = generate_recording(args.layers, args.segments)
+    if args.save_recording:
+        with open(args.save_recording, "wb") as f:
+            pickle.dump(layers, f)
+
+    print("{layers} layers, {segments} segments".format(layers = len(layers), segments = sum(len(layer["path_segment"]) for layer in layers)))
+    before = measure("per segment", convert_per_segment, layers, args.repeat)
+    after = measure("per layer", convert_per_layer, layers, args.repeat)
+    print("Speed-up: {speedup:.1f}x".format(speedup = before / after))
+
+    if args.polygons:
+        from cura.LayerPolygon import LayerPolygon
+        # The colors come from the theme, which isn't available outside of Cura. They don't matter for the timing.
+        LayerPolygon.getColorMap = classmethod(lambda cls: numpy.ones((12, 4), dtype = numpy.float32))
+
+        before = measure("validate per line", lambda layer: create_polygons(layer, True), layers, args.repeat)
+        after = measure("validate per layer", lambda layer: create_polygons(layer, False), layers, args.repeat)
+        print("Speed-up: {speedup:.1f}x".format(speedup = before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures how much memory the sliced layers take, stored as LayerPolygons or as one array per attribute.
+
+The layers are generated in the same way as benchmark_layer_conversion.py does. For both ways of storing them, the
+memory that is still allocated after converting all layers and the number of Python objects that were created are
+reported, as well as the time it takes to build the layer data from them. This requires Uranium to be importable.
+
+Usage: benchmark_layer_memory.py [--layers N] [--segments N]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmark_layer_conversion import generate_recording
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerPolygon import LayerPolygon
+from cura.LayerSegments import LayerSegments
+
+
+def create_layers(recording: List[Dict[str, Any]], as_polygons: bool) -> LayerDataBuilder:
+    builder = LayerDataBuilder()
+    for layer_nr, recorded_layer in enumerate(recording):
+        segments = recorded_layer["path_segment"]
+        layer_segments = LayerSegments.fromBuffers(recorded_layer["height"],
+                                                   [segment["extruder"] for segment in segments],
+                                                   [segment["point_type"] for segment in segments],
+                                                   [segment["points"] for segment in segments],
+                                                   [segment["line_type"] for segment in segments],
+                                                   [segment["line_width"] for segment in segments],
+                                                   [segment["line_thickness"] for segment in segments],
+                                                   [segment["line_feedrate"] for segment in segments])
+        LayerPolygon.validateLineTypes(layer_segments.line_types)
+        builder.addLayer(layer_nr)
+        layer = builder.getLayer(layer_nr)
+        if as_polygons:
+            # The way the layers used to be stored: a LayerPolygon with its own arrays and caches per segment.
+            for p in range(len(layer_segments)):
+                lines = layer_segments.getLines(p)
+                polygon = LayerPolygon(int(layer_segments.extruders[p]), layer_segments.line_types[lines].copy(),
+                                       layer_segments.points[layer_segments.getPoints(p)].copy(), layer_segments.line_widths[lines].copy(),
+                                       layer_segments.line_thicknesses[lines].copy(), layer_segments.line_feedrates[lines].copy(),
+                                       validated_types = True)
+                polygon.buildCache()
+                layer.polygons.append(polygon)
+        else:
+            layer.setSegments(layer_segments)
+        builder.setLayerHeight(layer_nr, recorded_layer["height"] / 1000)
+        builder.setLayerThickness(layer_nr, recorded_layer["thickness"] / 1000)
+    return builder
+
+
+def measure(name: str, recording: List[Dict[str, Any]], as_polygons: bool) -> None:
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    tracemalloc.start()
+    builder = create_layers(recording, as_polygons)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    objects = len(gc.get_objects()) - objects_before
+
+    start = time.perf_counter()
+    builder.build(numpy.ones((2, 4), dtype = numpy.float32))
+    build_time = time.perf_counter() - start
+
+    print("{name:>12}: {current:8.1f} MB retained, {peak:8.1f} MB peak, {objects:9d} objects, build {build:6.2f} s".format(
+        name = name, current = current / 1e6, peak = peak / 1e6, objects = objects, build = build_time))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark the memory used by sliced layers.")
+    parser.add_argument("--layers", type = int, default = 200, help = "Number of layers to generate.")
+    parser.add_argument("--segments", type = int, default = 100, help = "Number of segments per layer to generate.")
+    args = parser.parse_args()
+
+    # The colors come from the theme, which isn't available outside of Cura. They don't matter for the measurement.
+    LayerPolygon.getColorMap = classmethod(lambda cls: numpy.ones((12, 4), dtype = numpy.float32))
+
+    recording = generate_recording(args.layers, args.segments)
+    print("{layers} layers, {segments} segments".format(layers = len(recording), segments = args.layers * args.segments))
+    measure("polygons", recording, True)
+    measure("segments", recording, False)
+
+
+if __name__ == "__main__":
+    main()
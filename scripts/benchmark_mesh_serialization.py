@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Copyright (c) 2020 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+"""Measures how fast the vertices of a mesh are built for the slice message, and the peak memory that it takes.
+
+The mesh is an indexed grid of triangles, which is transformed with a rotation, scale and translation. The vertices
+are built in the way it used to be done, in 64-bit floats with a separate swap of the Y and Z axes, and with
+StartSliceJob._transformVertices. The throughput is the size of the vertices that are sent to the engine per second.
+This requires Uranium and the other dependencies of Cura to be importable, but not a running Cura.
+
+Usage: benchmark_mesh_serialization.py [--triangles N] [--repeat N]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins"))
+from UM.Math.Matrix import Matrix
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshData import MeshData
+from CuraEngineBackend.StartSliceJob import StartSliceJob
+
+
+def generate_mesh(triangle_count: int) -> MeshData:
+    """Create a grid of triangles that share their vertices, like a mesh that is read from a file."""
+
+    columns = max(1, int((triangle_count / 2) ** 0.5))
+    rows = max(1, -(-triangle_count // (2 * columns)))
+    x, y = numpy.meshgrid(numpy.arange(columns + 1, dtype = numpy.float32), numpy.arange(rows + 1, dtype = numpy.float32))
+    vertices = numpy.stack([x.ravel(), numpy.sin(x.ravel() * 0.1) * numpy.cos(y.ravel() * 0.1), y.ravel()], axis = 1).astype(numpy.float32)
+
+    corners = (numpy.arange(rows)[:, None] * (columns + 1) + numpy.arange(columns)[None, :]).ravel().astype(numpy.int32)
+    indices = numpy.empty((corners.size * 2, 3), dtype = numpy.int32)
+    indices[0::2] = numpy.stack([corners, corners + 1, corners + columns + 1], axis = 1)
+    indices[1::2] = numpy.stack([corners + 1, corners + columns + 2, corners + columns + 1], axis = 1)
+    return MeshData(vertices = vertices, indices = indices[:triangle_count])
+
+
+def transform_float64(mesh_data: MeshData, world_transformation: Matrix) -> numpy.ndarray:
+    """Builds the vertices like StartSliceJob used to."""
+
+    rot_scale = world_transformation.getTransposed().getData()[0:3, 0:3]
+    translate = world_transformation.getData()[:3, 3]
+
+    verts = mesh_data.getVertices()
+    verts = verts.dot(rot_scale)
+    verts += translate
+
+    verts[:, [1, 2]] = verts[:, [2, 1]]
+    verts[:, 1] *= -1
+
+    indices = mesh_data.getIndices()
+    if indices is not None:
+        return numpy.take(verts, indices.flatten(), axis=0)
+    return numpy.array(verts)
+
+
+def measure(name: str, transform: Callable[[MeshData, Matrix], numpy.ndarray], mesh_data: MeshData, world_transformation: Matrix, repeat: int) -> numpy.ndarray:
+    durations = []
+    peak = 0
+    for _ in range(repeat):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        vertices = transform(mesh_data, world_transformation)
+        durations.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    duration = min(durations)
+    print("{name:>8}: {duration:6.3f} s, {triangles:6.1f} M triangles/s, {throughput:7.1f} MB/s, {size:7.1f} MB sent, {peak:7.1f} MB peak".format(
+        name = name, duration = duration, triangles = mesh_data.getIndices().shape[0] / duration / 1e6, throughput = vertices.nbytes / duration / 1e6,
+        size = vertices.nbytes / 1e6, peak = peak / 1e6))
+    return vertices
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark building the vertices of a mesh for the slice message.")
+    parser.add_argument("--triangles", type = int, default = 5000000, help = "Number of triangles in the mesh.")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of times to measure, of which the fastest is reported.")
+    args = parser.parse_args()
+
+    mesh_data = generate_mesh(args.triangles)
+    world_transformation = Matrix()
+    world_transformation.compose(scale = Vector(1.5, 1.5, 1.5), angles = Vector(0.3, 0.5, 0), translate = Vector(10, 0, -20))
+    print("{triangles} triangles, {vertices} vertices ({size:.1f} MB)".format(triangles = mesh_data.getIndices().shape[0], vertices = mesh_data.getVertexCount(),
+                                                                           size = mesh_data.getVertices().nbytes / 1e6))
+
+    reference = measure("float64", transform_float64, mesh_data, world_transformation, args.repeat)
+    vertices = measure("float32", StartSliceJob._transformVertices, mesh_data, world_transformation, args.repeat)
+    print("Largest difference: {difference:.2e} mm".format(difference = float(numpy.abs(reference - vertices).max())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import gzip
 import time
 from unittest.mock import MagicMock, patch
 
@@ -137,3 +138,49 @@ def test_timeout():
     assert output_device.connectionState == ConnectionState.Closed
 
 
+
+def test_compressGCode():
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        output_device = NetworkedPrinterOutputDevice(device_id = "test", address = "127.0.0.1", properties = {})
+    output_device._progress_message = MagicMock()
+    output_device._gcode = ["G1 X{x} Y{y}\n".format(x = line % 200, y = line // 200) for line in range(100000)]
+    output_device._compression_batch_size = 10000  # Many gzip members.
+
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        with patch("cura.PrinterOutput.NetworkedPrinterOutputDevice.QCoreApplication"):
+            compressed = output_device._compressGCode()
+
+    # The gzip members together are a single valid gzip file.
+    assert gzip.decompress(compressed).decode("utf-8") == "".join(output_device._gcode)
+    assert not output_device._compressing_gcode
+
+
+def test_compressGCodeMembersInOrder():
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        output_device = NetworkedPrinterOutputDevice(device_id = "test", address = "127.0.0.1", properties = {})
+    output_device._progress_message = MagicMock()
+    output_device._gcode = [";LAYER:{layer}\n".format(layer = layer) + "G1 X10 Y10\n" * 1000 for layer in range(50)]
+    output_device._compression_batch_size = 1
+
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        with patch("cura.PrinterOutput.NetworkedPrinterOutputDevice.QCoreApplication"):
+            members = list(output_device._compressGCodeMembers())
+
+    assert [gzip.decompress(member).decode("utf-8") for member in members] == output_device._gcode
+
+
+def test_compressGCodeAborted():
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        output_device = NetworkedPrinterOutputDevice(device_id = "test", address = "127.0.0.1", properties = {})
+    output_device._progress_message = MagicMock()
+    output_device._gcode = ["G1 X10 Y10\n" * 1000] * 50
+    output_device._compression_batch_size = 1
+
+    with patch("UM.Qt.QtApplication.QtApplication.getInstance"):
+        with patch("cura.PrinterOutput.NetworkedPrinterOutputDevice.QCoreApplication"):
+            members = output_device._compressGCodeMembers()
+            next(members)
+            output_device._compressing_gcode = False  # Abort the upload.
+            assert list(members) == []
+
+    output_device._progress_message.hide.assert_called_once_with()
@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from UM.Signal import Signal
+
+from cura.Settings.SettingsSnapshotCache import SettingsSnapshotCache
+
+
+def createStack():
+    stack = MagicMock()
+    stack.propertyChanged = Signal()
+    stack.containersChanged = Signal()
+    return stack
+
+
+@pytest.fixture
+def global_stack():
+    global_stack = createStack()
+    global_stack.extruderList = [createStack(), createStack()]
+    return global_stack
+
+
+@pytest.fixture
+def cache(global_stack):
+    cache = SettingsSnapshotCache()
+    cache.setGlobalStack(global_stack)
+    return cache
+
+
+def test_getStored(cache, global_stack):
+    stacks = [global_stack] + global_stack.extruderList
+    assert cache.get(stacks) is None
+
+    snapshot = {"layer_height": 0.1}
+    cache.store(cache.getRevision(), stacks, snapshot)
+
+    assert cache.get(stacks) is snapshot
+    assert cache.get(stacks[:2]) is None  # Not for other stacks, e.g. when an extruder is disabled.
+
+
+@pytest.mark.parametrize("stack_index", [0, 1, 2])
+def test_valueChanged(cache, global_stack, stack_index):
+    stacks = [global_stack] + global_stack.extruderList
+    cache.store(cache.getRevision(), stacks, {})
+
+    stacks[stack_index].propertyChanged.emit("layer_height", "value")
+
+    assert cache.get(stacks) is None
+
+
+def test_otherPropertyChanged(cache, global_stack):
+    stacks = [global_stack] + global_stack.extruderList
+    snapshot = {}
+    cache.store(cache.getRevision(), stacks, snapshot)
+
+    global_stack.propertyChanged.emit("layer_height", "validationState")
+
+    assert cache.get(stacks) is snapshot
+
+
+def test_containersChanged(cache, global_stack):
+    stacks = [global_stack] + global_stack.extruderList
+    cache.store(cache.getRevision(), stacks, {})
+
+    global_stack.extruderList[0].containersChanged.emit(MagicMock())
+
+    assert cache.get(stacks) is None
+
+
+def test_changedWhileEvaluating(cache, global_stack):
+    stacks = [global_stack] + global_stack.extruderList
+    revision = cache.getRevision()
+    global_stack.propertyChanged.emit("layer_height", "value")  # While the snapshot is being made.
+    cache.store(revision, stacks, {})
+
+    assert cache.get(stacks) is None
+
+
+def test_otherMachine(cache, global_stack):
+    stacks = [global_stack] + global_stack.extruderList
+    cache.store(cache.getRevision(), stacks, {})
+
+    other_global_stack = createStack()
+    other_global_stack.extruderList = []
+    cache.setGlobalStack(other_global_stack)
+    assert cache.get(stacks) is None
+
+    # Stacks that are not watched anymore are not stored.
+    cache.store(cache.getRevision(), stacks, {})
+    assert cache.get(stacks) is None
+
+    # And changes to them don't matter anymore.
+    snapshot = {}
+    cache.store(cache.getRevision(), [other_global_stack], snapshot)
+    global_stack.propertyChanged.emit("layer_height", "value")
+    assert cache.get([other_global_stack]) is snapshot
@@ -0,0 +1,104 @@
+import pytest
+
+from cura.GCodeBuffer import GCodeBuffer
+
+
+header = ";FLAVOR:UltiGCode\n;TIME:{print_time}\n;MATERIAL:{filament_amount}\n"
+start = "G28 ;Home\n;LAYER_COUNT:2\n"
+layer_0 = ";LAYER:0\nM107\n;TYPE:SKIRT\nG1 X1 Y1 E1 ;{print_time} is not replaced here\n;TYPE:WALL-OUTER\nG1 X2 Y2 E2\n"
+layer_1 = ";LAYER:1\n;TYPE:FILL\nG1 X3 Y3 E3\n"
+footer = ";End of Gcode {jobname}\n"
+settings = ";SETTING_3 {}\n"
+
+
+@pytest.fixture
+def gcode():
+    # Like the engine sends it: the prefix, the start g-code with the first layer, the other layers and the end.
+    return GCodeBuffer([header, start + layer_0, layer_1, footer, settings])
+
+
+def test_listFacade(gcode):
+    assert len(gcode) == 5
+    assert gcode[0] == header
+    assert gcode[-1] == settings
+    assert gcode[1:3] == [start + layer_0, layer_1]
+    assert gcode == [header, start + layer_0, layer_1, footer, settings]
+    assert "".join(gcode) == header + start + layer_0 + layer_1 + footer + settings
+
+    gcode[0] += ";POSTPROCESSED\n"
+    gcode.append(";extra\n")
+    gcode.insert(0, ";first\n")
+    del gcode[-1]
+
+    assert list(gcode) == [";first\n", header + ";POSTPROCESSED\n", start + layer_0, layer_1, footer, settings]
+
+
+def test_getLayer(gcode):
+    assert gcode.getLayerNumbers() == [0, 1]
+    assert gcode.getLayer(0) == layer_0
+    assert gcode.getLayer(1) == layer_1
+    assert gcode.getLayer(2) is None
+
+
+def test_getLayerAcrossChunks():
+    gcode = GCodeBuffer([header + ";LAYER:0\nG1 X1\n", "G1 X2\n", ";LAYER:1\nG1 X3\n"])
+
+    assert gcode.getLayer(0) == ";LAYER:0\nG1 X1\nG1 X2\n"
+    assert gcode.getLayer(1) == ";LAYER:1\nG1 X3\n"
+    assert gcode.getHeader() == header
+
+
+def test_getTypeSpans(gcode):
+    spans = gcode.getTypeSpans(0)
+
+    assert [line_type for line_type, _, _ in spans] == ["SKIRT", "WALL-OUTER"]
+    assert [layer_0[start:end] for _, start, end in spans] == [";TYPE:SKIRT\nG1 X1 Y1 E1 ;{print_time} is not replaced here\n", ";TYPE:WALL-OUTER\nG1 X2 Y2 E2\n"]
+
+
+def test_headerAndFooter(gcode):
+    assert gcode.getHeader() == header + start
+    assert gcode.getFooter() == footer + settings
+
+
+def test_withoutLayers():
+    gcode = GCodeBuffer([header, footer])
+
+    assert gcode.getLayerNumbers() == []
+    assert gcode.getHeader() == header + footer
+    assert gcode.getFooter() == ""
+
+
+def test_replacePlaceholders(gcode):
+    gcode.replacePlaceholders({"{print_time}": "1234", "{filament_amount}": "[1.5]", "{jobname}": "UM3_box"})
+
+    assert gcode[0] == ";FLAVOR:UltiGCode\n;TIME:1234\n;MATERIAL:[1.5]\n"
+    assert gcode[1] == start + layer_0  # The layers before the last one are left alone.
+    assert gcode[3] == ";End of Gcode UM3_box\n"
+
+
+def test_replacePlaceholdersBeforeFirstLayer():
+    gcode = GCodeBuffer(["G1 {jobname}\n;LAYER:0\nG1 {jobname}\n", ";LAYER:1\nG1 X1\n"])
+
+    gcode.replacePlaceholders({"{jobname}": "box"})
+
+    assert gcode[0] == "G1 box\n;LAYER:0\nG1 {jobname}\n"
+
+
+def test_replacePlaceholdersWithEndInLastLayerChunk():
+    # The end g-code is sent in the same message as the last layer.
+    gcode = GCodeBuffer([header, start + layer_0, layer_1 + footer, settings])
+
+    gcode.replacePlaceholders({"{print_time}": "1234", "{jobname}": "UM3_box"})
+
+    assert gcode[1] == start + layer_0
+    assert gcode[2] == layer_1 + ";End of Gcode UM3_box\n"
+
+
+def test_indexFollowsChanges(gcode):
+    assert gcode.getLayerNumbers() == [0, 1]
+
+    gcode[2] = ";LAYER:5\nG1 X0\n"
+    gcode.insert(3, ";LAYER:6\nG1 X1\n")
+
+    assert gcode.getLayerNumbers() == [0, 5, 6]
+    assert gcode.getLayer(6) == ";LAYER:6\nG1 X1\n"
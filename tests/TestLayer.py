@@ -36,4 +36,68 @@ def test_elementCount():
     layer_polygon.elementCount = 12
     layer.polygons.append(layer_polygon)
     assert layer.build(0, 0, [], [], [], [], [] ,[] , []) == (9001, 9002)
-    assert layer.elementCount == 12
\ No newline at end of file
+    assert layer.elementCount == 12
+
+def createSegments():
+    import numpy
+    from cura.LayerSegments import LayerSegments
+    return LayerSegments.fromBuffers(
+        200,
+        [0, 1, 0],
+        [0, 0, 0],
+        [numpy.array([0, 0, 1, 0, 1, 1, 0, 1], dtype = numpy.float32).tobytes(),
+         numpy.array([2, 2, 3, 2], dtype = numpy.float32).tobytes(),
+         numpy.array([5, 5, 6, 5, 6, 7, 8, 7], dtype = numpy.float32).tobytes()],
+        [bytes([1, 1, 8]), bytes([6]), bytes([6, 9, 3])],
+        [numpy.array([0.4, 0.4, 0.1], dtype = numpy.float32).tobytes(), numpy.array([0.5], dtype = numpy.float32).tobytes(), numpy.array([0.3, 0.1, 0.3], dtype = numpy.float32).tobytes()],
+        [numpy.array([0.2, 0.2, 0.2], dtype = numpy.float32).tobytes(), numpy.array([0.1], dtype = numpy.float32).tobytes(), numpy.array([0.2, 0.2, 0.3], dtype = numpy.float32).tobytes()],
+        [numpy.array([30, 40, 150], dtype = numpy.float32).tobytes(), numpy.array([20], dtype = numpy.float32).tobytes(), numpy.array([50, 150, 60], dtype = numpy.float32).tobytes()]
+    )
+
+
+def buildLayer(layer, vertex_count, index_count):
+    import numpy
+    arrays = [numpy.zeros((vertex_count, 3), numpy.float32), numpy.zeros((vertex_count, 4), numpy.float32),
+              numpy.zeros((vertex_count, 2), numpy.float32), numpy.zeros(vertex_count, numpy.float32),
+              numpy.zeros(vertex_count, numpy.float32), numpy.zeros(vertex_count, numpy.float32),
+              numpy.zeros((index_count, 2), numpy.int32)]
+    offsets = layer.build(3, 1, *arrays)
+    return offsets, arrays
+
+
+def test_segmentsSameAsPolygons():
+    import numpy
+    from unittest.mock import patch
+    from cura.LayerPolygon import LayerPolygon
+
+    color_map = numpy.arange(48, dtype = numpy.float32).reshape((12, 4)) / 48
+    with patch.object(LayerPolygon, "getColorMap", return_value = color_map):
+        segments_layer = Layer(0)
+        segments_layer.setSegments(createSegments())
+        polygons_layer = Layer(0)
+        for polygon in segments_layer.polygons:
+            polygons_layer.polygons.append(polygon)
+
+        assert segments_layer.polygonCount() == polygons_layer.polygonCount() == 3
+        assert segments_layer.lineMeshVertexCount() == polygons_layer.lineMeshVertexCount()
+        assert segments_layer.lineMeshElementCount() == polygons_layer.lineMeshElementCount()
+        assert numpy.array_equal(segments_layer.lineFeedrates, polygons_layer.lineFeedrates)
+        assert numpy.array_equal(segments_layer.lineThicknesses, polygons_layer.lineThicknesses)
+        for segments_points, polygons_points in zip(segments_layer.getPolygonPoints(), polygons_layer.getPolygonPoints()):
+            assert numpy.array_equal(segments_points, polygons_points)
+
+        vertex_count = segments_layer.lineMeshVertexCount() + 3
+        index_count = segments_layer.lineMeshElementCount() + 1
+        segments_offsets, segments_arrays = buildLayer(segments_layer, vertex_count, index_count)
+        polygons_offsets, polygons_arrays = buildLayer(polygons_layer, vertex_count, index_count)
+        assert segments_offsets == polygons_offsets
+        for segments_array, polygons_array in zip(segments_arrays, polygons_arrays):
+            assert numpy.array_equal(segments_array, polygons_array)
+        assert segments_layer.elementCount == polygons_layer.elementCount
+
+        for make_mesh in [True, False]:
+            segments_mesh = segments_layer.createMeshOrJumps(make_mesh)
+            polygons_mesh = polygons_layer.createMeshOrJumps(make_mesh)
+            assert numpy.allclose(segments_mesh.getVertices(), polygons_mesh.getVertices())
+            assert numpy.array_equal(segments_mesh.getIndices(), polygons_mesh.getIndices())
+            assert numpy.array_equal(segments_mesh.getColors(), polygons_mesh.getColors())
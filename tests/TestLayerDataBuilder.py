@@ -0,0 +1,214 @@
+from unittest.mock import patch
+
+import numpy
+import pytest
+
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerPolygon import LayerPolygon
+
+
+color_map = numpy.arange(12 * 4, dtype = numpy.float32).reshape((12, 4)) / 48
+material_color_map = numpy.array([[1, 0, 0, 1], [0, 1, 0, 1]], dtype = numpy.float32)
+
+
+def createPolygon(extruder, line_types, height):
+    line_types = numpy.array(line_types, dtype = numpy.uint8).reshape((-1, 1))
+    count = len(line_types)
+    points = numpy.zeros((count + 1, 3), dtype = numpy.float32)
+    points[:, 0] = numpy.arange(count + 1)
+    points[:, 1] = height
+    points[:, 2] = numpy.arange(count + 1) % 2
+    line_widths = numpy.full((count, 1), 0.4, dtype = numpy.float32)
+    line_thicknesses = numpy.full((count, 1), 0.2, dtype = numpy.float32)
+    line_feedrates = numpy.arange(count, dtype = numpy.float32).reshape((-1, 1))
+    polygon = LayerPolygon(extruder, line_types, points, line_widths, line_thicknesses, line_feedrates)
+    polygon.buildCache()
+    return polygon
+
+
+def addLayer(builder, layer_number):
+    builder.addLayer(layer_number)
+    builder.setLayerHeight(layer_number, layer_number * 0.2)
+    builder.getLayer(layer_number).polygons.append(createPolygon(layer_number % 2, [1, 1, 8, 2, 2], layer_number * 0.2))
+    builder.getLayer(layer_number).polygons.append(createPolygon(0, [6, 9, 6], layer_number * 0.2))
+
+
+@pytest.fixture(autouse = True)
+def themeColors():
+    with patch.object(LayerPolygon, "getColorMap", return_value = color_map):
+        yield
+
+
+def assertSameLayerData(first, second):
+    assert numpy.array_equal(first.getVertices(), second.getVertices())
+    assert numpy.array_equal(first.getIndices(), second.getIndices())
+    assert numpy.array_equal(first.getColors(), second.getColors())
+    for name in ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]:
+        assert numpy.array_equal(first.getAttribute(name)["value"], second.getAttribute(name)["value"])
+    assert first.getElementCounts() == second.getElementCounts()
+    assert list(first.getLayers().keys()) == list(second.getLayers().keys())
+
+
+def test_buildIncrementally():
+    incremental = LayerDataBuilder()
+    for layer_number in range(3):
+        addLayer(incremental, layer_number)
+    partial = incremental.build(material_color_map, 0.5)
+    for layer_number in range(3, 6):
+        addLayer(incremental, layer_number)
+    complete = incremental.build(material_color_map, 0.5)
+
+    at_once = LayerDataBuilder()
+    for layer_number in range(6):
+        addLayer(at_once, layer_number)
+    expected = at_once.build(material_color_map, 0.5)
+
+    assertSameLayerData(complete, expected)
+    assert list(partial.getLayers().keys()) == [0, 1, 2]
+    # The layer data that was built first is not affected by the layers that were added after it.
+    assert numpy.array_equal(partial.getVertices(), expected.getVertices()[:partial.getVertices().shape[0]])
+
+
+def test_buildOutOfOrder():
+    out_of_order = LayerDataBuilder()
+    for layer_number in [2, 3]:
+        addLayer(out_of_order, layer_number)
+    out_of_order.build(material_color_map)
+    for layer_number in [0, 1]:
+        addLayer(out_of_order, layer_number)
+    result = out_of_order.build(material_color_map)
+
+    in_order = LayerDataBuilder()
+    for layer_number in range(4):
+        addLayer(in_order, layer_number)
+
+    assertSameLayerData(result, in_order.build(material_color_map))
+
+
+def test_buildOutOfOrderKeepsBuiltLayerData():
+    builder = LayerDataBuilder()
+    for layer_number in range(1, 5):
+        addLayer(builder, layer_number)
+    builder.build(material_color_map)
+    addLayer(builder, 5)
+    published = builder.build(material_color_map)  # The buffers grew, so there is room to spare after this layer.
+    published_vertices = published.getVertices().copy()
+    published_colors = published.getAttribute("colors")["value"].copy()
+    addLayer(builder, 0)
+
+    builder.build(material_color_map)
+
+    assert numpy.array_equal(published.getVertices(), published_vertices)
+    assert numpy.array_equal(published.getAttribute("colors")["value"], published_colors)
+
+
+def test_resetBuild():
+    builder = LayerDataBuilder()
+    for layer_number in range(3):
+        addLayer(builder, layer_number)
+    partial = builder.build(material_color_map)
+    partial_vertices = partial.getVertices().copy()
+    # Paths are added to a layer that was already built.
+    builder.getLayer(1).polygons.append(createPolygon(1, [1, 2], 0.2))
+    builder.resetBuild()
+    result = builder.build(material_color_map)
+
+    expected = LayerDataBuilder()
+    for layer_number in range(3):
+        addLayer(expected, layer_number)
+    expected.getLayer(1).polygons.append(createPolygon(1, [1, 2], 0.2))
+
+    assertSameLayerData(result, expected.build(material_color_map))
+    # The layer data that was built before is not overwritten.
+    assert numpy.array_equal(partial.getVertices(), partial_vertices)
+
+
+def buildPerLayer(builder, material_color_map, line_type_brightness):
+    """The way the layer data used to be built: layer by layer, polygon by polygon, and a pass per extruder."""
+
+    layers = builder.getLayers()
+    vertex_count = sum(layers[layer].lineMeshVertexCount() for layer in layers)
+    index_count = sum(layers[layer].lineMeshElementCount() for layer in layers)
+    vertices = numpy.empty((vertex_count, 3), numpy.float32)
+    line_dimensions = numpy.empty((vertex_count, 2), numpy.float32)
+    colors = numpy.empty((vertex_count, 4), numpy.float32)
+    feedrates = numpy.empty(vertex_count, numpy.float32)
+    extruders = numpy.empty(vertex_count, numpy.float32)
+    line_types = numpy.empty(vertex_count, numpy.float32)
+    indices = numpy.empty((index_count, 2), numpy.int32)
+    vertex_offset = index_offset = 0
+    for layer in sorted(layers):
+        vertex_offset, index_offset = layers[layer].build(vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
+    colors[:, 0:3] *= line_type_brightness
+    material_colors = numpy.zeros((vertex_count, 4), numpy.float32)
+    for extruder_nr in range(material_color_map.shape[0]):
+        material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
+    for travel_type in [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType]:
+        material_colors[line_types == travel_type] = colors[line_types == travel_type]
+    return vertices, indices.reshape(-1), colors, line_dimensions, extruders, material_colors, line_types, feedrates
+
+
+def test_buildSameAsPerLayer():
+    builder = LayerDataBuilder()
+    for layer_number in range(4):
+        addLayer(builder, layer_number)
+    result = builder.build(material_color_map, 0.5)
+
+    vertices, indices, colors, line_dimensions, extruders, material_colors, line_types, feedrates = buildPerLayer(builder, material_color_map, 0.5)
+    assert numpy.array_equal(result.getVertices(), vertices)
+    assert numpy.array_equal(result.getIndices(), indices)
+    assert numpy.array_equal(result.getColors(), colors)
+    assert numpy.array_equal(result.getAttribute("line_dimensions")["value"], line_dimensions)
+    assert numpy.array_equal(result.getAttribute("extruders")["value"], extruders)
+    assert numpy.array_equal(result.getAttribute("colors")["value"], material_colors)
+    assert numpy.array_equal(result.getAttribute("line_types")["value"], line_types)
+    assert numpy.array_equal(result.getAttribute("feedrates")["value"], feedrates)
+    assert result.getElementCounts() == {layer_number: 16 for layer_number in range(4)}
+    assert [result.getLayer(layer_number).elementCount for layer_number in range(4)] == [16] * 4
+
+
+def test_buildSegments():
+    polygons = LayerDataBuilder()
+    segments = LayerDataBuilder()
+    for layer_number in range(3):
+        addLayer(polygons, layer_number)
+        addLayer(segments, layer_number)
+        layer = segments.getLayer(layer_number)
+        layer.setSegments(layer.getSegments())
+
+    # There is no material color for the second extruder, so its lines are transparent black.
+    single_material_color_map = material_color_map[:1]
+    assertSameLayerData(segments.build(single_material_color_map), polygons.build(single_material_color_map))
+
+
+def test_buildEmpty():
+    result = LayerDataBuilder().build(material_color_map)
+
+    assert result.getVertices().shape == (0, 3)
+    assert result.getElementCounts() == {}
+
+
+def test_buildCompact():
+    wide = LayerDataBuilder()
+    compact = LayerDataBuilder(compact_attributes = True)
+    for layer_number in range(3):
+        addLayer(wide, layer_number)
+        addLayer(compact, layer_number)
+    expected = wide.build(material_color_map, 0.5)
+    result = compact.build(material_color_map, 0.5)
+
+    assert compact.isCompact()
+    assert numpy.array_equal(result.getVertices(), expected.getVertices())
+    assert numpy.array_equal(result.getIndices(), expected.getIndices())
+    assert numpy.allclose(result.getColors(), expected.getColors(), atol = 1 / 255)
+    for name in ["line_dimensions", "colors", "feedrates"]:
+        assert result.getAttribute(name)["value"].dtype == numpy.float32
+        assert numpy.allclose(result.getAttribute(name)["value"], expected.getAttribute(name)["value"], atol = 1 / 255, rtol = 1e-3)
+    for name in ["extruders", "line_types"]:
+        assert numpy.array_equal(result.getAttribute(name)["value"], expected.getAttribute(name)["value"])
+        assert result.getCompactAttribute(name)["value"].dtype == numpy.uint8
+
+    # Per vertex: 2 * 2 bytes line dimensions, 2 * 4 * 3 bytes colors, 2 bytes feedrate, 3 bytes extruder, 3 bytes line type.
+    vertex_count = expected.getVertices().shape[0]
+    assert compact.getBytesSaved() == vertex_count * (4 + 24 + 2 + 3 + 3)
+    assert wide.getBytesSaved() == 0
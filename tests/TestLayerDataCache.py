@@ -0,0 +1,169 @@
+import gc
+import os
+from unittest.mock import patch
+
+import numpy
+import pytest
+
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerDataCache import LayerDataCache
+from cura.LayerPolygon import LayerPolygon
+from cura.LayerSegments import LayerSegments
+
+
+color_map = numpy.arange(12 * 4, dtype = numpy.float32).reshape((12, 4)) / 48
+material_color_map = numpy.array([[1, 0, 0, 1], [0, 1, 0, 1]], dtype = numpy.float32)
+
+
+def floatBuffer(values):
+    return numpy.array(values, dtype = numpy.float32).tobytes()
+
+
+def buildLayerData(layer_count, compact_attributes = False):
+    builder = LayerDataBuilder(compact_attributes)
+    for layer_number in range(layer_count):
+        builder.addLayer(layer_number)
+        builder.setLayerHeight(layer_number, layer_number * 0.2)
+        builder.setLayerThickness(layer_number, 0.2)
+        builder.getLayer(layer_number).setSegments(LayerSegments.fromBuffers(
+            layer_number * 200,
+            [0, 1],
+            [0, 0],
+            [floatBuffer([0, 0, 1, 0, 1, 1]), floatBuffer([2, 2, 3, 2, 3, 3, 2, 3])],
+            [bytes([1, 8]), bytes([6, 6, 9])],
+            [floatBuffer([0.4, 0.1]), floatBuffer([0.5, 0.5, 0.1])],
+            [floatBuffer([0.2, 0.2]), floatBuffer([0.2, 0.2, 0.2])],
+            [floatBuffer([30, 150]), floatBuffer([40, 40, 150])]
+        ))
+    return builder.build(material_color_map)
+
+
+@pytest.fixture(autouse = True)
+def themeColors():
+    with patch.object(LayerPolygon, "getColorMap", return_value = color_map):
+        yield
+
+
+@pytest.mark.parametrize("compact_attributes", [False, True])
+def test_storeAndLoad(tmp_path, compact_attributes):
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+    layer_data = buildLayerData(3, compact_attributes)
+
+    assert cache.store(0, layer_data)
+    assert cache.has(0)
+    loaded = cache.load(0)
+
+    assert isinstance(loaded.getVertices(), numpy.memmap) or isinstance(loaded.getVertices().base, numpy.memmap)
+    assert numpy.array_equal(loaded.getVertices(), layer_data.getVertices())
+    assert numpy.array_equal(loaded.getIndices(), layer_data.getIndices())
+    assert numpy.array_equal(loaded.getColors(), layer_data.getColors())
+    for name in ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]:
+        assert numpy.array_equal(loaded.getAttribute(name)["value"], layer_data.getAttribute(name)["value"])
+        assert loaded.getAttribute(name)["opengl_name"] == layer_data.getAttribute(name)["opengl_name"]
+    assert loaded.getElementCounts() == layer_data.getElementCounts()
+    assert sorted(loaded.getLayers()) == [0, 1, 2]
+    for layer_number in range(3):
+        layer = loaded.getLayer(layer_number)
+        original = layer_data.getLayer(layer_number)
+        assert layer.height == pytest.approx(original.height)
+        assert layer.polygonCount() == original.polygonCount()
+        for points, original_points in zip(layer.getPolygonPoints(), original.getPolygonPoints()):
+            assert numpy.array_equal(points, original_points)
+        assert numpy.array_equal(layer.lineFeedrates, original.lineFeedrates)
+
+
+def test_evictLeastRecentlyUsed(tmp_path):
+    layer_data = buildLayerData(5)
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+    cache.store(0, layer_data)
+    entry_size = cache.getSize()
+    cache.setMaxSize(entry_size * 2)
+
+    cache.store(1, layer_data)
+    cache.load(0)  # Makes entry 1 the least recently used one.
+    cache.store(2, layer_data)
+
+    assert cache.has(0)
+    assert not cache.has(1)
+    assert cache.has(2)
+    assert cache.getSize() == entry_size * 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["0-1.layers", "2-3.layers"]
+
+
+def test_storeAgainWritesNewFile(tmp_path):
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+    cache.store(0, buildLayerData(2))
+    shown = cache.load(0)
+
+    assert cache.store(0, buildLayerData(3))
+
+    assert sorted(cache.load(0).getLayers()) == [0, 1, 2]
+    assert sorted(shown.getLayers()) == [0, 1]
+    assert [path.name for path in tmp_path.iterdir()] == ["0-2.layers"]
+
+
+def test_mappedFileIsRemovedWhenReleased(tmp_path):
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+    cache.store(0, buildLayerData(2))
+    shown = cache.load(0)
+    mapped_path = str(tmp_path / "0-1.layers")
+    remove = os.remove
+
+    def removeUnlessMapped(path):  # Like on Windows, where a mapped file can't be removed.
+        if path == mapped_path and shown is not None:
+            raise PermissionError("The file is mapped")
+        remove(path)
+
+    with patch("os.remove", side_effect = removeUnlessMapped):
+        cache.store(0, buildLayerData(3))
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["0-1.layers", "0-2.layers"]
+
+        shown = None  # Releases the mapping.
+        gc.collect()
+
+    assert [path.name for path in tmp_path.iterdir()] == ["0-2.layers"]
+
+
+def test_tooLargeToStore(tmp_path):
+    cache = LayerDataCache(str(tmp_path), 100)
+
+    assert not cache.store(0, buildLayerData(2))
+    assert not cache.has(0)
+    assert cache.load(0) is None
+
+
+def test_otherVersionIsNotRead(tmp_path):
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+    cache.store(0, buildLayerData(2))
+
+    with patch.object(LayerDataCache, "Version", LayerDataCache.Version + 1):
+        assert cache.load(0) is None
+    assert not cache.has(0)
+
+
+def test_persistentEntriesAreKept(tmp_path):
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024, persistent = True)
+    cache.store("first", buildLayerData(2), {"layer_count": 2})
+    cache.store("second", buildLayerData(3), {"layer_count": 3})
+    os.utime(str(tmp_path / "second-2.layers"), (0, 0))  # As if it was used long before the first one.
+    entry_size = os.path.getsize(str(tmp_path / "first-1.layers"))
+
+    cache = LayerDataCache(str(tmp_path), entry_size + 1, persistent = True)  # Only fits the most recently used one.
+
+    assert cache.has("first")
+    assert not cache.has("second")
+    layer_data, extra = cache.loadWithExtra("first")
+    assert sorted(layer_data.getLayers()) == [0, 1]
+    assert extra == {"layer_count": 2}
+
+    cache.store("third", buildLayerData(1))
+    assert (tmp_path / "third-3.layers").exists()  # Doesn't reuse the file names of previous sessions.
+
+
+def test_filesOfPreviousSessionAreRemoved(tmp_path):
+    LayerDataCache(str(tmp_path), 10 * 1024 * 1024).store(0, buildLayerData(2))
+
+    cache = LayerDataCache(str(tmp_path), 10 * 1024 * 1024)
+
+    assert not cache.has(0)
+    assert list(tmp_path.iterdir()) == []
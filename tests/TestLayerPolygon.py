@@ -0,0 +1,23 @@
+from unittest.mock import patch
+
+import numpy
+
+from cura.LayerPolygon import LayerPolygon
+
+
+def test_validateLineTypes():
+    line_types = numpy.array([[1], [12], [8], [255]], dtype = numpy.uint8)
+
+    assert LayerPolygon.validateLineTypes(line_types) == 2
+    assert line_types.ravel().tolist() == [1, LayerPolygon.NoneType, 8, LayerPolygon.NoneType]
+
+
+def test_unknownLineTypesInConstructor():
+    line_types = numpy.array([[1], [20]], dtype = numpy.uint8)
+    points = numpy.zeros((3, 3), dtype = numpy.float32)
+    values = numpy.ones((2, 1), dtype = numpy.float32)
+
+    with patch.object(LayerPolygon, "getColorMap", return_value = numpy.ones((12, 4), dtype = numpy.float32)):
+        polygon = LayerPolygon(0, line_types, points, values, values, values)
+
+    assert polygon.types.ravel().tolist() == [1, LayerPolygon.NoneType]
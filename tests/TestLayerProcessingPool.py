@@ -0,0 +1,62 @@
+import numpy
+import pytest
+
+from cura.LayerProcessingPool import LayerProcessingPool
+from cura.LayerSegments import LayerSegments
+
+pytestmark = pytest.mark.skipif(not LayerProcessingPool.isSupported(), reason = "Shared memory is not available.")
+
+
+def floatBuffer(values):
+    return numpy.array(values, dtype = numpy.float32).tobytes()
+
+
+layer_buffers = (
+    1000,
+    [0, 1],
+    [0, 1],
+    [floatBuffer([1, 2, 3, 4, 5, 6]), floatBuffer([7, 8, 9, 10, 11, 12])],
+    [bytes([1, 2]), bytes([8])],
+    [floatBuffer([0.4, 0.5]), floatBuffer([0.6])],
+    [floatBuffer([0.1, 0.2]), floatBuffer([0.3])],
+    [floatBuffer([10, 20]), floatBuffer([30])]
+)
+
+
+@pytest.fixture
+def pool():
+    pool = LayerProcessingPool(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_getSegments(pool):
+    futures = [pool.submit(*layer_buffers) for _ in range(3)]
+    expected = LayerSegments.fromBuffers(*layer_buffers)
+
+    for future in futures:
+        segments = pool.getSegments(future, timeout = 60)
+        for name in ["extruders", "points", "line_types", "line_widths", "line_thicknesses", "line_feedrates", "line_offsets", "point_offsets"]:
+            assert numpy.array_equal(getattr(segments, name), getattr(expected, name))
+            assert getattr(segments, name).dtype == getattr(expected, name).dtype
+        # LayerPolygon replaces unknown line types in place.
+        segments.line_types[0] = 0
+
+
+def test_getSegmentsEmpty(pool):
+    segments = pool.getSegments(pool.submit(200, [], [], [], [], [], [], []), timeout = 60)
+
+    assert len(segments) == 0
+    assert segments.points.shape == (0, 3)
+
+
+def test_discard(pool):
+    future = pool.submit(*layer_buffers)
+    future.result(timeout = 60)
+    name = future.result()[0]
+
+    pool.discard(future)
+
+    from multiprocessing import shared_memory
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name = name)
@@ -0,0 +1,49 @@
+import numpy
+
+from cura.LayerSegments import LayerSegments
+
+
+def floatBuffer(values):
+    return numpy.array(values, dtype = numpy.float32).tobytes()
+
+
+def test_fromBuffers():
+    segments = LayerSegments.fromBuffers(
+        1000,
+        [0, 1],
+        [0, 1],  # The first segment has 2D points, the second 3D points.
+        [floatBuffer([1, 2, 3, 4, 5, 6]), floatBuffer([7, 8, 9, 10, 11, 12])],
+        [bytes([1, 2]), bytes([8])],
+        [floatBuffer([0.4, 0.5]), floatBuffer([0.6])],
+        [floatBuffer([0.1, 0.2]), floatBuffer([0.3])],
+        [floatBuffer([10, 20]), floatBuffer([30])]
+    )
+
+    assert len(segments) == 2
+    assert list(segments.extruders) == [0, 1]
+    assert segments.getLines(0) == slice(0, 2)
+    assert segments.getLines(1) == slice(2, 3)
+    assert segments.getPoints(0) == slice(0, 3)
+    assert segments.getPoints(1) == slice(3, 5)
+
+    # X stays X, the height becomes Y and Y is mirrored into Z.
+    assert numpy.array_equal(segments.points, numpy.array([[1, 1, -2], [3, 1, -4], [5, 1, -6], [7, 9, -8], [10, 12, -11]], dtype = numpy.float32))
+    assert segments.line_types.ravel().tolist() == [1, 2, 8]
+    assert numpy.allclose(segments.line_widths.ravel(), [0.4, 0.5, 0.6])
+    assert numpy.allclose(segments.line_thicknesses.ravel(), [0.1, 0.2, 0.3])
+    assert numpy.allclose(segments.line_feedrates.ravel(), [10, 20, 30])
+
+
+def test_fromBuffersIsWritable():
+    segments = LayerSegments.fromBuffers(200, [0], [0], [floatBuffer([0, 0, 1, 1])], [bytes([20])], [floatBuffer([0.4])], [floatBuffer([0.2])], [floatBuffer([30])])
+
+    # LayerPolygon replaces unknown line types in place.
+    segments.line_types[0] = 0
+    assert segments.line_types[0] == 0
+
+
+def test_fromBuffersEmpty():
+    segments = LayerSegments.fromBuffers(200, [], [], [], [], [], [], [])
+
+    assert len(segments) == 0
+    assert segments.points.shape == (0, 3)
@@ -0,0 +1,125 @@
+import gc
+import weakref
+from unittest.mock import patch
+
+import numpy
+
+from UM.Mesh.MeshData import MeshData
+
+from cura.MeshPayloadCache import MeshPayloadCache
+
+
+def createMesh():
+    return MeshData(vertices = numpy.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype = numpy.float32), indices = numpy.array([[0, 1, 2]], dtype = numpy.int32))
+
+
+def createVertices(count = 3):
+    return numpy.arange(count * 3, dtype = numpy.float32).reshape((count, 3))
+
+
+def test_getStored():
+    cache = MeshPayloadCache(1024 * 1024)
+    mesh = createMesh()
+    transformation = numpy.identity(4)
+    vertices = createVertices()
+
+    assert cache.get(mesh, transformation) is None
+    cache.store(mesh, transformation, vertices)
+
+    assert cache.get(mesh, transformation) is vertices
+    assert not vertices.flags.writeable  # Shared by the slice messages, so it must not change.
+    assert cache.getSize() == vertices.nbytes
+
+
+def test_differentTransformation():
+    cache = MeshPayloadCache(1024 * 1024)
+    mesh = createMesh()
+    transformation = numpy.identity(4)
+    cache.store(mesh, transformation, createVertices())
+
+    moved = numpy.identity(4)
+    moved[0, 3] = 10
+    assert cache.get(mesh, moved) is None
+    assert cache.get(mesh, transformation.astype(numpy.float32)) is not None  # The same transformation, in another type.
+
+
+def test_differentMesh():
+    cache = MeshPayloadCache(1024 * 1024)
+    transformation = numpy.identity(4)
+    cache.store(createMesh(), transformation, createVertices())
+
+    assert cache.get(createMesh(), transformation) is None
+
+
+def test_meshIsNotKeptAlive():
+    cache = MeshPayloadCache(1024 * 1024)
+    transformation = numpy.identity(4)
+    mesh = createMesh()
+    cache.store(mesh, transformation, createVertices())
+    mesh_reference = weakref.ref(mesh)
+
+    del mesh  # Like when the object is deleted.
+    gc.collect()
+    assert mesh_reference() is None
+
+    other_mesh = createMesh()
+    cache.store(other_mesh, transformation, createVertices(4))
+    assert cache.getSize() == createVertices(4).nbytes  # The vertices of the mesh that is gone are removed.
+
+
+def test_evictLeastRecentlyUsed():
+    vertices_size = createVertices().nbytes
+    cache = MeshPayloadCache(2 * vertices_size)
+    transformation = numpy.identity(4)
+    meshes = [createMesh() for _ in range(3)]
+    cache.store(meshes[0], transformation, createVertices())
+    cache.store(meshes[1], transformation, createVertices())
+    cache.get(meshes[0], transformation)  # Now the second mesh is the least recently used one.
+
+    cache.store(meshes[2], transformation, createVertices())
+
+    assert cache.get(meshes[0], transformation) is not None
+    assert cache.get(meshes[1], transformation) is None
+    assert cache.get(meshes[2], transformation) is not None
+    assert cache.getSize() == 2 * vertices_size
+
+    cache.setMaxSize(0)
+    assert cache.getSize() == 0
+    assert cache.get(meshes[0], transformation) is None
+
+
+def test_digestIsKept():
+    cache = MeshPayloadCache(1024 * 1024)
+    mesh = createMesh()
+    transformation = numpy.identity(4)
+    vertices = createVertices()
+    cache.store(mesh, transformation, vertices)
+
+    with patch.object(MeshPayloadCache, "hashVertices", wraps = MeshPayloadCache.hashVertices) as hash_vertices:
+        digest = cache.getDigest(mesh, transformation, vertices)
+        assert cache.getDigest(mesh, transformation, vertices) == digest
+        assert hash_vertices.call_count == 1  # Only hashed the first time.
+
+        other_vertices = createVertices(4)  # Not the vertices in the cache.
+        assert cache.getDigest(mesh, transformation, other_vertices) == MeshPayloadCache.hashVertices(other_vertices)
+    assert digest == MeshPayloadCache.hashVertices(createVertices())
+
+
+def test_tooLarge():
+    cache = MeshPayloadCache(10)
+    mesh = createMesh()
+    vertices = createVertices()
+    cache.store(mesh, numpy.identity(4), vertices)
+
+    assert cache.get(mesh, numpy.identity(4)) is None
+    assert vertices.flags.writeable  # Not stored, so not shared either.
+
+
+def test_clear():
+    cache = MeshPayloadCache(1024 * 1024)
+    mesh = createMesh()
+    cache.store(mesh, numpy.identity(4), createVertices())
+    cache.clear()
+
+    assert cache.get(mesh, numpy.identity(4)) is None
+    assert cache.getSize() == 0
@@ -0,0 +1,114 @@
+import os
+
+from cura.SliceResultCache import CachedMessage, SliceResultCache
+
+
+def createLayer(layer_number):
+    segment = CachedMessage("", {
+        "extruder": 0,
+        "point_type": 1,
+        "points": bytes(range(24)),
+        "line_type": bytes([1]),
+        "line_width": bytes(4),
+        "line_thickness": bytes(4),
+        "line_feedrate": bytes(4)
+    })
+    return CachedMessage("cura.proto.LayerOptimized", {"id": layer_number, "height": layer_number * 0.2, "thickness": 0.2}, {"path_segment": [segment, segment]})
+
+
+def createEstimates():
+    fields = {name: 1.5 for name in SliceResultCache._message_fields["cura.proto.PrintTimeMaterialEstimates"][0]}
+    return CachedMessage("cura.proto.PrintTimeMaterialEstimates", fields, {"materialEstimates": [CachedMessage("", {"id": 0, "material_amount": 1234.5})]})
+
+
+def createMessages():
+    return [
+        createLayer(0),
+        createLayer(1),
+        CachedMessage("cura.proto.GCodeLayer", {"data": b"G1 X10\n"}),
+        CachedMessage("cura.proto.GCodeLayer", {"data": "G1 Y10 ;é\n".encode("utf-8")}),
+        CachedMessage("cura.proto.PrintTimeMaterialEstimates"),
+        createEstimates(),
+        CachedMessage("cura.proto.GCodePrefix", {"data": b";FLAVOR:Marlin\n"})
+    ]
+
+
+def test_storeAndLoad(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+    messages = createMessages()
+    del messages[4]  # Has none of the fields.
+
+    assert cache.store("abc", messages)
+    assert cache.has("abc")
+    loaded = cache.load("abc")
+
+    assert [message.getTypeName() for message in loaded] == [message.getTypeName() for message in messages]
+    assert loaded[1].id == 1
+    assert loaded[1].height == messages[1].height
+    assert loaded[1].repeatedMessageCount("path_segment") == 2
+    assert loaded[1].getRepeatedMessage("path_segment", 1).points == bytes(range(24))
+    assert loaded[1].getRepeatedMessage("path_segment", 1).point_type == 1
+    assert loaded[3].data.decode("utf-8") == "G1 Y10 ;é\n"
+    assert loaded[4].time_travel == 1.5
+    assert loaded[4].getRepeatedMessage("materialEstimates", 0).material_amount == 1234.5
+    assert loaded[5].data == b";FLAVOR:Marlin\n"
+
+
+def test_otherMessagesLeftOut(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+
+    assert cache.store("abc", [CachedMessage("cura.proto.Progress", {"amount": 0.5}), CachedMessage("cura.proto.GCodeLayer", {"data": b"G28\n"})])
+
+    assert [message.getTypeName() for message in cache.load("abc")] == ["cura.proto.GCodeLayer"]
+
+
+def test_loadMissing(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+
+    assert cache.load("abc") is None
+
+
+def test_keptAcrossSessions(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+    cache.store("abc", [CachedMessage("cura.proto.GCodeLayer", {"data": b"G28\n"})])
+    (tmp_path / "def.slice.tmp").write_bytes(b"half written")
+
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+
+    assert cache.load("abc")[0].data == b"G28\n"
+    assert not os.path.exists(str(tmp_path / "def.slice.tmp"))
+
+
+def test_evictLeastRecentlyUsed(tmp_path):
+    message = CachedMessage("cura.proto.GCodeLayer", {"data": bytes(1000)})
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+    cache.store("a", [message])
+    entry_size = cache.getSize()
+    cache.setMaxSize(entry_size * 2)
+    cache.store("b", [message])
+    cache.load("a")  # Now b is the least recently used.
+
+    cache.store("c", [message])
+
+    assert cache.has("a")
+    assert not cache.has("b")
+    assert cache.has("c")
+    assert not os.path.exists(str(tmp_path / "b.slice"))
+    assert cache.getSize() == entry_size * 2
+
+
+def test_tooLarge(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1000)
+
+    assert not cache.store("abc", [CachedMessage("cura.proto.GCodeLayer", {"data": bytes(2000)})])
+    assert not cache.has("abc")
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_unreadableEntry(tmp_path):
+    cache = SliceResultCache(str(tmp_path), 1024 * 1024)
+    cache.store("abc", [CachedMessage("cura.proto.GCodeLayer", {"data": b"G28\n"})])
+    (tmp_path / "abc.slice").write_bytes(b"garbage that is long enough for a header")
+
+    assert cache.load("abc") is None
+    assert not cache.has("abc")